@@ -1,13 +1,17 @@
-import json
-
-def save_forecast_json(lucky_hours):
-    forecast = []
-    for hour, score in lucky_hours:
-        start = f"{hour:02d}:00"
-        end = f"{min(hour+2, END_HOUR):02d}:00"
-        forecast.append({
-            "time": f"{start}–{end}",
-            "message": f"שעת מזל עם {score} זוויות חיוביות 🟢"
-        })
-    with open("forecast.json", "w", encoding="utf-8") as f:
-        json.dump(forecast, f, ensure_ascii=False, indent=2)
+# -*- coding: utf-8 -*-
+"""
+lotto_bot.py
+נקודת כניסה מתיקיית השורש לבוט ההתראות – המימוש ב-python/lotto_bot.py (יחד עם מנועי החישוב).
+
+    python lotto_bot.py run --transport telegram
+"""
+
+import sys
+import runpy
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent / "python"
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(SERVER_DIR))
+    runpy.run_path(str(SERVER_DIR / "lotto_bot.py"), run_name="__main__")
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+aspect_engine.py
+מנוע היבטים וקטורי (NumPy) משותף לכל מודולי התחזית.
+
+קלט:
+  natal_lons    [N]      – מיקומי הלידה
+  transit_lons  [T, P]   – מיקומי טרנזיט ל-T רגעים (או [P] לרגע אחד)
+  angles [A], orbs [A]   – טבלת היבטים (orb יכול להיות מספר אחד לכולם)
+
+כל המרחקים המעגליים, ההתאמות, האורבים והניקוד מחושבים בפעולות NumPy
+על כל [T, P, N] בבת אחת. טבלת ההיבטים מקומפלת פעם אחת לטבלת חיפוש לפי מרחק
+(compile_table), כך שכל תא עולה gather אחד במקום מעבר לכל היבט.
+התוצאה – מערכים קומפקטיים (AspectHits) שבוני ה-JSON הקיימים ממירים
+לטקסט/מילונים כמו קודם.
+
+כשכמה היבטים מתאימים לאותו זוג – נבחר הקרוב ביותר (בטבלאות שלנו האורבים
+לא חופפים, כך שזה זהה ל"הראשון שמתאים" של הלולאות הישנות).
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import metrics
+
+# t: אינדקס זמן, tr: אינדקס כוכב טרנזיט, na: אינדקס כוכב לידה,
+# angle_idx: אינדקס בטבלת ההיבטים, orb: הסטייה בפועל מההיבט המדויק
+AspectHits = namedtuple("AspectHits", ["t", "tr", "na", "angle_idx", "orb"])
+
+LOOKUP_STEP = 0.25   # רוחב תא בטבלת החיפוש (מעלות; חזקה של 2 – החלוקה מדויקת)
+
+
+def cyc_dist(a, b):
+    d = np.abs(np.asarray(a) - np.asarray(b)) % 360.0
+    return np.minimum(d, 360.0 - d)
+
+
+@lru_cache(maxsize=64)
+def compile_table(angles, orbs):
+    """
+    angles, orbs: tuples. לכל תא של LOOKUP_STEP מעלות במרחק 0..180 – אינדקס ההיבט היחיד
+    שהאורב שלו נוגע בתא, או -1. None אם שני אורבים נוגעים באותו תא (אז חוזרים ללולאה).
+    """
+    n = int(round(180.0 / LOOKUP_STEP)) + 1
+    lo = np.arange(n) * LOOKUP_STEP
+    hi = lo + LOOKUP_STEP
+    table = np.full(n, -1, dtype=np.intp)
+    for ai, (a, o) in enumerate(zip(angles, orbs)):
+        touch = (a - o <= hi) & (a + o >= lo)
+        if (table[touch] >= 0).any():
+            return None
+        table[touch] = ai
+    return table
+
+
+@metrics.timed("aspects")
+def _nearest(natal_lons, transit_lons, angles, orbs):
+    natal = np.asarray(natal_lons, dtype=np.float64)
+    tr = np.atleast_2d(np.asarray(transit_lons, dtype=np.float64))
+    angles = np.asarray(angles, dtype=np.float64)
+    orbs = np.broadcast_to(np.asarray(orbs, dtype=np.float64), angles.shape)
+
+    d = cyc_dist(tr[:, :, None], natal[None, None, :])          # [T, P, N]
+    table = compile_table(tuple(angles.tolist()), tuple(orbs.tolist()))
+    if table is not None:
+        # התא קובע את ההיבט היחיד שאפשרי; נשאר רק לבדוק את האורב המדויק
+        k = table[np.minimum((d * (1.0 / LOOKUP_STEP)).astype(np.intp), table.size - 1)]
+        diff = np.abs(d - angles[k])
+        hit = (k >= 0) & (diff <= orbs[k])
+        return np.where(hit, k, 0), np.where(hit, diff, np.inf)
+
+    best = np.full(d.shape, np.inf)
+    k = np.zeros(d.shape, dtype=np.intp)
+    # אורבים חופפים: לולאה קצרה על טבלת ההיבטים – כל איטרציה וקטורית על כל [T, P, N]
+    for ai in range(angles.shape[0]):
+        diff = np.abs(d - angles[ai])
+        better = (diff <= orbs[ai]) & (diff < best)
+        best[better] = diff[better]
+        k[better] = ai
+    return k, best
+
+
+def match(natal_lons, transit_lons, angles, orbs, order="tn"):
+    """
+    כל ההיבטים בין טרנזיט ללידה, לכל הרגעים.
+    order: "tn" – טרנזיט חיצוני, לידה פנימי; "nt" – לידה חיצוני, טרנזיט פנימי
+    (כדי לשמור על סדר הפלט של הלולאות הקיימות). בתוך כל זמן – לפי הסדר הזה.
+    """
+    return _hits(*_nearest(natal_lons, transit_lons, angles, orbs), order)
+
+
+def _hits(k, best, order):
+    hit = np.isfinite(best)
+    if order == "nt":
+        t, na, tr = np.nonzero(hit.transpose(0, 2, 1))
+    else:
+        t, tr, na = np.nonzero(hit)
+    return AspectHits(t, tr, na, k[t, tr, na], best[t, tr, na])
+
+
+def weighted_scores(natal_lons, transit_lons, angles, orbs, weights, capped=None, cap=None):
+    """
+    ניקוד משוקלל לכל רגע: [T].
+    weights [P, N, A] – משקל לכל (טרנזיט, לידה, היבט).
+    capped  [P, N]    – זוגות שתרומתם מוגבלת (למשל כל מה שמערב את אוראנוס);
+    cap               – כמה תרומות כאלה (עם משקל > 0) נספרות לכל רגע, לפי סדר לידה→טרנזיט.
+    """
+    k, best = _nearest(natal_lons, transit_lons, angles, orbs)
+    return _weighted(k, best, weights, capped, cap)
+
+
+def evaluate(natal_lons, transit_lons, angles, orbs, weights, capped=None, cap=None, order="tn"):
+    """match + weighted_scores על אותה סריקה: (AspectHits, scores[T])."""
+    k, best = _nearest(natal_lons, transit_lons, angles, orbs)
+    return _hits(k, best, order), _weighted(k, best, weights, capped, cap)
+
+
+def _weighted(k, best, weights, capped, cap):
+    hit = np.isfinite(best)
+    P, N, A = weights.shape
+    # gather שטוח: תא (p, n) עם היבט k => weights.flat[(p * N + n) * A + k]
+    base = (np.arange(P)[:, None] * N + np.arange(N)[None, :]) * A
+    w = np.where(hit, weights.reshape(-1)[base + k], 0.0)   # [T, P, N]
+
+    if capped is not None and cap is not None:
+        cw = (w > 0) & capped[None, :, :]
+        # סדר הלולאה המקורית: לידה חיצוני, טרנזיט פנימי
+        order_nt = cw.transpose(0, 2, 1).reshape(cw.shape[0], -1)
+        allowed = (np.cumsum(order_nt, axis=1) <= cap).reshape(cw.shape[0], N, P).transpose(0, 2, 1)
+        w = np.where(cw & ~allowed, 0.0, w)
+
+    return w.sum(axis=(1, 2))
+
+
+def counts(natal_lons, transit_lons, angles, orbs):
+    """מספר ההיבטים לכל רגע: [T]."""
+    _, best = _nearest(natal_lons, transit_lons, angles, orbs)
+    return np.isfinite(best).sum(axis=(1, 2))
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+aspect_solver.py
+מציאת חלונות היבט (טרנזיט → נקודת לידה) לפי אירועים, במקום דגימה כל X דקות.
+
+לכל נקודה מדויקת X = natal ± angle מגדירים d(t) = wrap(lon_transit(t) − X).
+החלון הוא הזמן שבו |d(t)| ≤ orb:
+  - כניסה לאורב:  d = ∓orb
+  - היבט מדויק:    d = 0
+  - יציאה מהאורב: d = ±orb
+דוגמים את הכוכב ברשת גסה שצעדה קטן מ-orb / max_speed (כך שאי אפשר "לדלג" על חלון),
+ומחדדים כל חציה ב-Newton (הנגזרת של d היא מהירות הכוכב) עם גיבוי של bisection.
+לכל ההיבטים מול אותו כוכב טרנזיט משתמשים באותן דגימות.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import swisseph
+
+from flatlib import const
+from flatlib.ephem import swe as flat_swe
+
+from ephemeris_table import get_table, PLANETS as TABLE_PLANETS
+import metrics
+
+# מהירות מקסימלית (°/יום) – קובעת את צעד הרשת הגסה
+MAX_SPEED = {
+    const.MOON: 15.5, const.SUN: 1.1, const.MERCURY: 2.3, const.VENUS: 1.3, const.MARS: 0.8,
+    const.JUPITER: 0.25, const.SATURN: 0.14, const.URANUS: 0.07, const.NEPTUNE: 0.04, const.PLUTO: 0.04,
+}
+
+TOL_DAYS = 1.0 / 86400.0   # שנייה אחת
+
+_J2000 = datetime(2000, 1, 1, 12, 0, tzinfo=timezone.utc)   # JD 2451545.0
+
+
+def jd_from_datetime(dt_aware):
+    return 2451545.0 + (dt_aware - _J2000).total_seconds() / 86400.0
+
+
+def datetime_from_jd(jd, tz=timezone.utc):
+    return (_J2000 + timedelta(days=jd - 2451545.0)).astimezone(tz)
+
+
+def _wrap(d):
+    return (d + 180.0) % 360.0 - 180.0
+
+
+def lon_speed(pid, jd):
+    """(longitude, speed °/day) של כוכב ברגע jd – מהטבלה הממופה אם אפשר, אחרת swisseph."""
+    table = get_table()
+    if table is not None and table.covers(jd):
+        lons, speeds = table.positions_at(jd)
+        i = TABLE_PLANETS.index(pid)
+        return float(lons[i]), float(speeds[i])
+    res, _ = swisseph.calc_ut(jd, flat_swe.SWE_OBJECTS[pid], swisseph.FLG_SPEED)
+    return res[0], res[3]
+
+
+class _Sampler:
+    """סופר הערכות ושומר אותן (אותה דגימה משמשת כמה נקודות X)."""
+    def __init__(self, pid):
+        self.pid = pid
+        self.evals = 0
+        self._memo = {}
+
+    def __call__(self, jd):
+        hit = self._memo.get(jd)
+        if hit is None:
+            self.evals += 1
+            hit = self._memo[jd] = lon_speed(self.pid, jd)
+        return hit
+
+
+def _refine(sample, X, level, a, b, da, db):
+    """שורש של d(t) − level בקטע [a, b] כש-(da−level),(db−level) בסימנים הפוכים."""
+    fa = da - level
+    lo, hi = a, b
+    t = a + (b - a) * (fa / (fa - (db - level)))   # התחלה מאינטרפולציה לינארית
+    for _ in range(20):
+        lon, spd = sample(t)
+        f = _wrap(lon - X) - level
+        if abs(f) < 1e-7:
+            break
+        if (f < 0) == (fa < 0):
+            lo, fa = t, f
+        else:
+            hi = t
+        nt = t - f / spd if spd else None
+        if nt is None or not (lo < nt < hi):
+            nt = 0.5 * (lo + hi)   # Newton יצא מהתחום – bisection
+        if abs(nt - t) < TOL_DAYS:
+            t = nt
+            break
+        t = nt
+    return t
+
+
+@metrics.timed("aspects")
+def find_windows(pid, natal_lon, angles, orb, jd_start, jd_end, max_speed=None):
+    """
+    כל חלונות ההיבט של כוכב הטרנזיט pid מול natal_lon בטווח [jd_start, jd_end].
+    מחזיר (windows, evals):
+      windows: [{"angle", "start", "exact", "end"}] ממוינים לפי start (JD, UTC).
+      start/end נחתכים לקצוות הטווח אם החלון כבר פתוח / עדיין פתוח שם.
+    """
+    sample = _Sampler(pid)
+    speed = max_speed or MAX_SPEED.get(pid, 1.0)
+    step = 0.9 * orb / speed
+    n = max(1, int((jd_end - jd_start) / step) + 1)
+    grid = [jd_start + (jd_end - jd_start) * i / n for i in range(n + 1)]
+    lons = [sample(t)[0] for t in grid]
+
+    points = set()
+    for k in angles:
+        points.add((k, (natal_lon + k) % 360.0))
+        points.add((k, (natal_lon - k) % 360.0))
+
+    windows = []
+    for k, X in sorted(points):
+        ds = [_wrap(lon - X) for lon in lons]
+        inside = abs(ds[0]) <= orb
+        cur = {"angle": k, "start": jd_start, "exact": None} if inside else None
+        for i in range(len(grid) - 1):
+            a, b, da, db = grid[i], grid[i + 1], ds[i], ds[i + 1]
+            if abs(db - da) > 180.0:
+                continue   # מעבר 0/360 של wrap, לא חציה אמיתית
+            for level in sorted((-orb, 0.0, orb), key=lambda L: (L - da) * (1 if db >= da else -1)):
+                if (da - level) * (db - level) >= 0 and not (db == level):
+                    continue
+                t = _refine(sample, X, level, a, b, da, db)
+                if level == 0.0:
+                    if cur is not None:
+                        cur["exact"] = t
+                elif cur is None:
+                    cur = {"angle": k, "start": t, "exact": None}
+                else:
+                    cur["end"] = t
+                    windows.append(cur)
+                    cur = None
+        if cur is not None:
+            cur["end"] = jd_end
+            windows.append(cur)
+
+    windows.sort(key=lambda w: w["start"])
+    return windows, sample.evals
@@ -5,6 +5,9 @@ API קטן לחישובים אסטרולוגיים עבור האפליקציה:
 - ללא טלגרם
 - קולט פרמטרים מהשורה (או מהאפליקציה)
 - מדפיס JSON ב-UTF-8 ל-stdout
+- --stream: שורת JSON לכל יום (NDJSON), עד MAX_STREAM_DAYS ימים בזיכרון קבוע
+- --resolution N: חלונות מזל כל N דקות (אינטרפולציה בין מפות הרשת) במקום כל 3 שעות
+- --parallel / --serial: חלוקת הימים בין ליבות (ברירת מחדל: לפי compute_pool.PARALLEL_MIN_DAYS)
 """
 
 import sys
@@ -12,11 +15,20 @@ import json
 import argparse
 from datetime import datetime, timedelta
 
-from flatlib.chart import Chart
+import numpy as np
+import swisseph
+
 from flatlib.datetime import Datetime
 from flatlib.geopos import GeoPos
 from flatlib import const, angle
 
+from transit_cache import transit_chart, prefetch
+from positions import lean_chart
+import aspect_engine
+import scoring
+import metrics
+import compute_pool
+
 # ========= הגדרות ברירת מחדל =========
 PLANETS = [
     const.SUN, const.MOON, const.MERCURY, const.VENUS, const.MARS,
@@ -24,18 +36,20 @@ PLANETS = [
 ]
 ALL_OBJECTS = PLANETS + ['FORTUNE']
 
-# קבוצת "כסף" (כמו שהשתמשנו עד עכשיו)
-MONEY_GROUP = [const.VENUS, const.JUPITER, const.MOON, const.PLUTO, 'FORTUNE', const.URANUS]
+# קבוצת "כסף" (כמו שהשתמשנו עד עכשיו) – מוגדרת במנוע הניקוד המשותף
+MONEY_GROUP = scoring.MONEY_GROUP
 
 HARMONIC_ANGLES = [0, 60, 120, 180]  # צמידות, סקסטיל, טריין, אופוזיציה
 ORBS_DEG = 3.0
 START_HOUR = 5
 END_HOUR   = 23
 INTERVAL_H = 3
+MAX_RESOLUTION_MIN = INTERVAL_H * 60   # resolution_min: 1..180 דקות (None = רשת של 3 שעות)
+SIDEREAL_DEG_PER_DAY = 360.98564736629
 
-# ניקוד משוקלל (כמו בקוד הפייתון שלך)
-BENEFICS = {const.VENUS, const.JUPITER, 'FORTUNE'}
-MAX_URANUS_PER_BLOCK = 3  # תקרת תרומת אוראנוס לכל חלון של 3 שעות
+MAX_DAYS = 3            # תשובת JSON אחת
+MAX_STREAM_DAYS = 365   # מצב זרימה (NDJSON) – יום אחרי יום
+PREFETCH_DAYS = 7       # כמה ימי טרנזיט נטענים למטמון בכל פעם
 
 # סמלים
 PLANET_ICONS = {
@@ -73,6 +87,9 @@ def deg_to_sign_str(deg, lang='he'):
     return f"{signs[sign_idx]} {sign_deg}°"
 
 def calc_part_of_fortune(chart):
+    pre = getattr(chart, "fortune", None)  # ChartSnapshot מפרופיל שמור
+    if pre is not None:
+        return pre
     asc = chart.get(const.ASC).lon
     moon = chart.get(const.MOON).lon
     sun  = chart.get(const.SUN).lon
@@ -99,7 +116,16 @@ def build_chart(date_str, time_str, tz, lat, lon):
     lat_fmt = _parse_geo_component(str(lat), is_lat=True)
     lon_fmt = _parse_geo_component(str(lon), is_lat=False)
     pos = GeoPos(lat_fmt, lon_fmt)
-    return Chart(dt, pos, IDs=PLANETS)
+    metrics.count("charts")
+    # כוכבים + ASC/MC (ל-FORTUNE ול-natal_asc_deg/natal_mc_deg) ישירות מ-swisseph, בלי קוספים
+    return lean_chart(dt, pos, PLANETS)
+
+def build_transit_chart(date_str, time_str, tz, lat, lon):
+    """כמו build_chart, אבל הכוכבים מגיעים ממטמון הטרנזיטים המשותף (רק ASC/MC מחושבים למיקום)."""
+    dt = Datetime(date_str, time_str, tz)
+    lat_fmt = _parse_geo_component(str(lat), is_lat=True)
+    lon_fmt = _parse_geo_component(str(lon), is_lat=False)
+    return transit_chart(dt, GeoPos(lat_fmt, lon_fmt), PLANETS)
 
 def estimate_potential_score(n):
     if n >= 9: return "🟢🟢 95–100%"
@@ -110,46 +136,25 @@ def estimate_potential_score(n):
     else: return "⬜ 0%"
 
 # ========= ניקוד משוקלל (מספרי) =========
-def _aspect_weight(p1, p2, h_angle):
-    involves_uranus = (p1 == const.URANUS or p2 == const.URANUS)
-    benefic_involved = (p1 in BENEFICS or p2 in BENEFICS)
-    # אוראנוס: רק 120°
-    if involves_uranus:
-        return 2.0 if h_angle == 120 else 0.0
-    if h_angle == 120:
-        return 2.0 if benefic_involved else 1.5
-    if h_angle == 60:
-        return 1.0 if benefic_involved else 0.5
-    if h_angle in (0, 180):
-        return 0.5 if benefic_involved else 0.0
-    return 0.0
+# המשקלים, ה-benefics ותקרת אוראנוס – בכלל "pro" של scoring.py
+def _object_lons(chart, target_objects):
+    """מערך longitudes לפי סדר target_objects (כולל FORTUNE)."""
+    fortune = calc_part_of_fortune(chart) if 'FORTUNE' in target_objects else None
+    return np.array([fortune if p == 'FORTUNE' else chart.get(p).lon for p in target_objects], dtype=float)
+
+def _rules(target_objects, orb_deg=ORBS_DEG):
+    return scoring.compile_rules("pro", target_objects, target_objects, HARMONIC_ANGLES, orb_deg)
 
 def _score_block_numeric(natal_chart, transit_chart, target_objects, orb_deg=ORBS_DEG):
-    natal_fortune   = calc_part_of_fortune(natal_chart)
-    transit_fortune = calc_part_of_fortune(transit_chart)
-
-    def get_lon(chart, p):
-        return chart.get(p).lon if p != 'FORTUNE' else (natal_fortune if chart is natal_chart else transit_fortune)
-
-    score_sum = 0.0
-    uranus_used = 0
-    for p1 in target_objects:
-        pos1 = get_lon(natal_chart, p1)
-        for p2 in target_objects:
-            pos2 = get_lon(transit_chart, p2)
-            d = cyc_dist(pos1, pos2)
-            for a in HARMONIC_ANGLES:
-                if abs(d - a) <= orb_deg:
-                    w = _aspect_weight(p1, p2, a)
-                    if w > 0:
-                        if (p1 == const.URANUS or p2 == const.URANUS):
-                            if uranus_used < MAX_URANUS_PER_BLOCK:
-                                score_sum += w
-                                uranus_used += 1
-                        else:
-                            score_sum += w
-                    break
-    return round(score_sum, 2)
+    scores = _score_blocks_numeric(_object_lons(natal_chart, target_objects),
+                                   _object_lons(transit_chart, target_objects)[None, :],
+                                   target_objects, orb_deg)
+    return scores[0]
+
+def _score_blocks_numeric(natal_lons, transit_lons, target_objects, orb_deg=ORBS_DEG):
+    """ניקוד לכל שורת זמן ב-transit_lons[T, P] – מערך [T] (מעוגל ל-2 ספרות)."""
+    scores = _rules(target_objects, orb_deg).scores(natal_lons, transit_lons)
+    return [round(float(x), 2) for x in scores]
 
 # ========= חישובים =========
 def planets_dict(chart, lang='he'):
@@ -168,90 +173,175 @@ def planets_dict(chart, lang='he'):
 
 def find_aspects(natal_chart, transit_chart, target_objects, lang='he', orb_deg=ORBS_DEG):
     meanings = ANGLE_MEANINGS_HE if lang == 'he' else ANGLE_MEANINGS_EN
-    aspects = []
 
-    natal_fortune   = calc_part_of_fortune(natal_chart)
-    transit_fortune = calc_part_of_fortune(transit_chart)
+    def retro_of(chart, p):
+        return False if p == 'FORTUNE' else bool(chart.get(p).isRetrograde())
 
-    def get_lon(chart, p):
-        return chart.get(p).lon if p != 'FORTUNE' else (natal_fortune if chart is natal_chart else transit_fortune)
+    natal_lons = _object_lons(natal_chart, target_objects)
+    transit_lons = _object_lons(transit_chart, target_objects)
+    natal_retro = [retro_of(natal_chart, p) for p in target_objects]
+    transit_retro = [retro_of(transit_chart, p) for p in target_objects]
 
-    def retro_of(chart, p):
-        return False if p == 'FORTUNE' else chart.get(p).isRetrograde()
-
-    for t in target_objects:
-        t_lon = get_lon(transit_chart, t)
-        t_name = f"{PLANET_ICONS.get(t,'')} {t}"
-        t_retro = retro_of(transit_chart, t)
-
-        for n in target_objects:
-            n_lon = get_lon(natal_chart, n)
-            n_name = f"{PLANET_ICONS.get(n,'')} {n}"
-            n_retro = retro_of(natal_chart, n)
-
-            d = cyc_dist(t_lon, n_lon)
-            for a in HARMONIC_ANGLES:
-                if abs(d - a) <= orb_deg:
-                    aspects.append({
-                        "tPlanet": t_name + (" ℞" if t_retro else ""),
-                        "nPlanet": n_name + (" ℞" if n_retro else ""),
-                        "tRetro": bool(t_retro),
-                        "nRetro": bool(n_retro),
-                        "aspect": meanings.get(a, f"{a}°"),
-                        "orb": round(abs(d - a), 2),
-                        "tPos": deg_to_sign_str(t_lon, lang) + (" ℞" if t_retro else ""),
-                        "nPos": deg_to_sign_str(n_lon, lang) + (" ℞" if n_retro else ""),
-                    })
-                    break
+    hits = aspect_engine.match(natal_lons, transit_lons, HARMONIC_ANGLES, orb_deg, order="tn")
+    aspects = []
+    for ti, ni, ai, orb in zip(hits.tr, hits.na, hits.angle_idx, hits.orb):
+        t, n, a = target_objects[ti], target_objects[ni], HARMONIC_ANGLES[ai]
+        t_retro, n_retro = transit_retro[ti], natal_retro[ni]
+        aspects.append({
+            "tPlanet": f"{PLANET_ICONS.get(t,'')} {t}" + (" ℞" if t_retro else ""),
+            "nPlanet": f"{PLANET_ICONS.get(n,'')} {n}" + (" ℞" if n_retro else ""),
+            "tRetro": t_retro,
+            "nRetro": n_retro,
+            "aspect": meanings.get(a, f"{a}°"),
+            "orb": round(float(orb), 2),
+            "tPos": deg_to_sign_str(transit_lons[ti], lang) + (" ℞" if t_retro else ""),
+            "nPos": deg_to_sign_str(natal_lons[ni], lang) + (" ℞" if n_retro else ""),
+        })
     return aspects
 
-def find_lucky_windows(date_obj, natal_chart, tz, lat, lon, target_objects, lang='he', orb_deg=ORBS_DEG):
-    """בכל 3 שעות מחשב קשרים ומחזיר כל החלונות ליום, עם score_sum מספרי עקבי."""
-    windows = []
+def find_lucky_windows(date_obj, natal_chart, tz, lat, lon, target_objects, lang='he', orb_deg=ORBS_DEG,
+                       resolution_min=None):
+    """
+    בכל 3 שעות מחשב קשרים ומחזיר כל החלונות ליום, עם score_sum מספרי עקבי.
+    resolution_min (1..MAX_RESOLUTION_MIN): דגימה כל N דקות באותו טווח – ראו _fine_windows.
+    """
+    if resolution_min:
+        return _fine_windows(date_obj, natal_chart, tz, lat, lon, target_objects, lang, orb_deg,
+                             int(resolution_min))
     date_str = date_obj.strftime('%Y/%m/%d')
+    hours = list(range(START_HOUR, END_HOUR + 1, INTERVAL_H))
+
+    # כל שעות היום בבת אחת: [T, P] מול הלידה
+    natal_lons = _object_lons(natal_chart, target_objects)
+    transit_lons = np.array([
+        _object_lons(build_transit_chart(date_str, f"{hour:02d}:00", tz, lat, lon), target_objects)
+        for hour in hours
+    ])
+    hits, raw = _rules(target_objects, orb_deg).evaluate(natal_lons, transit_lons, order="nt")
+    scores = [round(float(x), 2) for x in raw]
+
+    # רשימת היבטים טקסטואלית להצגה
+    meanings = ANGLE_MEANINGS_HE if lang == 'he' else ANGLE_MEANINGS_EN
+    found_by_t = {}
+    for t, ni, ti, ai, orb in zip(hits.t, hits.na, hits.tr, hits.angle_idx, hits.orb):
+        p1, p2 = target_objects[ni], target_objects[ti]   # natal, transit
+        icon1 = PLANET_ICONS.get(p1, p1)
+        icon2 = PLANET_ICONS.get(p2, p2)
+        meaning = meanings.get(HARMONIC_ANGLES[ai], f"{HARMONIC_ANGLES[ai]}°")
+        found_by_t.setdefault(int(t), []).append(f"{icon1} {p1} ↔ {icon2} {p2} — {meaning} ({round(float(orb),2)}°)")
 
-    for hour in range(START_HOUR, END_HOUR + 1, INTERVAL_H):
-        transit = build_chart(date_str, f"{hour:02d}:00", tz, lat, lon)
-
-        # רשימת היבטים טקסטואלית להצגה
-        found = []
-        transit_fortune = calc_part_of_fortune(transit)
-        natal_fortune   = calc_part_of_fortune(natal_chart)
-
-        def lon_of(chart_or_tag, p):
-            if p == 'FORTUNE':
-                return transit_fortune if chart_or_tag == 'tr' else natal_fortune
-            return (transit if chart_or_tag == 'tr' else natal_chart).get(p).lon
-
-        meanings = ANGLE_MEANINGS_HE if lang == 'he' else ANGLE_MEANINGS_EN
-        for p1 in target_objects:  # natal
-            pos1 = lon_of('na', p1)
-            for p2 in target_objects:  # transit
-                pos2 = lon_of('tr', p2)
-                d = cyc_dist(pos1, pos2)
-                for a in HARMONIC_ANGLES:
-                    if abs(d - a) <= orb_deg:
-                        icon1 = PLANET_ICONS.get(p1, p1)
-                        icon2 = PLANET_ICONS.get(p2, p2)
-                        meaning = meanings.get(a, f"{a}°")
-                        found.append(f"{icon1} {p1} ↔ {icon2} {p2} — {meaning} ({round(abs(d-a),2)}°)")
-                        break
-
+    windows = []
+    for i, hour in enumerate(hours):
+        found = found_by_t.get(i)
         if found:
-            # ניקוד מספרי (זה הדבר החשוב ל-Flutter)
-            score_num = _score_block_numeric(natal_chart, transit, target_objects, orb_deg=orb_deg)
-
             end_h = (hour + INTERVAL_H) % 24
             windows.append({
                 "from": f"{hour:02d}:00",
                 "to":   f"{end_h:02d}:00",
                 "count": len(found),
                 "score": estimate_potential_score(len(found)),  # תווית להצגה
-                "score_sum": score_num,                         # ← תמיד מספר!
+                "score_sum": scores[i],                         # ← תמיד מספר!
                 "aspects": found
             })
     return windows
 
+# ========= חלונות ברזולוציית דקות =========
+def _hermite(jds, anchor_jds, lons, speeds):
+    """
+    מיקומים [S, P] ברגעים jds מתוך עוגנים (lons / speeds [K, P], °/יום): Hermite קובי לכל קטע,
+    עם המהירות כנגזרת. בין עוגנים של 3 שעות השגיאה זניחה (גם לירח).
+    """
+    seg = np.clip(np.searchsorted(anchor_jds, jds, side="right") - 1, 0, len(anchor_jds) - 2)
+    h = (anchor_jds[seg + 1] - anchor_jds[seg])[:, None]
+    u = ((jds - anchor_jds[seg]) / h[:, 0])[:, None]
+    p0 = lons[seg]
+    p1 = p0 + (lons[seg + 1] - p0 + 180.0) % 360.0 - 180.0     # בלי קפיצה ב-360°
+    m0, m1 = speeds[seg] * h, speeds[seg + 1] * h
+    u2, u3 = u * u, u * u * u
+    out = (2 * u3 - 3 * u2 + 1) * p0 + (u3 - 2 * u2 + u) * m0 + (-2 * u3 + 3 * u2) * p1 + (u3 - u2) * m1
+    return out % 360.0
+
+def _asc_lons(jds, geo_lat, geo_lon):
+    """ASC לכל רגע – נוסחה סגורה מהזמן הכוכבי (לינארי בזמן) ונטיית האקליפטיקה, בלי חישוב בתים."""
+    st0 = swisseph.sidtime(float(jds[0])) * 15.0
+    armc = np.radians((st0 + SIDEREAL_DEG_PER_DAY * (jds - jds[0]) + geo_lon) % 360.0)
+    eps = np.radians(swisseph.calc_ut(float(jds[0]), swisseph.ECL_NUT)[0][0])
+    phi = np.radians(geo_lat)
+    asc = np.degrees(np.arctan2(np.cos(armc), -(np.sin(armc) * np.cos(eps) + np.tan(phi) * np.sin(eps))))
+    return asc % 360.0
+
+def _fine_windows(date_obj, natal_chart, tz, lat, lon, target_objects, lang, orb_deg, resolution_min):
+    """
+    כמו find_lucky_windows, אבל דוגמים כל resolution_min דקות מ-START_HOUR עד סוף החלון האחרון
+    (END_HOUR + INTERVAL_H). מפות טרנזיט נבנות רק בעוגנים של הרשת הרגילה (+1 בסוף);
+    בין העוגנים – אינטרפולציה מהמהירויות, ו-ASC (ל-FORTUNE) מהזמן הכוכבי.
+    רצף דגימות עם אותה קבוצת היבטים => חלון אחד; ה-orb המוצג הוא המדויק ביותר בחלון.
+    """
+    resolution_min = max(1, min(int(resolution_min), MAX_RESOLUTION_MIN))
+    day0 = datetime(date_obj.year, date_obj.month, date_obj.day)
+    anchor_hours = range(START_HOUR, END_HOUR + INTERVAL_H + 1, INTERVAL_H)
+    anchors = []
+    for hour in anchor_hours:
+        at = day0 + timedelta(hours=hour)
+        anchors.append(build_transit_chart(at.strftime('%Y/%m/%d'), at.strftime('%H:%M'), tz, lat, lon))
+    dt0 = Datetime(day0.strftime('%Y/%m/%d'), f"{START_HOUR:02d}:00", tz)
+    anchor_jds = dt0.jd + (np.array(anchor_hours, dtype=float) - START_HOUR) / 24.0
+
+    minutes = np.arange(START_HOUR * 60, (END_HOUR + INTERVAL_H) * 60, resolution_min)
+    jds = dt0.jd + (minutes - START_HOUR * 60) / 1440.0
+    lons = _hermite(jds, anchor_jds,
+                    np.array([[ch.get(p).lon for p in PLANETS] for ch in anchors]),
+                    np.array([[ch.get(p).lonspeed for p in PLANETS] for ch in anchors]))
+    col = {p: i for i, p in enumerate(PLANETS)}
+    if 'FORTUNE' in target_objects:
+        geo = GeoPos(_parse_geo_component(str(lat), is_lat=True), _parse_geo_component(str(lon), is_lat=False))
+        fortune = (_asc_lons(jds, geo.lat, geo.lon) + lons[:, col[const.MOON]] - lons[:, col[const.SUN]]) % 360.0
+    transit_lons = np.column_stack([fortune if p == 'FORTUNE' else lons[:, col[p]] for p in target_objects])
+
+    natal_lons = _object_lons(natal_chart, target_objects)
+    hits, raw = _rules(target_objects, orb_deg).evaluate(natal_lons, transit_lons, order="nt")
+
+    # קבוצת ההיבטים בכל דגימה (לפי סדר לידה→טרנזיט) + ה-orb שלהם
+    sets = {}
+    for t, ni, ti, ai, orb in zip(hits.t, hits.na, hits.tr, hits.angle_idx, hits.orb):
+        sets.setdefault(int(t), []).append(((int(ni), int(ti), int(ai)), float(orb)))
+
+    meanings = ANGLE_MEANINGS_HE if lang == 'he' else ANGLE_MEANINGS_EN
+
+    def hhmm(m):
+        m = int(m) % 1440
+        return f"{m // 60:02d}:{m % 60:02d}"
+
+    windows, t = [], 0
+    while t < len(minutes):
+        found = sets.get(t)
+        if not found:
+            t += 1
+            continue
+        key = [k for k, _ in found]
+        best = {k: orb for k, orb in found}
+        end = t + 1
+        while end < len(minutes) and [k for k, _ in sets.get(end, ())] == key:
+            for k, orb in sets[end]:
+                best[k] = min(best[k], orb)
+            end += 1
+        aspects = []
+        for ni, ti, ai in key:
+            p1, p2 = target_objects[ni], target_objects[ti]   # natal, transit
+            meaning = meanings.get(HARMONIC_ANGLES[ai], f"{HARMONIC_ANGLES[ai]}°")
+            aspects.append(f"{PLANET_ICONS.get(p1, p1)} {p1} ↔ {PLANET_ICONS.get(p2, p2)} {p2} — "
+                           f"{meaning} ({round(best[(ni, ti, ai)], 2)}°)")
+        windows.append({
+            "from": hhmm(minutes[t]),
+            "to":   hhmm(minutes[end - 1] + resolution_min),
+            "count": len(key),
+            "score": estimate_potential_score(len(key)),
+            "score_sum": round(float(raw[t]), 2),
+            "aspects": aspects,
+        })
+        t = end
+    return windows
+
 def summarize_retro_list(transit_retro_flags):
     items = []
     for label, flag in transit_retro_flags.items():
@@ -260,7 +350,126 @@ def summarize_retro_list(transit_retro_flags):
     return items
 
 # ========= API ראשי =========
-def main():
+def _grid_times():
+    """כל השעות שצריך מהטרנזיט ליום אחד: 12:00 (המפה של היום) + רשת החלונות."""
+    return ["12:00"] + [f"{h:02d}:00" for h in range(START_HOUR, END_HOUR + 1, INTERVAL_H)]
+
+def _day_payload(day_dt, natal_chart, natal_view, tz, lat, lon, lang, target_objects, resolution_min=None):
+    day_str = day_dt.strftime("%Y/%m/%d")
+    transit_chart = build_transit_chart(day_str, "12:00", tz, lat, lon)
+
+    natal,  natal_raw,  natal_retro     = natal_view
+    transit, transit_raw, transit_retro = planets_dict(transit_chart, lang)
+
+    aspects = find_aspects(natal_chart, transit_chart, target_objects, lang=lang, orb_deg=ORBS_DEG)
+    lucky   = find_lucky_windows(day_dt, natal_chart, tz, lat, lon, target_objects, lang=lang, orb_deg=ORBS_DEG,
+                                 resolution_min=resolution_min)
+
+    best = max(lucky, key=lambda w: w.get("count", 0)) if lucky else None
+    recommendation = None
+    if best:
+        recommendation = {
+            "text": f"🟢 המלצה: למלא לוטו/חישגד/צ'אנס סביב {best['from']}–{best['to']}",
+            "from": best["from"],
+            "to": best["to"],
+            "score": best["score"],
+            "count": best["count"]
+        }
+
+    return {
+        "date": day_str.replace("/", "-"),
+        "lang": lang,
+        "natal": natal,
+        "transit": transit,
+        "aspects": aspects,
+        "lucky_hours": lucky,
+        "natal_raw": natal_raw,
+        "transit_raw": transit_raw,
+        "natal_retro_flags": natal_retro,
+        "transit_retro_flags": transit_retro,
+        "retro_list": summarize_retro_list(transit_retro),
+        "natal_asc_deg": round(natal_chart.get(const.ASC).lon % 360.0, 4),
+        "natal_mc_deg":  round(natal_chart.get(const.MC).lon  % 360.0, 4),
+        "recommendation": recommendation,
+    }
+
+def iter_pro_days(birth_date, birth_time, tz, lat, lon, lang='he',
+                  transit_date=None, objects='money', days=1, natal=None, max_days=MAX_STREAM_DAYS,
+                  resolution_min=None, parallel=None):
+    """
+    מחולל: יום אחד בכל פעם (אותו dict כמו ב-"days"), כך שגם שנה שלמה רצה בזיכרון קבוע.
+    מפת הלידה ותצוגת הלידה מחושבות פעם אחת; מיקומי הטרנזיט של כל PREFETCH_DAYS ימים
+    נטענים למטמון המשותף בקריאה אחת (transit_cache.prefetch).
+    resolution_min: חלונות מזל ברזולוציית דקות (ראו find_lucky_windows); None = רשת של 3 שעות.
+    parallel: חבילות של PREFETCH_DAYS ימים מתחלקות בין ליבות (compute_pool.map_ordered) ויוצאות
+    לפי הסדר; None = רק מ-PARALLEL_MIN_DAYS ימים, False = תמיד סדרתי.
+    """
+    target_objects = (ALL_OBJECTS if objects == "all" else MONEY_GROUP)
+
+    birth_date = birth_date.replace("-", "/")
+    base_transit_date = (transit_date or birth_date).replace("-", "/")
+    num_days = max(1, min(int(days), max_days))
+
+    natal_chart = natal if natal is not None else build_chart(birth_date, birth_time, tz, lat, lon)
+    start_dt = datetime.strptime(base_transit_date, "%Y/%m/%d")
+
+    if compute_pool.use_parallel(num_days, parallel):
+        jobs = [dict(birth_date=birth_date, birth_time=birth_time, tz=tz, lat=lat, lon=lon, lang=lang,
+                     transit_date=(start_dt + timedelta(days=s)).strftime("%Y/%m/%d"), objects=objects,
+                     days=min(PREFETCH_DAYS, num_days - s), natal=natal_chart,
+                     resolution_min=resolution_min, parallel=False)
+                for s in range(0, num_days, PREFETCH_DAYS)]
+        for rows in compute_pool.map_ordered(_pro_chunk, jobs, parallel=True, chunksize=1):
+            yield from rows
+        return
+
+    natal_view = planets_dict(natal_chart, lang)
+    for chunk_start in range(0, num_days, PREFETCH_DAYS):
+        chunk = [start_dt + timedelta(days=i)
+                 for i in range(chunk_start, min(num_days, chunk_start + PREFETCH_DAYS))]
+        jds = [Datetime(d.strftime("%Y/%m/%d"), t, tz).jd for d in chunk for t in _grid_times()]
+        if resolution_min:
+            # העוגן האחרון של _fine_windows: סוף החלון של END_HOUR (כבר ביום הבא)
+            jds += [Datetime((d + timedelta(hours=END_HOUR + INTERVAL_H)).strftime("%Y/%m/%d"),
+                             f"{(END_HOUR + INTERVAL_H) % 24:02d}:00", tz).jd for d in chunk]
+        prefetch(jds)
+        for day_dt in chunk:
+            yield _day_payload(day_dt, natal_chart, natal_view, tz, lat, lon, lang, target_objects,
+                               resolution_min=resolution_min)
+
+def compute_pro_days(birth_date, birth_time, tz, lat, lon, lang='he',
+                     transit_date=None, objects='money', days=1, natal=None, resolution_min=None,
+                     parallel=None):
+    """רשימת ימים (עד MAX_STREAM_DAYS) – חתיכה אחת של זרם ארוך, למשל למאגר החישוב של השרת."""
+    return list(iter_pro_days(birth_date, birth_time, tz, lat, lon, lang=lang, transit_date=transit_date,
+                              objects=objects, days=days, natal=natal, resolution_min=resolution_min,
+                              parallel=parallel))
+
+def _pro_chunk(job):
+    """משימה של map_ordered: חבילת ימים אחת (kwargs של compute_pro_days)."""
+    return compute_pro_days(**job)
+
+def compute_pro_forecast(birth_date, birth_time, tz, lat, lon, lang='he',
+                         transit_date=None, objects='money', days=1, natal=None, resolution_min=None,
+                         parallel=None):
+    """
+    מנוע ה-PRO: מחזיר dict (היום הראשון ברמה העליונה + "days"), עד MAX_DAYS ימים.
+    birth_date / transit_date: YYYY-MM-DD או YYYY/MM/DD
+    natal: ChartSnapshot מוכן מפרופיל שמור (profiles.py) – אם קיים, לא בונים מפת לידה
+    resolution_min: חלונות מזל כל N דקות (1..MAX_RESOLUTION_MIN) במקום כל 3 שעות
+    לטווחים ארוכים – iter_pro_days (זרימה, יום אחרי יום).
+    """
+    days_payload = list(iter_pro_days(birth_date, birth_time, tz, lat, lon, lang=lang,
+                                      transit_date=transit_date, objects=objects, days=days,
+                                      natal=natal, max_days=MAX_DAYS, resolution_min=resolution_min,
+                                      parallel=parallel))
+    today = days_payload[0]
+    payload = dict(today)
+    payload["days"] = days_payload
+    return payload
+
+# ========= CLI (עטיפה דקה) =========
+def main(argv=None):
     stdout_utf8()
 
     parser = argparse.ArgumentParser(description="Astro Calc API (no Telegram). Prints JSON to stdout.")
@@ -273,70 +482,37 @@ def main():
     parser.add_argument("--transit-date", required=False, help="Transit date YYYY-MM-DD (default = --date)")
     parser.add_argument("--objects", required=False, choices=["money", "all"], default="money",
                         help="Which objects group to use: money (Venus,Jupiter,Moon,Pluto,Fortune,Uranus) or all")
-    parser.add_argument("--days", type=int, default=1, help="Number of consecutive days to compute (1..3)")
-    args = parser.parse_args()
-
-    target_objects = (ALL_OBJECTS if args.objects == "all" else MONEY_GROUP)
-
-    birth_date = args.date.replace("-", "/")
-    birth_time = args.time
-    tz = args.tz
-    lat = args.lat
-    lon = args.lon
-    lang = args.lang
-    base_transit_date = (args.transit_date or args.date).replace("-", "/")
-    num_days = max(1, min(int(args.days), 3))
-
-    natal_chart = build_chart(birth_date, birth_time, tz, lat, lon)
-
-    start_dt = datetime.strptime(base_transit_date, "%Y/%m/%d")
-    days_payload = []
-
-    for i in range(num_days):
-        day_dt = start_dt + timedelta(days=i)
-        day_str = day_dt.strftime("%Y/%m/%d")
-
-        transit_chart = build_chart(day_str, "12:00", tz, lat, lon)
-
-        natal,  natal_raw,  natal_retro     = planets_dict(natal_chart, lang)
-        transit, transit_raw, transit_retro = planets_dict(transit_chart, lang)
-
-        aspects = find_aspects(natal_chart, transit_chart, target_objects, lang=lang, orb_deg=ORBS_DEG)
-        lucky   = find_lucky_windows(day_dt, natal_chart, tz, lat, lon, target_objects, lang=lang, orb_deg=ORBS_DEG)
-
-        best = max(lucky, key=lambda w: w.get("count", 0)) if lucky else None
-        recommendation = None
-        if best:
-            recommendation = {
-                "text": f"🟢 המלצה: למלא לוטו/חישגד/צ'אנס סביב {best['from']}–{best['to']}",
-                "from": best["from"],
-                "to": best["to"],
-                "score": best["score"],
-                "count": best["count"]
-            }
-
-        day_payload = {
-            "date": day_str.replace("/", "-"),
-            "lang": lang,
-            "natal": natal,
-            "transit": transit,
-            "aspects": aspects,
-            "lucky_hours": lucky,
-            "natal_raw": natal_raw,
-            "transit_raw": transit_raw,
-            "natal_retro_flags": natal_retro,
-            "transit_retro_flags": transit_retro,
-            "retro_list": summarize_retro_list(transit_retro),
-            "natal_asc_deg": round(natal_chart.get(const.ASC).lon % 360.0, 4),
-            "natal_mc_deg":  round(natal_chart.get(const.MC).lon  % 360.0, 4),
-            "recommendation": recommendation,
-        }
-        days_payload.append(day_payload)
-
-    today = days_payload[0]
-    payload = dict(today)
-    payload["days"] = days_payload
-
+    parser.add_argument("--days", type=int, default=1,
+                        help=f"Number of consecutive days to compute (1..{MAX_DAYS}, up to {MAX_STREAM_DAYS} with --stream)")
+    parser.add_argument("--resolution", type=int, default=None,
+                        help=f"Lucky-window sampling step in minutes (1..{MAX_RESOLUTION_MIN}; default: every {INTERVAL_H}h)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print one JSON line per day (NDJSON) as soon as it is ready")
+    par = parser.add_mutually_exclusive_group()
+    par.add_argument("--parallel", dest="parallel", action="store_const", const=True, default=None,
+                     help="Split the days across CPU cores (default: only for long ranges)")
+    par.add_argument("--serial", dest="parallel", action="store_const", const=False,
+                     help="Compute the days one after another in this process")
+    args = parser.parse_args(argv)
+    if args.resolution is not None and not 1 <= args.resolution <= MAX_RESOLUTION_MIN:
+        parser.error(f"--resolution must be 1..{MAX_RESOLUTION_MIN}")
+
+    if args.stream:
+        for day in iter_pro_days(args.date, args.time, args.tz, args.lat, args.lon, lang=args.lang,
+                                 transit_date=args.transit_date, objects=args.objects, days=args.days,
+                                 resolution_min=args.resolution, parallel=args.parallel):
+            print(json.dumps(day, ensure_ascii=False), flush=True)
+        return
+
+    payload = compute_pro_forecast(
+        args.date, args.time, args.tz, args.lat, args.lon,
+        lang=args.lang,
+        transit_date=args.transit_date,
+        objects=args.objects,
+        days=args.days,
+        resolution_min=args.resolution,
+        parallel=args.parallel,
+    )
     print(json.dumps(payload, ensure_ascii=False))
 
 if __name__ == "__main__":
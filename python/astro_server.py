@@ -1,14 +1,16 @@
 # FILE: python/astro_server.py
-# שרת Flask קטן שעוטף סקריפטי פייתון כך שאפליקציית Flutter תוכל לקרוא אליהם ב-HTTP
+# שרת Flask קטן שעוטף את מנועי החישוב בפייתון כך שאפליקציית Flutter תוכל לקרוא אליהם ב-HTTP
 
 import os
 import sys
 import json
-import subprocess
+import time
+import hashlib
 from pathlib import Path
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
 
-from flask import Flask, request, Response
+from flask import Flask, request, Response, g, stream_with_context, has_request_context
 from flask_cors import CORS
 
 app = Flask(__name__)
@@ -21,92 +23,176 @@ app.config["JSON_SORT_KEYS"] = False
 
 # --- CORS (לפרונט ברנדר) ---
 # בפרודקשן מומלץ להחליף origins לכתובת של הפרונט שלך במקום "*"
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=False)
+# ETag / Retry-After / Server-Timing חשופים כדי שגם לקוח web יוכל לשלוח If-None-Match / לחכות
+CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=False,
+     expose_headers=["ETag", "Retry-After", "Server-Timing"])
 
 HERE = Path(__file__).resolve().parent
 FORECAST_SCRIPT = HERE / "astrology_forecast.py"  # המסך הרגיל
 PRO_SCRIPT = HERE / "astro_calc_api.py"          # מסך PRO (3 ימים/טרנזיטים)
 
+# המנועים רצים בתוך התהליך (בלי לפתוח פייתון חדש לכל בקשה);
+# הסקריפטים עצמם נשארים זמינים כ-CLI.
+if str(HERE) not in sys.path:
+    sys.path.insert(0, str(HERE))
+
+import astrology_forecast  # noqa: E402
+import astro_calc_api      # noqa: E402
+from compute_pool import ComputePool, ComputeBusy, DeadlineExceeded  # noqa: E402
+from profiles import ProfileStore, ProfileNotFound  # noqa: E402
+from positions import ChartSnapshot  # noqa: E402
+from singleflight import SingleFlight  # noqa: E402
+import cities  # noqa: E402
+import payload_codec  # noqa: E402
+import sky_index  # noqa: E402
+import stations  # noqa: E402
+import metrics  # noqa: E402
+import capture  # noqa: E402
+from profiles import resolve_tz  # noqa: E402
+
+# מאגר תהליכים לחישובים הכבדים (נוצר בעצלות / ב-post_fork של gunicorn)
+COMPUTE = ComputePool()
+
+# פרופילי לידה שמורים (SQLite + LRU)
+PROFILES = ProfileStore()
+
+# אינדקס הערים (נבנה כאן כדי ש---preload ישתף אותו בין ה-workers)
+CITIES = cities.get_index()
+
+# איחוד חישובים זהים שרצים במקביל (למשל אחרי התראת push)
+FLIGHTS = SingleFlight()
+
+# הקלטת בקשות (מנוקות) לשחזור עומס – רק אם CAPTURE_FILE מוגדר
+CAPTURE = capture.from_env()
+
+# deadline לכל משימה (שניות) – מחליף את שדה timeout שהקליינט היה שולח
+FORECAST_DEADLINE_SEC = float(os.environ.get("FORECAST_DEADLINE_SEC", "22"))
+PRO_DEADLINE_SEC = float(os.environ.get("PRO_DEADLINE_SEC", "25"))
+
+# HTTP caching: התחזית הרגילה מחושבת לתחילת "דלי" זמן של FORECAST_BUCKET_SEC,
+# כך שבתוך הדלי אותו קלט => אותו גוף תשובה (ETag חזק) ו-max-age = הזמן עד סוף הדלי.
+# PRO תלוי רק בקלט (כולל transit_date), לכן נשמר PRO_MAX_AGE_SEC.
+# גרסת הקוד נכנסת למפתח כך שפריסה חדשה לא מחזירה 304 על תוצאה ישנה.
+FORECAST_BUCKET_SEC = max(60, int(os.environ.get("FORECAST_BUCKET_SEC", "600")))
+PRO_MAX_AGE_SEC = int(os.environ.get("PRO_MAX_AGE_SEC", "86400"))
+CACHE_VERSION = (os.getenv("RENDER_GIT_COMMIT") or "dev")[:12]
+
+# /forecast/batch: כמה פריטים בכל משימה למאגר, וכמה פריטים מותר בבקשה אחת
+BATCH_CHUNK = max(1, int(os.environ.get("BATCH_CHUNK", "8")))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "10000"))
+
+# /pro_forecast/stream: כמה ימים בכל משימה למאגר, וברירת המחדל לאורך הטווח
+STREAM_CHUNK_DAYS = max(1, int(os.environ.get("STREAM_CHUNK_DAYS", "7")))
+STREAM_DEFAULT_DAYS = int(os.environ.get("STREAM_DEFAULT_DAYS", "30"))
+
+# /cities/near: מעבר למרחק הזה (ק"מ) מפסיקים לחפש – נקודה באמצע האוקיינוס מחזירה רשימה ריקה מהר
+CITIES_NEAR_MAX_KM = int(os.environ.get("CITIES_NEAR_MAX_KM", "300"))
+
 # ---------- Utilities ----------
 
-def _json_response(pyobj: dict | list, status: int = 200) -> Response:
-    """החזרת JSON עם קידוד מלא (UTF-8) ו-Content-Type נכון."""
-    payload = json.dumps(pyobj, ensure_ascii=False)
-    return Response(payload, status=status, mimetype="application/json; charset=utf-8")
+def _negotiated() -> tuple[str, str | None]:
+    """(פורמט, דחיסה) לפי Accept / Accept-Encoding של הבקשה הנוכחית."""
+    if not has_request_context():
+        return "json", None
+    return (payload_codec.negotiate_format(request.accept_mimetypes),
+            payload_codec.negotiate_coding(request.accept_encodings))
 
 
-def _run_subprocess(args, cwd, timeout_sec: int = 25):
+def _json_response(pyobj: dict | list, status: int = 200, headers: dict | None = None) -> Response:
     """
-    מריץ תת-תהליך (פייתון פנימי), מחזיר dict מפוענח מ-stdout (JSON).
-    מגדיר PYTHONIOENCODING=utf-8 כדי לתמוך ביוניקוד מלא.
+    החזרת התשובה בקידוד שהלקוח ביקש: JSON (UTF-8) כברירת מחדל, או MessagePack / CBOR
+    עם טבלת מחרוזות (payload_codec.py); gzip / brotli אם הלקוח מקבל ושווה לדחוס.
     """
-    env = os.environ.copy()
-    env["PYTHONIOENCODING"] = "utf-8"
+    fmt, coding = _negotiated()
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept, Accept-Encoding"
+    with metrics.stage("serialize"):
+        body = payload_codec.encode(pyobj, fmt)
+        if coding and len(body) >= payload_codec.MIN_COMPRESS_BYTES:
+            body = payload_codec.compress(body, coding)
+            headers["Content-Encoding"] = coding
+    return Response(body, status=status, mimetype=payload_codec.MIMETYPES[fmt], headers=headers)
+
+
+def _request_data() -> dict | None:
+    """פרמטרי הבקשה: query string ב-GET, גוף JSON ב-POST. None אם ה-JSON לא תקין."""
+    if request.method in ("GET", "HEAD"):
+        return request.args.to_dict()
+    try:
+        return request.get_json(force=True) or {}
+    except Exception:
+        return None
+
+
+def _cache_key(kind: str, fields: dict, bucket: int | None = None) -> str:
+    """מפתח דטרמיניסטי מקלט מנורמל (+ דלי זמן). משמש כ-ETag חזק."""
+    raw = json.dumps({"v": CACHE_VERSION, "k": kind, "in": fields, "b": bucket},
+                     sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _time_bucket(now: datetime | None = None) -> tuple[int, datetime, int]:
+    """(מספר הדלי, תחילתו ב-UTC, שניות עד סופו)."""
+    ts = (now or datetime.now(timezone.utc)).timestamp()
+    bucket = int(ts // FORECAST_BUCKET_SEC)
+    start = datetime.fromtimestamp(bucket * FORECAST_BUCKET_SEC, timezone.utc)
+    remaining = int((bucket + 1) * FORECAST_BUCKET_SEC - ts)
+    return bucket, start, max(1, remaining)
+
+
+def _representation_etag(etag: str) -> str:
+    """ETag חזק חייב להיות שונה לכל ייצוג (פורמט/דחיסה) של אותו תוכן."""
+    fmt, coding = _negotiated()
+    return etag if (fmt, coding) == ("json", None) else f"{etag}-{fmt}-{coding or 'identity'}"
+
+
+def _cache_headers(etag: str, max_age: int) -> dict:
+    # private: התשובה מבוססת על נתוני לידה אישיים – רק מטמון הלקוח, לא פרוקסי משותף
+    return {"ETag": f'"{_representation_etag(etag)}"', "Cache-Control": f"private, max-age={max_age}",
+            "Vary": "Accept, Accept-Encoding"}
+
+
+def _not_modified(etag: str, max_age: int) -> Response | None:
+    """304 אם ה-If-None-Match של הלקוח מכיל את ה-ETag (רק GET/HEAD – בלי לחשב בכלל)."""
+    if request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(_representation_etag(etag)):
+        return Response(status=304, headers=_cache_headers(etag, max_age))
+    return None
+
 
-    proc = subprocess.run(
-        args,
-        cwd=str(cwd),
-        env=env,
-        capture_output=True,
-        text=True,
-        encoding="utf-8",
-        timeout=timeout_sec,
+def _busy_response(e: ComputeBusy) -> Response:
+    return _json_response({"ok": False, "error": str(e)}, 503, headers={"Retry-After": str(e.retry_after)})
+
+
+def run_forecast(date: str, time: str, city: str, lat, lon,
+                 lang: str, tz_id: str, house_system: str, natal=None, now_utc=None, sections=None):
+    """
+    מריץ את מנוע astrology_forecast (מסך רגיל) במאגר התהליכים.
+    כמו ב-CLI: tz נלקח רק אם הוא TZID אמיתי (למשל Asia/Jerusalem), אחרת מנחשים לפי lat/lon.
+    house_system נשמר לתאימות – המנוע עובד עם ברירת המחדל של flatlib.
+    natal: ChartSnapshot מפרופיל שמור (אם הבקשה הגיעה עם profile_id).
+    now_utc: רגע הטרנזיט (ברירת מחדל: עכשיו).
+    sections: אילו חלקים לחשב (None = הכל) – ראו astrology_forecast.SECTIONS.
+    """
+    tzid = tz_id if "/" in (tz_id or "") else None
+    return COMPUTE.run(
+        astrology_forecast.compute_forecast,
+        date, time, city, float(lat), float(lon), tzid=tzid, lang=lang, natal=natal, now_utc=now_utc,
+        sections=sections, deadline=FORECAST_DEADLINE_SEC,
     )
 
-    if proc.returncode != 0:
-        raise RuntimeError(
-            "subprocess failed\n"
-            f"exit={proc.returncode}\n"
-            f"stdout:\n{proc.stdout}\n"
-            f"stderr:\n{proc.stderr}"
-        )
 
-    try:
-        return json.loads(proc.stdout)
-    except Exception as e:
-        raise RuntimeError(f"Bad JSON from subprocess: {e}\nstdout:\n{proc.stdout}") from e
-
-
-def run_forecast_cli(date: str, time: str, city: str, lat, lon,
-                     lang: str, tz_id: str, house_system: str, timeout_sec: int = 22):
-    """מריץ את astrology_forecast.py (מסך רגיל) עם כל הפרמטרים שהקליינט שולח."""
-    if not FORECAST_SCRIPT.exists():
-        raise FileNotFoundError(f"astrology_forecast.py not found at: {FORECAST_SCRIPT}")
-    args = [
-        sys.executable,
-        str(FORECAST_SCRIPT),
-        str(date),
-        str(time),
-        str(city),
-        str(lat),
-        str(lon),
-        str(lang),
-        str(tz_id),
-        str(house_system),
-    ]
-    return _run_subprocess(args, HERE, timeout_sec)
-
-
-def run_pro_cli(transit_date: str, birth_date: str, birth_time: str, tz: str,
-                lat, lon, lang: str, timeout_sec: int = 25):
-    """
-    מריץ את astro_calc_api.py למסך PRO.
-    צפוי לקבל את הפרמטרים: transit_date, birth_date, birth_time, tz, lat, lon, lang
-    """
-    if not PRO_SCRIPT.exists():
-        raise FileNotFoundError(f"astro_calc_api.py not found at: {PRO_SCRIPT}")
-    args = [
-        sys.executable,
-        str(PRO_SCRIPT),
-        "--date", birth_date,
-        "--time", birth_time,
-        "--lat", str(lat),
-        "--lon", str(lon),
-        "--tz", tz,
-        "--lang", lang,
-        "--transit-date", transit_date,
-    ]
-    return _run_subprocess(args, HERE, timeout_sec)
+def run_pro(transit_date: str, birth_date: str, birth_time: str, tz: str,
+            lat, lon, lang: str, natal=None, resolution_min=None):
+    """
+    מריץ את מנוע astro_calc_api (מסך PRO) במאגר התהליכים.
+    הפרמטרים: transit_date, birth_date, birth_time, tz, lat, lon, lang, resolution_min (דקות / None)
+    """
+    return COMPUTE.run(
+        astro_calc_api.compute_pro_forecast,
+        birth_date, birth_time, tz, str(lat), str(lon),
+        lang=lang, transit_date=transit_date, natal=natal, resolution_min=resolution_min,
+        deadline=PRO_DEADLINE_SEC,
+    )
 
 # ---------- Health / Diagnostics ----------
 
@@ -138,65 +224,344 @@ def diag():
         "pro_exists": PRO_SCRIPT.exists(),
         "forecast_path": str(FORECAST_SCRIPT),
         "pro_path": str(PRO_SCRIPT),
+        "mode": "in-process",
+        "compute": COMPUTE.stats(),
+        "singleflight": FLIGHTS.stats(),
+        "profiles": PROFILES.stats(),
+        "capture": {"file": str(CAPTURE.path), "written": CAPTURE.written} if CAPTURE is not None else None,
+        "cities": len(CITIES) if CITIES is not None else 0,
+        "sky_index": sky_index.get_index().stats() if sky_index.get_index() is not None else None,
+        "stations": stations.get_calendar().stats() if stations.get_calendar() is not None else None,
     })
 
-# ---------- Connection header fix ----------
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus: היסטוגרמות של זמני בקשות ושלבים (metrics.py) + מצב המאגר, המטמון ו-single-flight.
+    שלבי המשימות (engine/queue/tz/aspects/charts) מגיעים מה-workers יחד עם כל תוצאה.
+    """
+    c = COMPUTE.stats()
+    busy = min(c["in_flight"], max(1, c["workers"]))
+    hits = metrics.TASK_COUNTS.value("transit_cache_hits")
+    misses = metrics.TASK_COUNTS.value("transit_cache_misses")
+    sf = FLIGHTS.stats()
+    sky = sky_index.get_index()
+    body = metrics.render([
+        metrics.sample("astro_compute_workers", "Compute worker processes (0 = in-process)", c["workers"]),
+        metrics.sample("astro_compute_in_flight", "Tasks running or queued", c["in_flight"]),
+        metrics.sample("astro_compute_queue_depth", "Tasks waiting for a worker", max(0, c["in_flight"] - c["workers"])),
+        metrics.sample("astro_compute_queue_capacity", "Tasks allowed to wait beyond the workers", c["queue_size"]),
+        metrics.sample("astro_compute_utilization", "Busy workers / workers right now", busy / max(1, c["workers"])),
+        metrics.sample("astro_compute_avg_task_seconds", "EWMA of task duration", c["avg_task_sec"]),
+        metrics.sample("astro_transit_cache_hit_ratio", "Transit cache hits / lookups inside compute tasks",
+                       hits / (hits + misses) if hits + misses else 0.0),
+        metrics.sample("astro_singleflight_calls_total", "Calls through single-flight", sf["calls"], "counter"),
+        metrics.sample("astro_singleflight_shared_total", "Calls served by another in-flight computation",
+                       sf["shared"], "counter"),
+        metrics.sample("astro_singleflight_in_flight_keys", "Distinct computations in flight", sf["in_flight_keys"]),
+        metrics.sample("astro_profiles_lru_size", "Birth profiles held in memory",
+                       PROFILES.stats()["lru_entries"]),
+        metrics.sample("astro_sky_index_hours", "Hours in the loaded sky index", len(sky) if sky is not None else 0),
+    ])
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ---------- Timing / Cache / keep-alive ----------
+
+@app.before_request
+def start_timing():
+    g.timing_t0 = time.perf_counter()
+    g.timing_token = metrics.begin()
+
+
+@app.before_request
+def capture_request():
+    if CAPTURE is None:
+        return
+    try:
+        body = None if request.method in ("GET", "HEAD") else request.get_json(force=True, silent=True)
+        CAPTURE.record(request.method, request.path, request.args.to_dict(), body, request.headers)
+    except Exception as e:   # הקלטה לא מפילה בקשה
+        app.logger.warning("capture failed: %s", e)
+
 
 @app.after_request
-def add_conn_close(resp: Response):
+def add_server_timing(resp: Response):
     """
-    סוגר keep-alive כדי למנוע בעיות "Connection closed while receiving data" בצד הלקוח.
-    אם תראה שאין צורך, אפשר להסיר.
+    Server-Timing: זמני השלבים של הבקשה (engine, queue, tz, aspects, serialize) ומספר המפות,
+    ובנוסף ההיסטוגרמות של /metrics. בתשובות זורמות (batch / stream) – רק מה שקרה לפני הזרימה.
     """
-    resp.headers["Connection"] = "close"
-    resp.headers["Cache-Control"] = "no-store"
+    t0 = g.pop("timing_t0", None)
+    if t0 is None:
+        return resp
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    t = metrics.current()
+    if t is not None:
+        resp.headers["Server-Timing"] = metrics.server_timing(t, total_ms)
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    if route != "/metrics":
+        metrics.observe_request(route, request.method, resp.status_code, total_ms, t)
+    return resp
+
+
+@app.teardown_request
+def end_timing(_exc=None):
+    token = g.pop("timing_token", None)
+    if token is not None:
+        metrics.end(token)
+
+
+@app.after_request
+def default_cache_control(resp: Response):
+    """
+    תשובות שלא הגדירו מדיניות מטמון (שגיאות, diag, profiles...) – no-store.
+    החיבור נשאר keep-alive (gunicorn.conf.py: keepalive), כך שלקוח Flutter
+    לא משלם על TLS handshake חדש בכל בקשה.
+    """
+    resp.headers.setdefault("Cache-Control", "no-store")
     return resp
 
 # ---------- API ----------
 
-@app.post("/forecast")
-def forecast():
+def _city_from(data: dict):
+    """(City, None) אם יש city_id תקין, (None, None) אם אין, או (None, (שגיאה, סטטוס))."""
+    city_id = str(data.get("city_id") or "").strip()
+    if not city_id:
+        return None, None
+    if CITIES is None:
+        return None, ("City index unavailable", 503)
     try:
-        data = request.get_json(force=True) or {}
-    except Exception:
-        return _json_response({"ok": False, "error": "Invalid JSON body"}, 400)
+        return CITIES.get(city_id), None
+    except cities.CityNotFound:
+        return None, (f"Unknown city_id: {city_id}", 404)
+
 
+def _forecast_item(data: dict, default_lang: str = "he"):
+    """
+    פענוח שדות בקשת תחזית רגילה (שדות לידה או profile_id).
+    city_id (מ-/cities) ממלא city/lat/lon/tz מהאינדקס – בלי geocoding ובלי חיפוש אזור זמן.
+    sections (או fields): רשימה / "a,b" / preset ("free") – רק החלקים האלה מחושבים.
+    מחזיר (kwargs ל-run_forecast, None) או (None, (הודעת שגיאה, סטטוס)).
+    """
     date = (data.get("date") or "").strip()
     time_ = (data.get("time") or "").strip()
     city = (data.get("city") or "").strip()
     lat = data.get("lat", "")
     lon = data.get("lon", "")
-    lang = (data.get("lang") or "he").strip()
+    lang = (data.get("lang") or default_lang).strip()
     tz_id = (data.get("tz") or "UTC").strip()
     house_system = (data.get("house_system") or "placidus").strip()
-    timeout_sec = int(data.get("timeout", 22))
+    profile_id = (data.get("profile_id") or "").strip()
+    natal = None
+    try:
+        sections = astrology_forecast.parse_sections(data.get("sections") or data.get("fields"))
+    except ValueError as e:
+        return None, (f"Invalid input: {e}", 400)
+
+    if profile_id:
+        try:
+            profile = PROFILES.get(profile_id)
+        except ProfileNotFound:
+            return None, (f"Unknown profile_id: {profile_id}", 404)
+        date, time_ = profile["birth_date"], profile["birth_time"]
+        lat, lon = profile["lat"], profile["lon"]
+        city = city or profile["city"]
+        tz_id = profile["tzid"] or tz_id
+        natal = ChartSnapshot.from_dict(profile["natal"])
+    else:
+        place, err = _city_from(data)
+        if err:
+            return None, err
+        if place is not None:
+            city = city or place.city
+            lat, lon = place.lat, place.lon
+            if "/" not in (data.get("tz") or "") and place.tzid:
+                tz_id = place.tzid
+        missing = [k for k, v in [("date", date), ("time", time_), ("city", city), ("lat", lat), ("lon", lon)] if v in ("", None)]
+        if missing:
+            return None, (f"Missing required fields: {', '.join(missing)}", 400)
+
+    return dict(date=date, time=time_, city=city, lat=lat, lon=lon, lang=lang,
+                tz_id=tz_id, house_system=house_system, natal=natal, sections=sections), None
+
+@app.get("/forecast")
+@app.post("/forecast")
+def forecast():
+    data = _request_data()
+    if data is None:
+        return _json_response({"ok": False, "error": "Invalid JSON body"}, 400)
 
-    missing = [k for k, v in [("date", date), ("time", time_), ("city", city), ("lat", lat), ("lon", lon)] if not v]
-    if missing:
-        return _json_response({"ok": False, "error": f"Missing required fields: {', '.join(missing)}"}, 400)
+    args, err = _forecast_item(data)
+    if err:
+        return _json_response({"ok": False, "error": err[0]}, err[1])
 
     try:
-        result = run_forecast_cli(
-            date, time_, city, lat, lon, lang, tz_id, house_system,
-            timeout_sec=timeout_sec
-        )
-        return _json_response(result, 200)
-    except subprocess.TimeoutExpired:
-        return _json_response({"ok": False, "error": f"Computation timed out after {timeout_sec}s"}, 504)
-    except FileNotFoundError as e:
-        return _json_response({"ok": False, "error": str(e)}, 500)
-    except RuntimeError as e:
-        return _json_response({"ok": False, "error": str(e)}, 500)
+        bucket, now_utc, max_age = _time_bucket()
+        tz_id = args["tz_id"]
+        etag = _cache_key("forecast", {
+            "date": args["date"], "time": args["time"], "city": args["city"],
+            "lat": round(float(args["lat"]), 6), "lon": round(float(args["lon"]), 6),
+            "tzid": tz_id if "/" in (tz_id or "") else None, "lang": args["lang"],
+            "sections": sorted(args["sections"]),
+        }, bucket)
+        not_modified = _not_modified(etag, max_age)
+        if not_modified is not None:
+            return not_modified
+
+        # מפתח קנוני לאיחוד: מיקום מכומת לדקת קשת (כמו GeoPos של flatlib), דלי הזמן ושפה.
+        # city/lat/lon רק מוחזרים כמו שהם בתשובה – מעדכנים אותם לכל קורא.
+        flight_key = ("forecast", args["date"], args["time"],
+                      astrology_forecast.dec_to_geostr(float(args["lat"]), True),
+                      astrology_forecast.dec_to_geostr(float(args["lon"]), False),
+                      tz_id if "/" in (tz_id or "") else None, args["lang"], args["sections"], bucket)
+        result, _ = FLIGHTS.do(flight_key, run_forecast, **args, now_utc=now_utc)
+        result = dict(result, city=args["city"], lat=float(args["lat"]), lon=float(args["lon"]))
+        return _json_response(result, 200, headers=_cache_headers(etag, max_age))
+    except ComputeBusy as e:
+        return _busy_response(e)
+    except DeadlineExceeded as e:
+        return _json_response({"ok": False, "error": str(e)}, 504)
+    except ValueError as e:
+        return _json_response({"ok": False, "error": f"Invalid input: {e}"}, 400)
     except Exception as e:
         return _json_response({"ok": False, "error": f"Unexpected error: {e}"}, 500)
 
-@app.post("/pro_forecast")
-def pro_forecast():
+@app.post("/forecast/batch")
+def forecast_batch():
+    """
+    הרבה תחזיות בבקשה אחת (לעבודות רענון של ה-back-office).
+    גוף: {"items": [...], "lang": "he"} או רשימה ישירה. כל פריט – שדות לידה כמו ב-/forecast
+    או profile_id, ואופציונלית "id" שמוחזר כמו שהוא.
+
+    התשובה היא NDJSON בזרימה: שורה לכל פריט ברגע שהוא מוכן (לא בהכרח לפי הסדר –
+    "index" מצביע על מיקום הפריט בבקשה), ובסוף שורת סיכום {"done": true, ...}.
+    שגיאה של פריט מדווחת בשורה שלו ולא מפילה את האצווה.
+
+    כל הפריטים מחושבים לאותו רגע טרנזיט (תחילת דלי הזמן, כמו /forecast).
+    הפריטים ממוינים לפי אזור זמן ונשלחים למאגר בחבילות של BATCH_CHUNK, כך שפריטים
+    באותו אזור זמן חולקים את מיקומי הכוכבים במטמון של אותו worker. בכל רגע יש בדרך רק חלון קטן של חבילות, אז
+    הזיכרון לא גדל עם גודל האצווה.
+    """
     try:
-        data = request.get_json(force=True) or {}
+        data = request.get_json(force=True)
     except Exception:
         return _json_response({"ok": False, "error": "Invalid JSON body"}, 400)
 
+    if isinstance(data, dict):
+        items, lang = data.get("items"), (data.get("lang") or "he").strip()
+    else:
+        items, lang = data, "he"
+    if not isinstance(items, list) or not items:
+        return _json_response({"ok": False, "error": "Body must contain a non-empty 'items' list"}, 400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return _json_response({"ok": False, "error": f"Too many items (max {BATCH_MAX_ITEMS})"}, 413)
+
+    _, now_utc, _ = _time_bucket()   # אותו רגע כמו /forecast באותו דלי זמן
+
+    def tz_key(i):
+        item = items[i] if isinstance(items[i], dict) else {}
+        return str(item.get("tz") or item.get("profile_id") or "")
+
+    order = sorted(range(len(items)), key=tz_key)
+    chunks = [order[i:i + BATCH_CHUNK] for i in range(0, len(order), BATCH_CHUNK)]
+
+    def line(index, row):
+        item = items[index] if isinstance(items[index], dict) else {}
+        out = {"index": index}
+        if "id" in item:
+            out["id"] = item["id"]
+        out.update(row)
+        return json.dumps(out, ensure_ascii=False) + "\n"
+
+    def generate():
+        ok_count = err_count = 0
+        pending = {}   # future -> [indices]
+        staged = None  # פריטי החבילה הבאה, מפוענחים (נשמרים אם המאגר היה עמוס)
+        window = max(1, COMPUTE.workers)
+        next_chunk = 0
+
+        while next_chunk < len(chunks) or pending:
+            # מילוי החלון
+            while next_chunk < len(chunks) and len(pending) < window:
+                if staged is None:
+                    staged = []
+                    for index in chunks[next_chunk]:
+                        item = items[index]
+                        if not isinstance(item, dict):
+                            err_count += 1
+                            yield line(index, {"ok": False, "error": "Item must be an object", "status": 400})
+                            continue
+                        args, err = _forecast_item(item, lang)
+                        if err:
+                            err_count += 1
+                            yield line(index, {"ok": False, "error": err[0], "status": err[1]})
+                            continue
+                        tz_id = args["tz_id"]
+                        staged.append({"index": index, "kwargs": {
+                            "birth_date": args["date"], "birth_time": args["time"], "city_name": args["city"],
+                            "lat": args["lat"], "lon": args["lon"],
+                            "tzid": tz_id if "/" in (tz_id or "") else None,
+                            "lang": args["lang"], "natal": args["natal"], "sections": args["sections"],
+                        }})
+                jobs = staged
+                if not jobs:
+                    staged = None
+                    next_chunk += 1
+                    continue
+                try:
+                    fut = COMPUTE.submit(astrology_forecast.compute_forecast_many, jobs, now_utc,
+                                         deadline=FORECAST_DEADLINE_SEC)
+                except ComputeBusy as e:
+                    if pending:
+                        break   # נחכה שחבילה שלנו תסתיים ונגיש שוב
+                    for job in jobs:
+                        err_count += 1
+                        yield line(job["index"], {"ok": False, "error": str(e), "status": 503,
+                                                  "retry_after": e.retry_after})
+                    staged = None
+                    next_chunk += 1
+                    continue
+                pending[fut] = [job["index"] for job in jobs]
+                staged = None
+                next_chunk += 1
+
+            if not pending:
+                continue
+            done, _ = wait(list(pending), timeout=FORECAST_DEADLINE_SEC, return_when=FIRST_COMPLETED)
+            if not done:
+                # אף חבילה לא הסתיימה בזמן – מוותרים על כולן
+                for fut, indices in pending.items():
+                    fut.cancel()
+                    for index in indices:
+                        err_count += 1
+                        yield line(index, {"ok": False, "error": "Computation exceeded its deadline", "status": 504})
+                pending.clear()
+                continue
+            for fut in done:
+                indices = pending.pop(fut)
+                try:
+                    rows = fut.result()
+                except Exception as e:
+                    rows = [{"index": i, "ok": False, "error": f"Unexpected error: {e}", "status": 500} for i in indices]
+                for row in rows:
+                    index = row.pop("index")
+                    if row["ok"]:
+                        ok_count += 1
+                    else:
+                        err_count += 1
+                        row.setdefault("status", 400 if row["error"].startswith("Invalid input") else 500)
+                    yield line(index, row)
+
+        yield json.dumps({"done": True, "count": len(items), "ok": ok_count, "errors": err_count,
+                          "transit_utc": now_utc.isoformat()}) + "\n"
+
+    return Response(stream_with_context(generate()), status=200,
+                    mimetype="application/x-ndjson; charset=utf-8")
+
+def _pro_item(data: dict):
+    """
+    פענוח שדות בקשת PRO (שדות לידה, profile_id או city_id).
+    מחזיר (kwargs ל-run_pro, None) או (None, (הודעת שגיאה, סטטוס)).
+    """
     transit_date = (data.get("transit_date") or "").strip()
     birth_date = (data.get("birth_date") or "").strip()
     birth_time = (data.get("birth_time") or "").strip()
@@ -204,7 +569,30 @@ def pro_forecast():
     lat = data.get("lat", "")
     lon = data.get("lon", "")
     lang = (data.get("lang") or "he").strip()
-    timeout_sec = int(data.get("timeout", 25))
+    profile_id = (data.get("profile_id") or "").strip()
+    natal = None
+
+    if profile_id:
+        try:
+            profile = PROFILES.get(profile_id)
+        except ProfileNotFound:
+            return None, (f"Unknown profile_id: {profile_id}", 404)
+        birth_date, birth_time = profile["birth_date"], profile["birth_time"]
+        lat, lon = profile["lat"], profile["lon"]
+        tz = tz or profile["tz_offset"]
+        natal = ChartSnapshot.from_dict(profile["natal"])
+    else:
+        place, err = _city_from(data)
+        if err:
+            return None, err
+        if place is not None:
+            lat, lon = place.lat, place.lon
+            if not tz and place.tzid and birth_date and birth_time:
+                try:
+                    birth_local = datetime.strptime(f"{birth_date.replace('/', '-')} {birth_time}", "%Y-%m-%d %H:%M")
+                    _, tz = resolve_tz(place.tzid, lat, lon, birth_local)
+                except Exception as e:
+                    return None, (f"Invalid input: {e}", 400)
 
     missing = [k for k, v in [
         ("transit_date", transit_date),
@@ -213,22 +601,278 @@ def pro_forecast():
         ("tz", tz),
         ("lat", lat),
         ("lon", lon),
-    ] if not v]
+    ] if v in ("", None)]
+    if missing:
+        return None, (f"Missing required fields: {', '.join(missing)}", 400)
+
+    # resolution: חלונות מזל כל N דקות (1..180) במקום כל 3 שעות
+    resolution_min = data.get("resolution")
+    if resolution_min in ("", None):
+        resolution_min = None
+    else:
+        try:
+            resolution_min = int(resolution_min)
+        except (TypeError, ValueError):
+            resolution_min = 0
+        if not 1 <= resolution_min <= astro_calc_api.MAX_RESOLUTION_MIN:
+            return None, (f"resolution must be 1..{astro_calc_api.MAX_RESOLUTION_MIN} minutes", 400)
+
+    return dict(transit_date=transit_date, birth_date=birth_date, birth_time=birth_time, tz=tz,
+                lat=lat, lon=lon, lang=lang, natal=natal, resolution_min=resolution_min), None
+
+@app.get("/pro_forecast")
+@app.post("/pro_forecast")
+def pro_forecast():
+    data = _request_data()
+    if data is None:
+        return _json_response({"ok": False, "error": "Invalid JSON body"}, 400)
+
+    args, err = _pro_item(data)
+    if err:
+        return _json_response({"ok": False, "error": err[0]}, err[1])
+
+    try:
+        transit_date, birth_date = args["transit_date"].replace("/", "-"), args["birth_date"].replace("/", "-")
+        key = {
+            "transit_date": transit_date, "birth_date": birth_date,
+            "birth_time": args["birth_time"], "tz": args["tz"],
+            "lat": round(float(args["lat"]), 6), "lon": round(float(args["lon"]), 6), "lang": args["lang"],
+        }
+        if args["resolution_min"]:
+            key["resolution"] = args["resolution_min"]
+        etag = _cache_key("pro", key)
+        not_modified = _not_modified(etag, PRO_MAX_AGE_SEC)
+        if not_modified is not None:
+            return not_modified
+
+        flight_key = ("pro", transit_date, birth_date, args["birth_time"], args["tz"],
+                      astro_calc_api._parse_geo_component(str(args["lat"]), is_lat=True),
+                      astro_calc_api._parse_geo_component(str(args["lon"]), is_lat=False), args["lang"],
+                      args["resolution_min"])
+        result, _ = FLIGHTS.do(flight_key, run_pro, **args)
+        return _json_response(result, 200, headers=_cache_headers(etag, PRO_MAX_AGE_SEC))
+    except ComputeBusy as e:
+        return _busy_response(e)
+    except DeadlineExceeded as e:
+        return _json_response({"ok": False, "error": str(e)}, 504)
+    except ValueError as e:
+        return _json_response({"ok": False, "error": f"Invalid input: {e}"}, 400)
+    except Exception as e:
+        return _json_response({"ok": False, "error": f"Unexpected error: {e}"}, 500)
+
+@app.get("/pro_forecast/stream")
+@app.post("/pro_forecast/stream")
+def pro_forecast_stream():
+    """
+    תחזית PRO לטווח ארוך (days: 1..MAX_STREAM_DAYS, ברירת מחדל 30) כ-NDJSON בזרימה:
+    שורה לכל יום (אותו dict כמו ב-"days" של /pro_forecast), לפי הסדר, ובסוף {"done": true, ...}.
+
+    הימים נשלחים למאגר בחבילות של STREAM_CHUNK_DAYS (כל חבילה – ימים רצופים שחולקים
+    את מפת הלידה ואת מטמון הטרנזיט של ה-worker), עם חלון קטן של חבילות בדרך – כך שהזיכרון
+    לא תלוי באורך הטווח. שגיאה באמצע נשלחת כשורת {"ok": false, ...} והזרם נעצר.
+    """
+    data = _request_data()
+    if data is None:
+        return _json_response({"ok": False, "error": "Invalid JSON body"}, 400)
+
+    args, err = _pro_item(data)
+    if err:
+        return _json_response({"ok": False, "error": err[0]}, err[1])
+    try:
+        days = int(data.get("days") or STREAM_DEFAULT_DAYS)
+        start = datetime.strptime(args["transit_date"].replace("/", "-"), "%Y-%m-%d")
+    except ValueError as e:
+        return _json_response({"ok": False, "error": f"Invalid input: {e}"}, 400)
+    if not 1 <= days <= astro_calc_api.MAX_STREAM_DAYS:
+        return _json_response({"ok": False, "error": f"days must be 1..{astro_calc_api.MAX_STREAM_DAYS}"}, 400)
+
+    offsets = list(range(0, days, STREAM_CHUNK_DAYS))
+
+    def submit(offset):
+        return COMPUTE.submit(
+            astro_calc_api.compute_pro_days,
+            args["birth_date"], args["birth_time"], args["tz"], str(args["lat"]), str(args["lon"]),
+            lang=args["lang"], transit_date=(start + timedelta(days=offset)).strftime("%Y-%m-%d"),
+            days=min(STREAM_CHUNK_DAYS, days - offset), natal=args["natal"],
+            resolution_min=args["resolution_min"], deadline=PRO_DEADLINE_SEC,
+        )
+
+    def generate():
+        pending = []   # futures לפי הסדר
+        window = max(1, COMPUTE.workers)
+        sent = 0
+        next_chunk = 0
+        try:
+            while next_chunk < len(offsets) or pending:
+                while next_chunk < len(offsets) and len(pending) < window:
+                    try:
+                        pending.append(submit(offsets[next_chunk]))
+                    except ComputeBusy:
+                        if pending:
+                            break   # נחכה לחבילה הבאה ונגיש שוב
+                        raise
+                    next_chunk += 1
+                rows = pending.pop(0).result(timeout=PRO_DEADLINE_SEC)
+                for row in rows:
+                    sent += 1
+                    yield json.dumps(row, ensure_ascii=False) + "\n"
+        except ComputeBusy as e:
+            yield json.dumps({"ok": False, "error": str(e), "status": 503, "retry_after": e.retry_after}) + "\n"
+            return
+        except (DeadlineExceeded, FutureTimeout):
+            yield json.dumps({"ok": False, "error": "Computation exceeded its deadline", "status": 504}) + "\n"
+            return
+        except ValueError as e:
+            yield json.dumps({"ok": False, "error": f"Invalid input: {e}", "status": 400}, ensure_ascii=False) + "\n"
+            return
+        except Exception as e:
+            yield json.dumps({"ok": False, "error": f"Unexpected error: {e}", "status": 500}, ensure_ascii=False) + "\n"
+            return
+        finally:
+            for fut in pending:
+                fut.cancel()
+        yield json.dumps({"done": True, "days": sent}) + "\n"
+
+    return Response(stream_with_context(generate()), status=200,
+                    mimetype="application/x-ndjson; charset=utf-8")
+
+@app.post("/profiles")
+def create_profile():
+    """
+    מחשב פעם אחת את כל נתוני הלידה ושומר. מחזיר profile_id ששני מסלולי התחזית מקבלים
+    במקום שדות הלידה. אותו קלט => אותו id.
+    """
+    try:
+        data = request.get_json(force=True) or {}
+    except Exception:
+        return _json_response({"ok": False, "error": "Invalid JSON body"}, 400)
+
+    birth_date = (data.get("birth_date") or data.get("date") or "").strip()
+    birth_time = (data.get("birth_time") or data.get("time") or "").strip()
+    lat = data.get("lat", "")
+    lon = data.get("lon", "")
+    tz = (data.get("tz") or "").strip()
+    city = (data.get("city") or "").strip()
+
+    place, err = _city_from(data)
+    if err:
+        return _json_response({"ok": False, "error": err[0]}, err[1])
+    if place is not None:
+        lat, lon = place.lat, place.lon
+        city = city or place.city
+        tz = tz or place.tzid or ""
+
+    missing = [k for k, v in [("birth_date", birth_date), ("birth_time", birth_time), ("lat", lat), ("lon", lon)] if v in ("", None)]
     if missing:
         return _json_response({"ok": False, "error": f"Missing required fields: {', '.join(missing)}"}, 400)
 
     try:
-        result = run_pro_cli(transit_date, birth_date, birth_time, tz, lat, lon, lang, timeout_sec=timeout_sec)
-        return _json_response(result, 200)
-    except subprocess.TimeoutExpired:
-        return _json_response({"ok": False, "error": f"Computation timed out after {timeout_sec}s"}, 504)
-    except FileNotFoundError as e:
-        return _json_response({"ok": False, "error": str(e)}, 500)
-    except RuntimeError as e:
-        return _json_response({"ok": False, "error": str(e)}, 500)
+        profile = PROFILES.create(birth_date, birth_time, lat, lon, tz=tz, city=city)
+    except ValueError as e:
+        return _json_response({"ok": False, "error": f"Invalid input: {e}"}, 400)
     except Exception as e:
         return _json_response({"ok": False, "error": f"Unexpected error: {e}"}, 500)
 
+    return _json_response({
+        "ok": True,
+        "profile_id": profile["id"],
+        "tzid": profile["tzid"],
+        "tz_offset": profile["tz_offset"],
+        "city": profile["city"],
+    }, 201)
+
+@app.get("/profiles/<profile_id>")
+def get_profile(profile_id):
+    try:
+        profile = PROFILES.get(profile_id)
+    except ProfileNotFound:
+        return _json_response({"ok": False, "error": f"Unknown profile_id: {profile_id}"}, 404)
+    return _json_response({"ok": True, "profile": profile})
+
+# ---------- Cities ----------
+
+def _cities_unavailable():
+    return _json_response({"ok": False, "error": "City index unavailable"}, 503)
+
+def _int_arg(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        return max(lo, min(hi, int(request.args.get(name, default))))
+    except (TypeError, ValueError):
+        return default
+
+@app.get("/cities")
+def cities_search():
+    """השלמה אוטומטית: /cities?q=tel&limit=10[&country=IL]"""
+    if CITIES is None:
+        return _cities_unavailable()
+    q = (request.args.get("q") or "").strip()
+    results = CITIES.search(q, limit=_int_arg("limit", 10, 1, 50), country=request.args.get("country"))
+    return _json_response({"ok": True, "q": q, "results": [cities.to_dict(c) for c in results]},
+                          headers={"Cache-Control": "public, max-age=86400"})
+
+@app.get("/cities/near")
+def cities_near():
+    """עיר/ערים קרובות לנקודה: /cities/near?lat=32.08&lon=34.78[&limit=1][&max_km=300]"""
+    if CITIES is None:
+        return _cities_unavailable()
+    try:
+        lat = float(request.args.get("lat", ""))
+        lon = float(request.args.get("lon", ""))
+        results = CITIES.nearest(lat, lon, limit=_int_arg("limit", 1, 1, 50),
+                                 max_km=_int_arg("max_km", CITIES_NEAR_MAX_KM, 1, 20040))
+    except ValueError as e:
+        return _json_response({"ok": False, "error": f"Invalid input: {e}"}, 400)
+    return _json_response({"ok": True, "results": [cities.to_dict(c, d) for c, d in results]},
+                          headers={"Cache-Control": "public, max-age=86400"})
+
+# ---------- Retrogrades ----------
+
+RETRO_DEFAULT_DAYS = 90
+RETRO_MAX_DAYS = 3660   # עד ~10 שנים בבקשה אחת
+
+def _utc_arg(name: str, default: datetime) -> datetime:
+    """YYYY-MM-DD או YYYY-MM-DDTHH:MM (UTC). ValueError על פורמט שגוי."""
+    value = (request.args.get(name) or "").strip()
+    if not value:
+        return default
+    dt = datetime.fromisoformat(value)
+    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+@app.get("/retrogrades")
+def retrogrades():
+    """
+    תחנות ותקופות נסיגה מלוח התחנות: /retrogrades?from=2026-01-01&to=2026-12-31
+    (ברירת מחדל: היום + RETRO_DEFAULT_DAYS ימים). זמנים ב-UTC.
+    """
+    cal = stations.get_calendar()
+    if cal is None:
+        return _json_response({"ok": False, "error": "Station calendar unavailable"}, 503)
+    try:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        start = _utc_arg("from", today)
+        end = _utc_arg("to", start + timedelta(days=RETRO_DEFAULT_DAYS))
+    except ValueError as e:
+        return _json_response({"ok": False, "error": f"Invalid input: {e}"}, 400)
+    if end <= start or (end - start).days > RETRO_MAX_DAYS:
+        return _json_response({"ok": False, "error": f"to must be after from, at most {RETRO_MAX_DAYS} days"}, 400)
+    jd0, jd1 = stations.jd_from_datetime(start), stations.jd_from_datetime(end)
+    if not (cal.covers(jd0) and cal.covers(jd1)):
+        return _json_response({"ok": False, "error": f"Range outside the calendar ({cal.stats()['from'][:10]}"
+                                                     f"..{cal.stats()['to'][:10]})"}, 400)
+
+    def utc(jd):
+        return stations.datetime_from_jd(jd).isoformat(timespec="seconds")
+
+    return _json_response({
+        "ok": True,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "retrograde_at_start": cal.retro_at(jd0),
+        "stations": [{"planet": p, "type": "retrograde" if kind == "R" else "direct", "utc": utc(jd)}
+                     for jd, p, kind in cal.stations_between(jd0, jd1)],
+        "periods": [{"planet": p, "start": utc(s), "end": utc(e)} for s, e, p in cal.periods_between(jd0, jd1)],
+    }, headers={"Cache-Control": "public, max-age=86400"})
+
 # ---------- Main (dev only) ----------
 
 if __name__ == "__main__":
@@ -1,53 +1,34 @@
 # -*- coding: utf-8 -*-
 import sys, json, io
 from datetime import datetime, timedelta
+from functools import partial
 import pytz
+import numpy as np
 from flatlib.chart import Chart
 from flatlib.datetime import Datetime
 from flatlib.geopos import GeoPos
 from flatlib import const, angle
 
-# ===== תמיכה בעברית ב-Windows =====
-try:
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='\n')
-except Exception:
-    pass
+from transit_cache import transit_chart
+from positions import lean_chart
+import timezones
+import sky_index
+import stations
+import aspect_solver
+import aspect_engine
+import scoring
+import metrics
+import compute_pool
 
 # שימוש:
 # python astrology_forecast.py YYYY-MM-DD HH:MM City LAT LON [TZID] [lang]
-
-if len(sys.argv) < 6:
-    print(json.dumps({"error": "Missing arguments (need: date time city lat lon [tzid] [lang])"}), flush=True)
-    sys.exit(1)
-
-birth_date = sys.argv[1]
-birth_time = sys.argv[2]
-city_name  = sys.argv[3]
-lat        = float(sys.argv[4])
-lon        = float(sys.argv[5])
-
-tzid = None
-lang = "he"
-
-if len(sys.argv) >= 7:
-    candidate = sys.argv[6]
-    if "/" in candidate:
-        tzid = candidate
-        if len(sys.argv) >= 8:
-            lang = sys.argv[7]
-    else:
-        lang = candidate
+#
+# או מתוך פייתון (השרת קורא לזה ישירות, בלי תת-תהליך):
+# compute_forecast(birth_date, birth_time, city_name, lat, lon, tzid=None, lang="he")
 
 def guess_tzid(lat, lon):
-    try:
-        from timezonefinder import TimezoneFinder
-        tzf = TimezoneFinder()
-        return tzf.timezone_at(lat=lat, lng=lon)
-    except Exception:
-        return None
-
-if not tzid:
-    tzid = guess_tzid(lat, lon) or "Etc/UTC"
+    # TimezoneFinder אחד לתהליך + מטמון לפי מיקום (timezones.py)
+    return timezones.tzid_at(lat, lon)
 
 # ---- המרה decimal -> GeoPos ----
 def dec_to_geostr(val, is_lat=True):
@@ -62,19 +43,13 @@ def dec_to_geostr(val, is_lat=True):
         minutes = 0
     return f"{deg}{sign}{minutes}"
 
-LAT_STR = dec_to_geostr(lat, True)
-LON_STR = dec_to_geostr(lon, False)
-LOCATION = GeoPos(LAT_STR, LON_STR)
+def build_location(lat, lon):
+    return GeoPos(dec_to_geostr(lat, True), dec_to_geostr(lon, False))
 
 # ---- offset לפי אזור זמן ----
 def tz_offset_str(dt_naive, tz_name):
-    tz = pytz.timezone(tz_name)
-    localized = tz.localize(dt_naive, is_dst=None)
-    off = localized.utcoffset() or timedelta()
-    total_min = int(off.total_seconds() // 60)
-    sgn = "+" if total_min >= 0 else "-"
-    hh, mm = divmod(abs(total_min), 60)
-    return f"{sgn}{hh:02d}:{mm:02d}"
+    # חיפוש בינארי בטבלת המעברים של האזור (כמו tz.localize(dt, is_dst=None))
+    return timezones.offset_str(dt_naive, tz_name)
 
 # ==== רשימת אובייקטים לצ'ארט ====
 OBJECTS = [
@@ -82,27 +57,6 @@ OBJECTS = [
     const.JUPITER, const.SATURN, const.URANUS, const.NEPTUNE, const.PLUTO
 ]
 
-# ===== מפת לידה =====
-birth_dt_local = datetime.strptime(f"{birth_date} {birth_time}", "%Y-%m-%d %H:%M")
-birth_off = tz_offset_str(birth_dt_local, tzid)
-natal_dt = Datetime(
-    birth_dt_local.strftime('%Y/%m/%d'),
-    birth_dt_local.strftime('%H:%M'),
-    birth_off
-)
-natal_chart = Chart(natal_dt, LOCATION, IDs=OBJECTS)
-
-# ===== מפת טרנזיט (עכשיו) =====
-now_local = datetime.now(pytz.timezone(tzid)).replace(second=0, microsecond=0)  # aware
-now_local_naive = now_local.replace(tzinfo=None)  # naive
-now_off = tz_offset_str(now_local_naive, tzid)
-transit_dt = Datetime(
-    now_local_naive.strftime('%Y/%m/%d'),
-    now_local_naive.strftime('%H:%M'),
-    now_off
-)
-transit_chart = Chart(transit_dt, LOCATION, IDs=OBJECTS)
-
 # ===== שמות כוכבים =====
 planet_names = {
     "he": {
@@ -116,9 +70,20 @@ planet_names = {
         const.NEPTUNE:"♆ Neptune", const.PLUTO:"♇ Pluto"
     },
 }
-names = planet_names.get(lang, planet_names["he"])
 PLANETS = list(OBJECTS)
 
+def names_for(lang):
+    return planet_names.get(lang, planet_names["he"])
+
+def chart_at_local(dt_loc_naive, tzid, location, angles=True):
+    """
+    dt_loc_naive: datetime נאיבי (ללא tzinfo). כוכבים ממטמון הטרנזיטים המשותף,
+    ASC/MC למיקום רק אם angles (סריקות היבטים צריכות רק כוכבים).
+    """
+    off = tz_offset_str(dt_loc_naive, tzid)
+    fdt = Datetime(dt_loc_naive.strftime('%Y/%m/%d'), dt_loc_naive.strftime('%H:%M'), off)
+    return transit_chart(fdt, location, OBJECTS, angles=angles)
+
 def fmt_degmin(lon, sign_name):
     """מציג מיקום בתוך המזל: 0°00′–29°59′ + שם המזל."""
     L = angle.norm(float(lon))          # 0..360
@@ -132,7 +97,7 @@ def fmt_degmin(lon, sign_name):
             d = 0
     return f"{sign_name} {d}°{m:02d}′"
 
-def positions_dict(chart):
+def positions_dict(chart, names):
     """טקסט לתצוגה + ℞ בסוף אם צריך"""
     out = {}
     for p in PLANETS:
@@ -145,7 +110,7 @@ def positions_dict(chart):
             continue
     return out
 
-def positions_raw(chart):
+def positions_raw(chart, names):
     """תאימות לאחור: {label: lon} בלבד (0..360)"""
     out = {}
     for p in PLANETS:
@@ -157,7 +122,7 @@ def positions_raw(chart):
             pass
     return out
 
-def positions_raw_meta(chart):
+def positions_raw_meta(chart, names):
     """חדש: {label: {lon: float, retro: bool, label: str}}"""
     out = {}
     for p in PLANETS:
@@ -173,13 +138,6 @@ def positions_raw_meta(chart):
             pass
     return out
 
-natal_positions       = positions_dict(natal_chart)
-transit_positions     = positions_dict(transit_chart)
-natal_positions_raw   = positions_raw(natal_chart)
-transit_positions_raw = positions_raw(transit_chart)
-natal_raw_meta        = positions_raw_meta(natal_chart)
-transit_raw_meta      = positions_raw_meta(transit_chart)
-
 # ===== היבטים טרנזיט → לידה =====
 def cyc_dist(a, b):
     return abs((a - b + 180) % 360 - 180)
@@ -192,7 +150,10 @@ ASPECT_DEFS = [
     (180, {"he": "אופוזיציה", "en": "Opposition"},  8),
 ]
 
-def nearest_aspect(delta):
+ASPECT_ANGLES = [a for a, _, _ in ASPECT_DEFS]
+ASPECT_ORBS = [o for _, _, o in ASPECT_DEFS]
+
+def nearest_aspect(delta, lang="he"):
     best = None
     for angleDeg, names_map, orb in ASPECT_DEFS:
         diff = abs(delta - angleDeg)
@@ -200,45 +161,51 @@ def nearest_aspect(delta):
             best = (angleDeg, names_map.get(lang, names_map["he"]), diff, orb)
     return best  # (angle, name, diff, orb)
 
-def aspects_transit_to_natal(chart_tr, chart_nat):
+def _aspect_rows(hits, t_index, chart_tr, chart_nat, names, lang):
+    """ממיר תוצאות aspect_engine (עבור זמן אחד) לרשומות ה-JSON הקיימות."""
     res = []
-    for t in PLANETS:
-        try:
-            tObj = chart_tr.get(t)
-        except KeyError:
-            continue
-        tName = names.get(t, str(t))
-        for n in PLANETS:
-            try:
-                nObj = chart_nat.get(n)
-            except KeyError:
-                continue
-            nName = names.get(n, str(n))
-            delta = cyc_dist(tObj.lon, nObj.lon)
-            asp = nearest_aspect(delta)
-            if asp:
-                angleDeg, aspName, orbActual, _ = asp
-                res.append({
-                    "tPlanet": tName,
-                    "nPlanet": nName,
-                    "aspect": aspName,
-                    "angle": angleDeg,
-                    "orb": round(float(orbActual), 2),
-                    "tPos": fmt_degmin(tObj.lon, tObj.sign),
-                    "nPos": fmt_degmin(nObj.lon, nObj.sign),
-                    "tRetro": bool(tObj.isRetrograde()),
-                    "nRetro": bool(nObj.isRetrograde()),
-                })
+    for j in np.flatnonzero(hits.t == t_index):
+        ti, ni, ai, orb = hits.tr[j], hits.na[j], hits.angle_idx[j], hits.orb[j]
+        tp, np_ = PLANETS[ti], PLANETS[ni]
+        tObj, nObj = chart_tr.get(tp), chart_nat.get(np_)
+        angleDeg, names_map, _ = ASPECT_DEFS[ai]
+        res.append({
+            "tPlanet": names.get(tp, str(tp)),
+            "nPlanet": names.get(np_, str(np_)),
+            "aspect": names_map.get(lang, names_map["he"]),
+            "angle": angleDeg,
+            "orb": round(float(orb), 2),
+            "tPos": fmt_degmin(tObj.lon, tObj.sign),
+            "nPos": fmt_degmin(nObj.lon, nObj.sign),
+            "tRetro": bool(tObj.isRetrograde()),
+            "nRetro": bool(nObj.isRetrograde()),
+        })
     return res
 
-aspects_list = aspects_transit_to_natal(transit_chart, natal_chart)
+def _lons(chart):
+    return [chart.get(p).lon for p in PLANETS]
+
+def aspects_transit_to_natal(chart_tr, chart_nat, names, lang="he"):
+    hits = aspect_engine.match(_lons(chart_nat), _lons(chart_tr), ASPECT_ANGLES, ASPECT_ORBS, order="tn")
+    return _aspect_rows(hits, 0, chart_tr, chart_nat, names, lang)
 
 # ===== עזר: Retrogrades ליום נתון =====
-def retrogrades_for_date(date_str, tzid, location):
+def retrogrades_for_date(date_str, tzid, location, names):
     """date_str בפורמט YYYY/MM/DD"""
     base_naive = datetime.strptime(date_str, "%Y/%m/%d")  # naive
+    # לוח התחנות: מי בנסיגה ב-12:00 מקומי, בחיפוש בינארי בלי מפה
+    noon = Datetime(date_str, '12:00', tz_offset_str(base_naive.replace(hour=12), tzid))
+    retro = stations.retro_at(noon.jd)
+    if retro is not None:
+        return [names.get(p, str(p)) + " ℞" for p in retro]
+    # אזור זמן נפוץ: רשימת הנסיגות של 12:00 מקומי מוכנה באינדקס הלילי
+    sky = sky_index.get_index()
+    utc_hour = sky.utc_hour(tzid, base_naive.strftime("%Y-%m-%d"), 12) if sky is not None else None
+    if utc_hour is not None:
+        retro = set(sky.retro_ids(utc_hour))
+        return [names.get(p, str(p)) + " ℞" for p in PLANETS if p in retro]
     dt = Datetime(date_str, '12:00', tz_offset_str(base_naive, tzid))
-    ch = Chart(dt, location, IDs=OBJECTS)
+    ch = transit_chart(dt, location, OBJECTS, angles=False)
     out = []
     for p in PLANETS:
         try:
@@ -274,171 +241,307 @@ def asc_mc(chart):
         pass
     return asc, mc
 
-natal_houses_raw   = houses_raw(natal_chart)
-transit_houses_raw = houses_raw(transit_chart)
-natal_asc_deg, natal_mc_deg     = asc_mc(natal_chart)
-transit_asc_deg, transit_mc_deg = asc_mc(transit_chart)
-
 # ===== בלוקים של "שעות מזל" =====
 START_HOUR = 5
 END_HOUR   = 23
 STEP_MIN   = 60
 
-def score_from_aspects(aspects):
-    score = 0
-    for a in aspects:
-        ang = a.get("angle")
-        if ang in (0, 60, 120, 180):
-            score += 2
-        elif ang == 90:
-            score += 1
-    return score
-
-def chart_at_local(dt_loc_naive):
-    """dt_loc_naive: datetime נאיבי (ללא tzinfo)"""
-    off = tz_offset_str(dt_loc_naive, tzid)
-    fdt = Datetime(dt_loc_naive.strftime('%Y/%m/%d'), dt_loc_naive.strftime('%H:%M'), off)
-    return Chart(fdt, LOCATION, IDs=OBJECTS)
-
-def lucky_blocks_for_day(center_dt_local_aware, natal_chart, tzid, location):
+def lucky_blocks_for_day(center_dt_local_aware, natal_chart, tzid, location, names, lang="he"):
     base = center_dt_local_aware.replace(hour=START_HOUR, minute=0, second=0, microsecond=0)
     end  = center_dt_local_aware.replace(hour=END_HOUR,   minute=0, second=0, microsecond=0)
 
-    blocks = []
+    times, charts = [], []
     cur = base
     while cur <= end:
-        cur_naive = cur.replace(tzinfo=None)
-        ch = chart_at_local(cur_naive)
-        aspects = aspects_transit_to_natal(ch, natal_chart)
+        times.append(cur)
+        charts.append(chart_at_local(cur.replace(tzinfo=None), tzid, location, angles=False))
+        cur += timedelta(minutes=STEP_MIN)
+
+    # כל שעות היום מול הלידה בפעולה וקטורית אחת; רק היבטים לכוכבי לידה של "כסף"
+    # (scoring.MONEY_NATAL, לפי מזהה – לא לפי התווית המתורגמת) נספרים ומוצגים
+    rules = scoring.compile_rules("blocks", PLANETS, PLANETS, ASPECT_ANGLES, ASPECT_ORBS)
+    hits, raw = rules.evaluate(_lons(natal_chart), [_lons(ch) for ch in charts], order="tn")
+    hits = rules.only_counted(hits)
+    pct = rules.percent(raw)
 
-        money_aspects = []
-        for a in aspects:
-            lbl = a["nPlanet"]
-            if any(k in lbl for k in ["ונוס", "Venus", "צדק", "Jupiter", "ירח", "Moon"]):
-                money_aspects.append(a)
+    blocks = []
+    for i, (cur, ch) in enumerate(zip(times, charts)):
+        money_aspects = _aspect_rows(hits, i, ch, natal_chart, names, lang)
 
         if money_aspects:
-            sc = score_from_aspects(money_aspects)
-            label_score = f"פוטנציאל: {min(sc * 10, 100)}%"
+            label_score = f"פוטנציאל: {int(pct[i])}%"
             blocks.append({
                 "time": cur.strftime("%H:%M"),
                 "score": label_score,
                 "aspects": money_aspects
             })
-
-        cur += timedelta(minutes=STEP_MIN)
     return blocks
 
-def lucky_blocks_for_multiple_days(start_local_dt_aware, natal_chart, tzid, location, days=3):
-    days_map = {}
-    for i in range(days):
-        cur = start_local_dt_aware + timedelta(days=i)
-        date_key = cur.strftime('%Y-%m-%d')
-        blocks = lucky_blocks_for_day(cur, natal_chart, tzid, location)
-
-        def _pct(s):
-            try:
-                return int(s.split('%')[0].split()[-1])
-            except Exception:
-                return 0
-
-        best_time = (max(blocks, key=lambda b: _pct(b["score"]))["time"] if blocks else None)
-        days_map[date_key] = {
-            "lucky_blocks": blocks,
-            "best_time": best_time,
-            "retrogrades": retrogrades_for_date(cur.strftime('%Y/%m/%d'), tzid, location),
-        }
-    return days_map
+def _blocks_day(cur, natal_chart, tzid, location, names, lang):
+    blocks = lucky_blocks_for_day(cur, natal_chart, tzid, location, names, lang)
+
+    def _pct(s):
+        try:
+            return int(s.split('%')[0].split()[-1])
+        except Exception:
+            return 0
+
+    best_time = (max(blocks, key=lambda b: _pct(b["score"]))["time"] if blocks else None)
+    return {
+        "lucky_blocks": blocks,
+        "best_time": best_time,
+        "retrogrades": retrogrades_for_date(cur.strftime('%Y/%m/%d'), tzid, location, names),
+    }
+
+def lucky_blocks_for_multiple_days(start_local_dt_aware, natal_chart, tzid, location, names, lang="he", days=3,
+                                   parallel=None):
+    """parallel: חלוקת הימים בין ליבות (None = רק מ-compute_pool.PARALLEL_MIN_DAYS ימים, False = סדרתי)."""
+    days_list = [start_local_dt_aware + timedelta(days=i) for i in range(days)]
+    one_day = partial(_blocks_day, natal_chart=natal_chart, tzid=tzid, location=location, names=names, lang=lang)
+    rows = compute_pool.map_ordered(one_day, days_list, parallel=compute_pool.use_parallel(days, parallel))
+    return {cur.strftime('%Y-%m-%d'): row for cur, row in zip(days_list, rows)}
 
 # ---- תאימות אחורה: lucky_hours (2 חלונות) ----
-def find_lucky_windows(now_naive, count=2):
+LUCKY_ANGLES = (60, 120)
+LUCKY_ORB = 2.0
+LUCKY_HORIZON_MIN = 16 * 60
+
+def find_lucky_windows(now_naive, natal_chart, tzid, location, count=2):
+    """
+    חלונות שבהם הירח בטרנזיט בסקסטיל/טריין (±2°) לונוס או צדק של הלידה.
+    במקום מפה כל 10 דקות: פותרים ישירות מתי כל היבט נכנס לאורב, מדויק ויוצא (aspect_solver),
+    כך ש-from/to מדויקים לדקה. "exact" = רגע ההיבט המדויק (אם נופל בחלון).
+    """
     tz = pytz.timezone(tzid)
-    start_aware = tz.localize(now_naive).replace(minute=0, second=0, microsecond=0)
+    start_aware = timezones.localize(now_naive, tzid).replace(minute=0, second=0, microsecond=0)
+    jd0 = aspect_solver.jd_from_datetime(start_aware)
+    jd1 = jd0 + LUCKY_HORIZON_MIN / 1440.0
+    margin = 0.5  # מספיק כדי לראות את ההתחלה/הסוף האמיתיים של חלון שחוצה את הקצוות
+
+    found = []
+    for p in (const.VENUS, const.JUPITER):
+        wins, _ = aspect_solver.find_windows(
+            const.MOON, natal_chart.get(p).lon, LUCKY_ANGLES, LUCKY_ORB, jd0 - margin, jd1 + margin
+        )
+        found.extend(w for w in wins if w["end"] >= jd0 and w["start"] <= jd1)
+    found.sort(key=lambda w: w["start"])
+
+    def hhmm(jd):
+        return (aspect_solver.datetime_from_jd(jd, tz) + timedelta(seconds=30)).strftime("%H:%M")
+
     windows = []
-    step = 10
-    horizon_minutes = 16 * 60
-    checked = 0
-    cur = start_aware
-
-    while checked <= horizon_minutes and len(windows) < count:
-        cur_naive = cur.replace(tzinfo=None)
-        cur_off = tz_offset_str(cur_naive, tzid)
-        cur_dt = Datetime(cur_naive.strftime('%Y/%m/%d'), cur_naive.strftime('%H:%M'), cur_off)
-        cur_chart = Chart(cur_dt, LOCATION, IDs=OBJECTS)
-
-        moon_tr = cur_chart.get(const.MOON).lon
-        venus_nat = natal_chart.get(const.VENUS).lon
-        jup_nat = natal_chart.get(const.JUPITER).lon
-
-        for target in (venus_nat, jup_nat):
-            d = cyc_dist(moon_tr, target)
-            if any(abs(d - k) <= 2 for k in (60, 120)):
-                start_str = (cur - timedelta(minutes=15)).strftime("%H:%M")
-                end_str   = (cur + timedelta(minutes=15)).strftime("%H:%M")
-                win = {"from": start_str, "to": end_str}
-                if not windows or windows[-1] != win:
-                    windows.append(win)
-                break
-
-        cur += timedelta(minutes=step)
-        checked += step
+    for w in found[:count]:
+        win = {"from": hhmm(w["start"]), "to": hhmm(w["end"])}
+        if w["exact"] is not None:
+            win["exact"] = hhmm(w["exact"])
+        windows.append(win)
 
     if not windows:
         windows = [{"from": "08:15", "to": "09:00"}, {"from": "16:40", "to": "17:10"}]
     return windows
 
-# ===== הפקה ל-JSON =====
-lucky_hours = find_lucky_windows(now_local_naive, count=2)
-lucky_blocks_today = lucky_blocks_for_day(now_local, natal_chart, tzid, LOCATION)
-daily_3days = lucky_blocks_for_multiple_days(now_local, natal_chart, tzid, LOCATION, days=3)
-
 comments = {
     "he": "כולל היבטי טרנזיט→לידה + חלונות מזל. PRO מקבל גם 3 ימים קדימה 🎯",
     "en": "Includes transit→natal aspects + lucky windows. PRO also gets 3-day outlook 🎯",
 }
 
-response = {
-    "date": now_local_naive.strftime('%Y-%m-%d'),
-    "city": city_name,
-    "lat": lat,
-    "lon": lon,
-    "tzid": tzid,
-    "lang": lang,
-    "app": "LOTTOLUCK",
+# ===== בחירת חלקים (sections) =====
+# כל חלק => מפתחות ה-response שלו. date/city/lat/lon/tzid/lang/app/comment תמיד מוחזרים.
+SECTIONS = {
+    "natal":        ("natal", "natal_raw", "natal_raw_meta"),
+    "transit":      ("transit", "transit_raw", "transit_raw_meta"),
+    "aspects":      ("aspects",),
+    "lucky_hours":  ("lucky_hours",),
+    "lucky_blocks": ("lucky_blocks",),
+    "daily_3days":  ("daily_3days",),
+    "houses":       ("natal_houses_raw", "transit_houses_raw", "natal_asc_deg", "natal_mc_deg",
+                     "transit_asc_deg", "transit_mc_deg"),
+}
+# מה שמסך החינמי מציג: מיקומים, היבטים ו-2 חלונות מזל (בלי בלוקים / 3 ימים / בתים)
+SECTION_PRESETS = {
+    "all":  tuple(SECTIONS),
+    "free": ("natal", "transit", "aspects", "lucky_hours"),
+}
+# אילו מפות כל חלק צריך (מפת הלידה מפרופיל שמור לא נבנית בכלל)
+_NEEDS_NATAL = {"natal", "aspects", "lucky_hours", "lucky_blocks", "daily_3days", "houses"}
+_NEEDS_TRANSIT = {"transit", "aspects", "houses"}
+
+
+def parse_sections(value):
+    """
+    None/""/"all" => כל החלקים. אחרת רשימה או מחרוזת מופרדת בפסיקים של שמות חלקים / presets
+    (למשל "free" או "natal,aspects"). ValueError על שם לא מוכר.
+    """
+    if value is None:
+        return frozenset(SECTIONS)
+    if isinstance(value, str):
+        value = value.split(",")
+    out = set()
+    for name in (str(v).strip().lower() for v in value):
+        if not name:
+            continue
+        if name in SECTION_PRESETS:
+            out.update(SECTION_PRESETS[name])
+        elif name in SECTIONS:
+            out.add(name)
+        else:
+            raise ValueError(f"Unknown section: {name}")
+    return frozenset(out) if out else frozenset(SECTIONS)
+
+
+# ===== מנוע: מחזיר את ה-response כ-dict =====
+def compute_forecast(birth_date, birth_time, city_name, lat, lon, tzid=None, lang="he", now_local=None,
+                     natal=None, now_utc=None, sections=None):
+    """
+    birth_date: YYYY-MM-DD, birth_time: HH:MM
+    now_local: datetime aware לזמן הטרנזיט (ברירת מחדל: עכשיו באזור הזמן של המיקום)
+    now_utc: כמו now_local אבל ב-UTC (מומר לאזור הזמן של המיקום) – לקורא שלא מכיר את ה-tzid
+    natal: ChartSnapshot מוכן מפרופיל שמור (profiles.py) – אם קיים, לא בונים מפת לידה
+    sections: אילו חלקים לחשב (ראו parse_sections); רק הם והמפות שהם צריכים מחושבים
+    """
+    sections = parse_sections(sections)
+    lat = float(lat)
+    lon = float(lon)
+    if not tzid:
+        tzid = guess_tzid(lat, lon) or "Etc/UTC"
+
+    location = build_location(lat, lon)
+    names = names_for(lang)
+
+    # ===== מפת לידה =====
+    natal_chart = None
+    if natal is not None:
+        natal_chart = natal
+    elif sections & _NEEDS_NATAL:
+        birth_dt_local = datetime.strptime(f"{birth_date} {birth_time}", "%Y-%m-%d %H:%M")
+        birth_off = tz_offset_str(birth_dt_local, tzid)
+        natal_dt = Datetime(
+            birth_dt_local.strftime('%Y/%m/%d'),
+            birth_dt_local.strftime('%H:%M'),
+            birth_off
+        )
+        if "houses" in sections:
+            natal_chart = Chart(natal_dt, location, IDs=OBJECTS)   # houses_raw / asc_mc צריכים מפה מלאה
+        else:
+            natal_chart = lean_chart(natal_dt, location, OBJECTS, angles=False)
+        metrics.count("charts")
+
+    # ===== מפת טרנזיט (עכשיו) =====
+    if now_local is None:
+        now_local = (now_utc or datetime.now(pytz.utc)).astimezone(pytz.timezone(tzid))
+    now_local = now_local.replace(second=0, microsecond=0)  # aware
+    now_local_naive = now_local.replace(tzinfo=None)  # naive
+    transit_chart = (chart_at_local(now_local_naive, tzid, location, angles="houses" in sections)
+                     if sections & _NEEDS_TRANSIT else None)
+
+    # ===== הפקה ל-JSON (באותו סדר מפתחות כמו תמיד) =====
+    response = {
+        "date": now_local_naive.strftime('%Y-%m-%d'),
+        "city": city_name,
+        "lat": lat,
+        "lon": lon,
+        "tzid": tzid,
+        "lang": lang,
+        "app": "LOTTOLUCK",
+    }
 
     # מיקומי כוכבים (טקסט עם ℞)
-    "natal": natal_positions,
-    "transit": transit_positions,
+    if "natal" in sections:
+        response["natal"] = positions_dict(natal_chart, names)
+    if "transit" in sections:
+        response["transit"] = positions_dict(transit_chart, names)
 
     # תאימות לאחור: מיקומים 0..360
-    "natal_raw": natal_positions_raw,
-    "transit_raw": transit_positions_raw,
+    if "natal" in sections:
+        response["natal_raw"] = positions_raw(natal_chart, names)
+    if "transit" in sections:
+        response["transit_raw"] = positions_raw(transit_chart, names)
 
     # חדש: גולמי + מטא (כולל retro) – לציור גלגל
-    "natal_raw_meta": natal_raw_meta,
-    "transit_raw_meta": transit_raw_meta,
+    if "natal" in sections:
+        response["natal_raw_meta"] = positions_raw_meta(natal_chart, names)
+    if "transit" in sections:
+        response["transit_raw_meta"] = positions_raw_meta(transit_chart, names)
 
     # היבטי טרנזיט ללידה
-    "aspects": aspects_list,
+    if "aspects" in sections:
+        response["aspects"] = aspects_transit_to_natal(transit_chart, natal_chart, names, lang)
 
     # חלונות מזל
-    "lucky_hours": lucky_hours,
-    "lucky_blocks": lucky_blocks_today,
+    if "lucky_hours" in sections:
+        response["lucky_hours"] = find_lucky_windows(now_local_naive, natal_chart, tzid, location, count=2)
+    if "lucky_blocks" in sections:
+        response["lucky_blocks"] = lucky_blocks_for_day(now_local, natal_chart, tzid, location, names, lang)
 
     # PRO: 3 ימים קדימה
-    "daily_3days": daily_3days,
+    if "daily_3days" in sections:
+        response["daily_3days"] = lucky_blocks_for_multiple_days(
+            now_local, natal_chart, tzid, location, names, lang, days=3)
+
+    response["comment"] = comments.get(lang, comments["he"])
+
+    # Placidus + ASC/MC
+    if "houses" in sections:
+        natal_asc_deg, natal_mc_deg = asc_mc(natal_chart)
+        transit_asc_deg, transit_mc_deg = asc_mc(transit_chart)
+        response.update({
+            "natal_houses_raw":   houses_raw(natal_chart),
+            "transit_houses_raw": houses_raw(transit_chart),
+            "natal_asc_deg":      natal_asc_deg,
+            "natal_mc_deg":       natal_mc_deg,
+            "transit_asc_deg":    transit_asc_deg,
+            "transit_mc_deg":     transit_mc_deg,
+        })
+    return response
+
+# ========= אצווה (batch) =========
+def compute_forecast_many(jobs, now_utc=None):
+    """
+    מריץ כמה תחזיות ברצף באותו תהליך, כולן לאותו רגע טרנזיט (now_utc, aware),
+    כך שכל המיקומים נקראים פעם אחת ממטמון הטרנזיטים המשותף.
+    jobs: [{"index", "kwargs"}] – kwargs כמו ל-compute_forecast.
+    מחזיר שורה לכל job: {"index", "ok", "result"} או {"index", "ok": False, "error"} –
+    שגיאה של פריט אחד לא מפילה את השאר.
+    """
+    if now_utc is None:
+        now_utc = datetime.now(pytz.utc)
+    out = []
+    for job in jobs:
+        try:
+            out.append({"index": job["index"], "ok": True, "result": compute_forecast(**job["kwargs"], now_utc=now_utc)})
+        except ValueError as e:
+            out.append({"index": job["index"], "ok": False, "error": f"Invalid input: {e}"})
+        except Exception as e:
+            out.append({"index": job["index"], "ok": False, "error": f"Unexpected error: {e}"})
+    return out
 
-    "comment": comments.get(lang, comments["he"]),
-}
+# ========= CLI (עטיפה דקה) =========
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+
+    # ===== תמיכה בעברית ב-Windows =====
+    try:
+        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='\n')
+    except Exception:
+        pass
 
-# הוספת Placidus + ASC/MC ל-response
-response.update({
-    "natal_houses_raw":   natal_houses_raw,
-    "transit_houses_raw": transit_houses_raw,
-    "natal_asc_deg":      natal_asc_deg,
-    "natal_mc_deg":       natal_mc_deg,
-    "transit_asc_deg":    transit_asc_deg,
-    "transit_mc_deg":     transit_mc_deg,
-})
-
-print(json.dumps(response, ensure_ascii=False), flush=True)
+    if len(argv) < 6:
+        print(json.dumps({"error": "Missing arguments (need: date time city lat lon [tzid] [lang])"}), flush=True)
+        sys.exit(1)
+
+    tzid = None
+    lang = "he"
+    if len(argv) >= 7:
+        candidate = argv[6]
+        if "/" in candidate:
+            tzid = candidate
+            if len(argv) >= 8:
+                lang = argv[7]
+        else:
+            lang = candidate
+
+    response = compute_forecast(argv[1], argv[2], argv[3], float(argv[4]), float(argv[5]), tzid=tzid, lang=lang)
+    print(json.dumps(response, ensure_ascii=False), flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+bench_encodings.py
+השוואת גודל וזמן של קידודי התשובה (payload_codec.py) על תשובות מייצגות:
+/forecast בעברית ובאנגלית, /pro_forecast ל-3 ימים, ותשובת /cities.
+
+    python benchmarks/bench_encodings.py [--repeat 50] [--json out.json]
+
+לכל צירוף פורמט × דחיסה: בתים, יחס ל-JSON הגולמי, זמן קידוד+דחיסה וזמן פענוח (חציון, ms).
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+import pytz  # noqa: E402
+
+import astrology_forecast  # noqa: E402
+import astro_calc_api  # noqa: E402
+import cities  # noqa: E402
+import payload_codec  # noqa: E402
+
+BIRTH = ("1990-05-17", "08:30")
+PLACE = ("Tel Aviv", 32.08, 34.78, "Asia/Jerusalem")
+NOW = pytz.timezone(PLACE[3]).localize(datetime(2026, 10, 18, 9, 7))
+
+
+def sample_payloads():
+    out = {}
+    for lang in ("he", "en"):
+        out[f"forecast_{lang}"] = astrology_forecast.compute_forecast(
+            *BIRTH, PLACE[0], PLACE[1], PLACE[2], tzid=PLACE[3], lang=lang, now_local=NOW)
+    out["pro_3days_he"] = astro_calc_api.compute_pro_forecast(
+        *BIRTH, "+03:00", str(PLACE[1]), str(PLACE[2]), lang="he", transit_date="2026-10-18", days=3)
+    index = cities.get_index()
+    if index is not None:
+        out["cities_search"] = {"ok": True, "q": "san", "results": [cities.to_dict(c) for c in index.search("san", 20)]}
+    return out
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(times)
+
+
+def bench(payloads, repeat):
+    rows = []
+    for name, obj in payloads.items():
+        raw_json = len(payload_codec.encode(obj, "json"))
+        for fmt in payload_codec.available_formats():
+            for coding in [None] + payload_codec.available_codings():
+                body = payload_codec.compress(payload_codec.encode(obj, fmt), coding)
+                assert payload_codec.decode(payload_codec.decompress(body, coding), fmt) == obj
+                rows.append({
+                    "payload": name,
+                    "format": fmt,
+                    "coding": coding or "identity",
+                    "bytes": len(body),
+                    "ratio": round(len(body) / raw_json, 4),
+                    "encode_ms": round(_median_ms(
+                        lambda: payload_codec.compress(payload_codec.encode(obj, fmt), coding), repeat), 3),
+                    "decode_ms": round(_median_ms(
+                        lambda: payload_codec.decode(payload_codec.decompress(body, coding), fmt), repeat), 3),
+                })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare response encodings (size / latency)")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--json", help="Also write the rows to this file")
+    args = parser.parse_args(argv)
+
+    rows = bench(sample_payloads(), args.repeat)
+    print(f"{'payload':<16}{'format':<9}{'coding':<10}{'bytes':>9}{'ratio':>8}{'enc ms':>9}{'dec ms':>9}")
+    for r in rows:
+        print(f"{r['payload']:<16}{r['format']:<9}{r['coding']:<10}{r['bytes']:>9}{r['ratio']:>8.3f}"
+              f"{r['encode_ms']:>9.3f}{r['decode_ms']:>9.3f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
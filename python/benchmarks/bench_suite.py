@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+bench_suite.py
+מדידת ביצועים על קלט קבוע: בניית מפות, חיפוש היבטים, חלונות מזל בשני המנועים,
+בלוקים ל-3 ימים, financial_forecast, ובקשות מלאות ל-/forecast ו-/pro_forecast דרך
+ה-test client של Flask (במאגר בתוך התהליך, COMPUTE_WORKERS=0).
+
+    python benchmarks/bench_suite.py [--repeat 50] [--case forecast] [--cold]
+                                     [--save base.json] [--compare base.json] [--threshold 0.15]
+
+לכל מקרה: ops/sec, p50/p95/p99 (ms) ו-peak RSS של התהליך אחרי המקרה (MB; מצטבר –
+למדידת זיכרון של מקרה בודד מריצים עם --case).
+--save כותב את התוצאות (עם commit / python / מכונה) ל-JSON; --compare משווה ל-baseline
+קודם ומחזיר קוד יציאה 1 אם p50 של מקרה כלשהו הואט ביותר מ---threshold.
+--cold מרוקן את מטמון הטרנזיטים לפני כל הרצה (ברירת מחדל: מטמון חם, כמו בשרת).
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+os.environ.setdefault("COMPUTE_WORKERS", "0")   # ה-test client מחשב בתוך התהליך
+
+import pytz  # noqa: E402
+from flatlib.chart import Chart  # noqa: E402
+from flatlib.datetime import Datetime  # noqa: E402
+
+import astrology_forecast  # noqa: E402
+import astro_calc_api  # noqa: E402
+import financial_forecast  # noqa: E402
+import transit_cache  # noqa: E402
+import sky_index  # noqa: E402
+from ephemeris_table import get_table  # noqa: E402
+
+BIRTH = ("1990-05-17", "08:30")
+PLACE = ("Tel Aviv", 32.08, 34.78, "Asia/Jerusalem", "+03:00")
+TRANSIT_DATE = "2026-10-18"
+NOW = pytz.timezone(PLACE[3]).localize(datetime(2026, 10, 18, 9, 7))
+
+
+# ========= מקרים =========
+
+def cases():
+    """{שם: פונקציה בלי פרמטרים}. כל ההכנות (מפת לידה וכו') נעשות כאן, מחוץ למדידה."""
+    lat, lon, tzid, offset = PLACE[1], PLACE[2], PLACE[3], PLACE[4]
+    bdate = BIRTH[0].replace("-", "/")
+    tdate = TRANSIT_DATE.replace("-", "/")
+    day = datetime.strptime(TRANSIT_DATE, "%Y-%m-%d")
+
+    natal = astro_calc_api.build_chart(bdate, BIRTH[1], offset, str(lat), str(lon))
+    transit = astro_calc_api.build_transit_chart(tdate, "12:00", offset, str(lat), str(lon))
+
+    location = astrology_forecast.build_location(lat, lon)
+    names = astrology_forecast.names_for("he")
+    af_natal = Chart(Datetime(bdate, BIRTH[1], offset), location, IDs=astrology_forecast.OBJECTS)
+    now_naive = NOW.replace(tzinfo=None)
+
+    geopos = financial_forecast.build_geopos(lat, lon)
+
+    out = {
+        "build_chart": lambda: astro_calc_api.build_chart(bdate, BIRTH[1], offset, str(lat), str(lon)),
+        "create_chart": lambda: financial_forecast.create_chart(bdate, BIRTH[1], offset, geopos),
+        "find_aspects": lambda: astro_calc_api.find_aspects(natal, transit, astro_calc_api.MONEY_GROUP),
+        "find_lucky_windows_pro": lambda: astro_calc_api.find_lucky_windows(
+            day, natal, offset, str(lat), str(lon), astro_calc_api.MONEY_GROUP),
+        "find_lucky_windows_forecast": lambda: astrology_forecast.find_lucky_windows(
+            now_naive, af_natal, tzid, location),
+        "lucky_blocks_3days": lambda: astrology_forecast.lucky_blocks_for_multiple_days(
+            NOW, af_natal, tzid, location, names, days=3),
+        "build_forecast_json": lambda: financial_forecast.build_forecast_json(
+            bdate, BIRTH[1], offset, lat, lon, days=3, start_date=tdate),
+        "compute_forecast": lambda: astrology_forecast.compute_forecast(
+            *BIRTH, PLACE[0], lat, lon, tzid=tzid, lang="he", now_local=NOW),
+        "compute_pro_forecast": lambda: astro_calc_api.compute_pro_forecast(
+            *BIRTH, offset, str(lat), str(lon), transit_date=TRANSIT_DATE, days=3),
+    }
+    out.update(http_cases())
+    return out
+
+
+def http_cases():
+    """בקשות מלאות דרך Flask: פענוח, מפתחות מטמון, single-flight, חישוב וקידוד התשובה."""
+    import astro_server
+    client = astro_server.app.test_client()
+    lat, lon = PLACE[1], PLACE[2]
+
+    def get(path, query):
+        def run():
+            resp = client.get(path, query_string=query)
+            if resp.status_code != 200:
+                raise RuntimeError(f"{path} -> {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        return run
+
+    return {
+        "http_forecast": get("/forecast", {"date": BIRTH[0], "time": BIRTH[1], "city": PLACE[0],
+                                           "lat": lat, "lon": lon, "tz": PLACE[3], "lang": "he"}),
+        "http_pro_forecast": get("/pro_forecast", {"birth_date": BIRTH[0], "birth_time": BIRTH[1],
+                                                   "tz": PLACE[4], "lat": lat, "lon": lon,
+                                                   "transit_date": TRANSIT_DATE, "lang": "he"}),
+    }
+
+
+# ========= מדידה =========
+
+def _percentile(sorted_ms, q):
+    """nearest-rank"""
+    k = max(0, min(len(sorted_ms) - 1, int(round(q / 100.0 * len(sorted_ms) + 0.5)) - 1))
+    return sorted_ms[k]
+
+
+def _peak_rss_mb():
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss   # Linux: KB, macOS: bytes
+    return round(kb / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def run_case(fn, repeat, warmup, cold):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        if cold:
+            transit_cache.CACHE.clear()
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    times.sort()
+    total_s = sum(times) / 1000.0
+    return {
+        "n": repeat,
+        "ops_per_sec": round(repeat / total_s, 2) if total_s else None,
+        "p50_ms": round(_percentile(times, 50), 3),
+        "p95_ms": round(_percentile(times, 95), 3),
+        "p99_ms": round(_percentile(times, 99), 3),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def environment(args):
+    return {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+        "repeat": args.repeat,
+        "cold": args.cold,
+        "ephemeris_table": get_table() is not None,
+        "sky_index": sky_index.get_index() is not None,
+    }
+
+
+def compare(results, baseline, threshold):
+    """[(case, p50 ישן, p50 חדש, שינוי יחסי)], ואם יש האטה מעל הסף."""
+    rows, regressed = [], False
+    for name, r in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("p50_ms"):
+            continue
+        change = (r["p50_ms"] - old["p50_ms"]) / old["p50_ms"]
+        rows.append((name, old["p50_ms"], r["p50_ms"], change))
+        regressed |= change > threshold
+    return rows, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the forecast engines and HTTP endpoints")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--case", action="append", help="Run only these cases (substring match, repeatable)")
+    parser.add_argument("--cold", action="store_true", help="Clear the transit cache before every run")
+    parser.add_argument("--save", help="Write results + environment to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --save")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="p50 slowdown (fraction) that counts as a regression in --compare")
+    args = parser.parse_args(argv)
+
+    selected = {name: fn for name, fn in cases().items()
+                if not args.case or any(c in name for c in args.case)}
+    if not selected:
+        parser.error("no matching cases")
+
+    results = {}
+    print(f"{'case':<30}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}")
+    for name, fn in selected.items():
+        r = results[name] = run_case(fn, args.repeat, args.warmup, args.cold)
+        print(f"{name:<30}{r['ops_per_sec']:>10.1f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}"
+              f"{r['p99_ms']:>10.3f}{r['peak_rss_mb']:>9.1f}")
+
+    if args.save:
+        out = Path(args.save)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({"env": environment(args), "results": results}, indent=2), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows, regressed = compare(results, baseline, args.threshold)
+        print(f"\nvs {args.compare} (commit {baseline.get('env', {}).get('commit')})")
+        print(f"{'case':<30}{'old p50':>10}{'new p50':>10}{'change':>9}")
+        for name, old, new, change in rows:
+            flag = "  <-- slower" if change > args.threshold else ""
+            print(f"{name:<30}{old:>10.3f}{new:>10.3f}{change:>+9.1%}{flag}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
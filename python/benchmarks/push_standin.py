@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+push_standin.py
+שרת מקומי במקום Telegram / שירות webhook, לבדיקות עומס של lotto_bot.py בלי לשלוח הודעות אמיתיות.
+
+    python benchmarks/push_standin.py --port 8099 --rate 30 --fail-rate 0.02
+    python lotto_bot.py run --transport telegram --api-base http://127.0.0.1:8099      (TELEGRAM_BOT_TOKEN=test)
+    python lotto_bot.py run --transport webhook --webhook-url http://127.0.0.1:8099/push
+    curl http://127.0.0.1:8099/stats
+
+POST /bot<token>/sendMessage – תשובות בפורמט של Bot API; כל POST אחר – webhook (200 {"ok": true}).
+--rate: מעבר לקצב הזה (הודעות/שנייה) – 429 עם retry_after, כמו flood control של Telegram.
+--fail-rate: חלק מהבקשות שמקבלות 500 (לבדיקת ניסיונות חוזרים). chat_id / destination שמתחיל
+ב-"blocked" מקבל 403 (שגיאה קבועה). /stats סופר גם כפילויות לפי Idempotency-Key.
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+
+class Standin:
+    def __init__(self, rate=0.0, fail_rate=0.0, latency_ms=0.0, retry_after=1, seed=1):
+        self.rate = float(rate)
+        self.fail_rate = float(fail_rate)
+        self.latency = float(latency_ms) / 1000.0
+        self.retry_after = int(retry_after)
+        self.rng = random.Random(seed)
+        self._tokens = max(1.0, self.rate)
+        self._stamp = time.monotonic()
+        self.keys = set()
+        self.stats = {"requests": 0, "delivered": 0, "duplicates": 0, "throttled": 0, "failed": 0, "blocked": 0,
+                      "first_at": None, "last_at": None}
+
+    def _allow(self):
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def handle(self, method, path, headers, body):
+        """(status, dict)"""
+        if method == "GET" and path == "/stats":
+            out = dict(self.stats)
+            if out["first_at"] and out["last_at"] and out["last_at"] > out["first_at"]:
+                out["per_sec"] = round(out["delivered"] / (out["last_at"] - out["first_at"]), 1)
+            return 200, out
+        if method != "POST":
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+        telegram = path.endswith("/sendMessage")
+        self.stats["requests"] += 1
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: invalid JSON"}
+        dest = str(data.get("chat_id") if telegram else data.get("destination"))
+
+        if not self._allow():
+            self.stats["throttled"] += 1
+            return 429, {"ok": False, "error_code": 429,
+                         "description": f"Too Many Requests: retry after {self.retry_after}",
+                         "parameters": {"retry_after": self.retry_after}}
+        if self.fail_rate and self.rng.random() < self.fail_rate:
+            self.stats["failed"] += 1
+            return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        if dest.startswith("blocked"):
+            self.stats["blocked"] += 1
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+
+        key = headers.get("idempotency-key")
+        if key in self.keys:
+            self.stats["duplicates"] += 1
+        elif key:
+            self.keys.add(key)
+        self.stats["delivered"] += 1
+        now = time.time()
+        self.stats["first_at"] = self.stats["first_at"] or now
+        self.stats["last_at"] = now
+        return 200, ({"ok": True, "result": {"message_id": self.stats["delivered"]}} if telegram else {"ok": True})
+
+    async def serve_conn(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path = line.decode("latin-1").split()[:2]
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status, payload = self.handle(method, path, headers, body)
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, standin):
+    server = await asyncio.start_server(standin.serve_conn, host, port)
+    print(f"push stand-in on http://{host}:{port}", file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the push bot's HTTP transports")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--rate", type=float, default=0.0, help="Accepted messages per second (0 = unlimited)")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after (seconds) sent with 429")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    standin = Standin(args.rate, args.fail_rate, args.latency_ms, args.retry_after)
+    try:
+        asyncio.run(serve(args.host, args.port, standin))
+    except KeyboardInterrupt:
+        print(json.dumps(standin.stats), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+replay.py
+שחזור עומס מהקלטת בקשות (capture.py, CAPTURE_FILE) מול astro_server מקומי.
+
+    # הרצה: מרים שרת מקומי (gunicorn אם מותקן, אחרת שרת הפיתוח), משחזר, שומר תוצאות
+    python benchmarks/replay.py run data/capture.jsonl --concurrency 16 --rate 40 --out run_a.json
+    # מול שרת קיים
+    python benchmarks/replay.py run data/capture.jsonl --url http://127.0.0.1:10000 --limit 500
+    # השוואה בין שתי הרצות
+    python benchmarks/replay.py compare run_a.json run_b.json
+
+--rate: קצב הגעה (בקשות/שנייה, open-loop – השליחה לפי לוח זמנים ולא אחרי שהקודמת חזרה;
+        --poisson לרווחים אקראיים). בלי --rate – כל worker שולח ברצף (closed-loop).
+ה-latency נמדד מהרגע המתוכנן לשליחה, כך שהמתנה בצד הלקוח כשהשרת לא עומד בקצב נספרת.
+מדווח: p50/p90/p95/p99, throughput, שיעור שגיאות (סטטוס ≥ 400 / חיבור) ו-timeouts – בסה"כ ולכל מסלול.
+שורות בלי "path" (למשל קובץ requests.jsonl אחר) מדולגות.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+import statistics
+from urllib.parse import urlencode, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+SERVER_DIR = HERE.parent
+sys.path.insert(0, str(SERVER_DIR))
+
+from capture import PROFILE_PLACEHOLDER  # noqa: E402
+
+LOCAL_PROFILE = {"birth_date": "1990-05-17", "birth_time": "08:30", "lat": 32.08, "lon": 34.78,
+                 "tz": "Asia/Jerusalem", "city": "Tel Aviv"}
+
+
+# ========= קלט =========
+
+def load_capture(path, limit=None):
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict) and isinstance(rec.get("path"), str):
+                out.append(rec)
+                if limit and len(out) >= limit:
+                    break
+    return out
+
+
+def _fill_profile(data, profile_id):
+    if isinstance(data, list):
+        return [_fill_profile(v, profile_id) for v in data]
+    if isinstance(data, dict):
+        return {k: (profile_id if v == PROFILE_PLACEHOLDER else _fill_profile(v, profile_id))
+                for k, v in data.items()}
+    return data
+
+
+# ========= שרת מקומי =========
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(env_extra=None, wait_sec=120):
+    """מרים astro_server על פורט פנוי. מחזיר (url, process)."""
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), **(env_extra or {}))
+    try:
+        import gunicorn  # noqa: F401
+        cmd = [sys.executable, "-m", "gunicorn", "astro_server:app", "--preload", "--workers=1",
+               "--threads=16", f"--bind=127.0.0.1:{port}"]
+    except ImportError:
+        cmd = [sys.executable, "astro_server.py"]
+    proc = subprocess.Popen(cmd, cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + wait_sec
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited: {proc.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return url, proc
+        except OSError:
+            time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("server did not become healthy in time")
+
+
+# ========= שליחה =========
+
+class Client:
+    """חיבור keep-alive אחד לכל thread."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.host, self.port, self.timeout = parts.hostname, parts.port or 80, timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def send(self, rec, profile_id=None):
+        """(status, bytes) – status None אם החיבור נכשל; זורק socket.timeout ב-timeout."""
+        path = rec["path"]
+        query = _fill_profile(rec.get("query") or {}, profile_id)
+        if query:
+            path += "?" + urlencode(query)
+        headers = dict(rec.get("headers") or {})
+        headers.pop("If-None-Match", None)   # ETag מההקלטה לא תקף בשרת אחר
+        body = None
+        if rec.get("method", "GET") not in ("GET", "HEAD") and rec.get("body") is not None:
+            body = json.dumps(_fill_profile(rec["body"], profile_id)).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        conn = self._conn()
+        try:
+            conn.request(rec.get("method", "GET"), path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()   # גם תשובות NDJSON בזרימה – עד הסוף
+            return resp.status, len(data)
+        except (socket.timeout, TimeoutError):
+            conn.close()
+            self._local.conn = None
+            raise
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            return None, 0
+
+
+def ensure_profile(client, records):
+    if not any(PROFILE_PLACEHOLDER in json.dumps(r) for r in records):
+        return None
+    conn = http.client.HTTPConnection(client.host, client.port, timeout=60)
+    conn.request("POST", "/profiles", body=json.dumps(LOCAL_PROFILE).encode("utf-8"),
+                 headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    data = json.loads(resp.read() or b"{}")
+    return data.get("profile_id")
+
+
+def replay(records, url, concurrency, rate=None, poisson=False, timeout=60.0, seed=1):
+    client = Client(url, timeout)
+    profile_id = ensure_profile(client, records)
+    rng = random.Random(seed)
+
+    # לוח זמנים לשליחה (open-loop) – או None לשליחה רציפה
+    schedule = None
+    if rate:
+        t, schedule = 0.0, []
+        for _ in records:
+            schedule.append(t)
+            t += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    results = [None] * len(records)
+    t0 = time.perf_counter()
+
+    def one(i):
+        rec = records[i]
+        planned = t0 + schedule[i] if schedule else time.perf_counter()
+        delay = planned - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            status, size = client.send(rec, profile_id)
+            outcome = "ok" if status is not None and status < 400 else "error"
+        except (socket.timeout, TimeoutError):
+            status, size, outcome = None, 0, "timeout"
+        results[i] = {"path": rec["path"], "status": status, "bytes": size, "outcome": outcome,
+                      "latency_ms": (time.perf_counter() - planned) * 1000.0}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(len(records))))
+    elapsed = time.perf_counter() - t0
+    return results, elapsed
+
+
+# ========= סיכום =========
+
+def _percentile(sorted_ms, q):
+    if not sorted_ms:
+        return None
+    k = max(0, min(len(sorted_ms) - 1, int(round(q / 100.0 * len(sorted_ms) + 0.5)) - 1))
+    return round(sorted_ms[k], 2)
+
+
+def summarize(rows, elapsed):
+    lat = sorted(r["latency_ms"] for r in rows)
+    n = len(rows)
+    return {
+        "requests": n,
+        "throughput_rps": round(n / elapsed, 2) if elapsed else None,
+        "error_rate": round(sum(r["outcome"] == "error" for r in rows) / n, 4) if n else 0.0,
+        "timeout_rate": round(sum(r["outcome"] == "timeout" for r in rows) / n, 4) if n else 0.0,
+        "mean_ms": round(statistics.fmean(lat), 2) if lat else None,
+        "p50_ms": _percentile(lat, 50),
+        "p90_ms": _percentile(lat, 90),
+        "p95_ms": _percentile(lat, 95),
+        "p99_ms": _percentile(lat, 99),
+        "statuses": {str(s): sum(r["status"] == s for r in rows) for s in sorted({r["status"] for r in rows},
+                                                                                 key=str)},
+    }
+
+
+def report(results, elapsed):
+    by_path = {}
+    for r in results:
+        by_path.setdefault(r["path"], []).append(r)
+    return {"total": summarize(results, elapsed),
+            "paths": {p: summarize(rows, elapsed) for p, rows in sorted(by_path.items())}}
+
+
+def print_report(rep):
+    print(f"{'path':<24}{'n':>7}{'rps':>9}{'err%':>7}{'tmo%':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, s in [("TOTAL", rep["total"])] + list(rep["paths"].items()):
+        print(f"{name:<24}{s['requests']:>7}{s['throughput_rps']:>9.1f}{s['error_rate'] * 100:>7.1f}"
+              f"{s['timeout_rate'] * 100:>7.1f}{s['p50_ms'] or 0:>9.1f}{s['p95_ms'] or 0:>9.1f}{s['p99_ms'] or 0:>9.1f}")
+
+
+def compare(a, b):
+    keys = ("throughput_rps", "error_rate", "timeout_rate", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'path':<24}{'metric':<16}{'A':>10}{'B':>10}{'change':>9}")
+    sections = [("TOTAL", a["report"]["total"], b["report"]["total"])]
+    sections += [(p, a["report"]["paths"][p], b["report"]["paths"][p])
+                 for p in a["report"]["paths"] if p in b["report"]["paths"]]
+    for name, sa, sb in sections:
+        for k in keys:
+            va, vb = sa.get(k), sb.get(k)
+            change = f"{(vb - va) / va:+.1%}" if va and vb is not None else ""
+            print(f"{name:<24}{k:<16}{va if va is not None else '-':>10}{vb if vb is not None else '-':>10}{change:>9}")
+
+
+# ========= CLI =========
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured requests against astro_server")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Replay a capture file and report latency / errors / throughput")
+    r.add_argument("capture", help="JSONL written by the server with CAPTURE_FILE")
+    r.add_argument("--url", help="Existing server (default: start a local one)")
+    r.add_argument("--concurrency", type=int, default=8)
+    r.add_argument("--rate", type=float, help="Arrival rate in requests/sec (open-loop)")
+    r.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times with --rate")
+    r.add_argument("--limit", type=int, help="Only the first N captured requests")
+    r.add_argument("--loop", type=int, default=1, help="Repeat the capture N times")
+    r.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (seconds)")
+    r.add_argument("--out", help="Write the report (+ run settings) to this JSON file")
+    c = sub.add_parser("compare", help="Compare two --out files")
+    c.add_argument("a")
+    c.add_argument("b")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "compare":
+        a = json.loads(Path(args.a).read_text(encoding="utf-8"))
+        b = json.loads(Path(args.b).read_text(encoding="utf-8"))
+        compare(a, b)
+        return
+
+    records = load_capture(args.capture, args.limit) * max(1, args.loop)
+    if not records:
+        parser.error(f"no replayable requests in {args.capture}")
+
+    proc = None
+    url = args.url
+    if not url:
+        url, proc = start_server()
+    try:
+        results, elapsed = replay(records, url, args.concurrency, args.rate, args.poisson, args.timeout)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    rep = report(results, elapsed)
+    print_report(rep)
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "time": datetime.now(timezone.utc).isoformat(),
+            "capture": args.capture, "url": args.url or "local", "concurrency": args.concurrency,
+            "rate": args.rate, "poisson": args.poisson, "elapsed_sec": round(elapsed, 3),
+            "report": rep,
+        }, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
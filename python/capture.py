@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+capture.py
+מצב הקלטה אופציונלי לשרת: כל בקשת API נכתבת כשורת JSON לקובץ, אחרי ניקוי נתונים אישיים,
+כדי לשחזר את צורת התנועה האמיתית (אילו מסלולים, sections, גודל אצוות, days, Accept)
+מול שרת מקומי עם benchmarks/replay.py.
+
+    CAPTURE_FILE=data/capture.jsonl   – מפעיל את ההקלטה (ריק = כבוי)
+    CAPTURE_SAMPLE=0.1               – איזה חלק מהבקשות להקליט (ברירת מחדל 1.0)
+
+שורה: {"ts", "method", "path", "query", "body", "headers"}.
+ניקוי: lat/lon מעוגלים ל-CAPTURE_GEO_DECIMALS ספרות (ברירת מחדל 1 ≈ 11 ק"מ), יום הלידה => 01,
+דקות הלידה => 00, city => "City", profile_id => "<profile>" (replay יוצר פרופיל מקומי במקומו),
+id של פריטי אצווה נמחק. מה שמשפיע על עלות החישוב נשמר כמו שהוא.
+"""
+
+import os
+import json
+import random
+import threading
+import time
+from pathlib import Path
+
+CAPTURE_FILE = (os.environ.get("CAPTURE_FILE") or "").strip()
+CAPTURE_SAMPLE = float(os.environ.get("CAPTURE_SAMPLE", "1.0"))
+CAPTURE_GEO_DECIMALS = int(os.environ.get("CAPTURE_GEO_DECIMALS", "1"))
+
+# רק מסלולי ה-API (לא health / diag / metrics)
+CAPTURED_PATHS = ("/forecast", "/forecast/batch", "/pro_forecast", "/pro_forecast/stream",
+                  "/profiles", "/cities", "/cities/near", "/retrogrades")
+KEPT_HEADERS = ("Accept", "Accept-Encoding", "If-None-Match")
+PROFILE_PLACEHOLDER = "<profile>"
+
+_DATE_KEYS = ("date", "birth_date")
+_TIME_KEYS = ("time", "birth_time")
+
+
+def _round_geo(v):
+    try:
+        return round(float(v), CAPTURE_GEO_DECIMALS)
+    except (TypeError, ValueError):
+        return v
+
+
+def sanitize(data):
+    """עותק נקי של גוף / query (dict, רשימת פריטים, או משהו אחר כמו שהוא)."""
+    if isinstance(data, list):
+        return [sanitize(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    out = {}
+    for k, v in data.items():
+        if k == "id":
+            continue
+        if k == "items":
+            out[k] = sanitize(v)
+        elif k in ("lat", "lon"):
+            out[k] = _round_geo(v)
+        elif k in _DATE_KEYS and isinstance(v, str) and len(v) >= 10:
+            out[k] = v[:8] + "01"
+        elif k in _TIME_KEYS and isinstance(v, str) and ":" in v:
+            out[k] = v.split(":")[0] + ":00"
+        elif k == "city" and v:
+            out[k] = "City"
+        elif k == "profile_id" and v:
+            out[k] = PROFILE_PLACEHOLDER
+        else:
+            out[k] = v
+    return out
+
+
+class Capture:
+    def __init__(self, path, sample=1.0):
+        self.path = Path(path)
+        self.sample = sample
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def record(self, method, path, query, body, headers):
+        if path not in CAPTURED_PATHS or random.random() >= self.sample:
+            return
+        line = json.dumps({
+            "ts": round(time.time(), 3),
+            "method": method,
+            "path": path,
+            "query": sanitize(query) or None,
+            "body": sanitize(body),
+            "headers": {h: headers[h] for h in KEPT_HEADERS if h in headers} or None,
+        }, ensure_ascii=False)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.written += 1
+
+
+def from_env():
+    """Capture לפי CAPTURE_FILE, או None אם ההקלטה כבויה."""
+    if not CAPTURE_FILE:
+        return None
+    return Capture(CAPTURE_FILE, CAPTURE_SAMPLE)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+cities.py
+אינדקס ערים בצד השרת מעל assets/worldcities.csv (במקום שהאפליקציה תפרסר 48k שורות במכשיר).
+
+נבנה פעם אחת לתהליך (עם --preload של gunicorn – פעם אחת לכל השרת):
+- השלמה אוטומטית: מערך ממוין של מפתחות מנורמלים (בלי ניקוד/diacritics, lowercase)
+  מתוך city / city_ascii / admin_name – גם מתחילת כל מילה ("aviv" מוצא את Tel Aviv).
+  חיפוש תחילית = bisect + סריקה רציפה, דירוג לפי אוכלוסייה.
+- עיר קרובה: רשת תאים של CELL_DEG מעלות, חיפוש בטבעות מתרחבות סביב הנקודה (רק תאי השפה
+  של כל טבעת); ליד הקטבים / באמצע האוקיינוס – סריקה וקטורית של כל הערים.
+- tzid מחושב מראש לכל עיר (timezones.tzid_at), כך שבקשה עם city_id לא צריכה
+  geocoding ולא חיפוש אזור זמן.
+
+CITIES_CSV – נתיב לקובץ (ברירת מחדל ../assets/worldcities.csv).
+"""
+
+import os
+import csv
+import heapq
+import math
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+import timezones
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_CSV = HERE.parent / "assets" / "worldcities.csv"
+
+CELL_DEG = 1.0
+MAX_RING = 10   # מעבר לזה – סריקה מלאה
+EARTH_RADIUS_KM = 6371.0088
+
+City = namedtuple("City", [
+    "id", "city", "city_ascii", "admin_name", "country", "iso2",
+    "lat", "lon", "population", "capital", "tzid",
+])
+
+
+class CityNotFound(KeyError):
+    pass
+
+
+def normalize(s):
+    """lowercase, בלי diacritics, מקפים/פיסוק => רווח אחד."""
+    s = unicodedata.normalize("NFKD", s or "")
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).casefold()
+    s = "".join(ch if ch.isalnum() else " " for ch in s)
+    return " ".join(s.split())
+
+
+def _word_suffixes(name):
+    """'tel aviv yafo' -> ['tel aviv yafo', 'aviv yafo', 'yafo']"""
+    words = name.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell(lat, lon):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lon / CELL_DEG))
+
+
+def _ring_cells(ring):
+    """(di, dj) של תאי השפה בלבד של הריבוע (2·ring+1)² – 8·ring תאים (תא אחד ל-ring=0)."""
+    if ring == 0:
+        return [(0, 0)]
+    cells = [(di, dj) for di in (-ring, ring) for dj in range(-ring, ring + 1)]
+    cells += [(di, dj) for dj in (-ring, ring) for di in range(-ring + 1, ring)]
+    return cells
+
+
+class CityIndex:
+    def __init__(self, cities):
+        self.cities = cities
+        self.by_id = {c.id: i for i, c in enumerate(cities)}
+
+        self._norm_name = [normalize(c.city_ascii or c.city) for c in cities]
+        keys = set()
+        for i, c in enumerate(cities):
+            for field in (c.city, c.city_ascii, c.admin_name):
+                for key in _word_suffixes(normalize(field)):
+                    keys.add((key, i))
+        pairs = sorted(keys)
+        self._keys = [k for k, _ in pairs]
+        self._key_city = [i for _, i in pairs]
+
+        self._grid = {}
+        for i, c in enumerate(cities):
+            self._grid.setdefault(_cell(c.lat, c.lon), []).append(i)
+        self._lat_rad = np.radians([c.lat for c in cities])
+        self._lon_rad = np.radians([c.lon for c in cities])
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_CSV):
+        cities = []
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    lat, lon = float(row["lat"]), float(row["lng"])
+                except (KeyError, ValueError):
+                    continue
+                cities.append(City(
+                    id=row["id"].strip(),
+                    city=row["city"].strip(),
+                    city_ascii=(row.get("city_ascii") or "").strip(),
+                    admin_name=(row.get("admin_name") or "").strip(),
+                    country=(row.get("country") or "").strip(),
+                    iso2=(row.get("iso2") or "").strip(),
+                    lat=lat,
+                    lon=lon,
+                    population=int(float(row.get("population") or 0)),
+                    capital=(row.get("capital") or "").strip(),
+                    tzid=timezones.tzid_at(lat, lon),
+                ))
+        return cls(cities)
+
+    def __len__(self):
+        return len(self.cities)
+
+    # ---- חיפוש ----
+    def get(self, city_id):
+        i = self.by_id.get(str(city_id).strip())
+        if i is None:
+            raise CityNotFound(city_id)
+        return self.cities[i]
+
+    def search(self, query, limit=10, country=None):
+        """ערים שאחד השמות שלהן (או מילה בהם) מתחיל ב-query, לפי אוכלוסייה יורדת."""
+        q = normalize(query)
+        if not q:
+            return []
+        country = (country or "").strip().upper()
+        found = set()
+        j = bisect_left(self._keys, q)
+        while j < len(self._keys) and self._keys[j].startswith(q):
+            found.add(self._key_city[j])
+            j += 1
+        if country:
+            found = [i for i in found if self.cities[i].iso2 == country]
+        # שם שמתחיל בדיוק ב-query לפני התאמה באמצע השם / במחוז
+        ranked = heapq.nsmallest(limit, found,
+                                 key=lambda i: (not self._norm_name[i].startswith(q), -self.cities[i].population))
+        return [self.cities[i] for i in ranked]
+
+    def nearest(self, lat, lon, limit=1, max_km=None):
+        """[(City, distance_km)] הקרובות ביותר, בטבעות תאים מתרחבות."""
+        lat, lon = float(lat), float(lon)
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+            raise ValueError("lat/lon out of range")
+        ci, cj = _cell(lat, lon)
+        n_lon_cells = int(round(360.0 / CELL_DEG))
+        deg_km = math.pi / 180.0 * EARTH_RADIUS_KM
+        best = []
+        for ring in range(MAX_RING + 1):
+            for di, dj in _ring_cells(ring):
+                wj = (cj + dj + n_lon_cells // 2) % n_lon_cells - n_lon_cells // 2
+                for i in self._grid.get((ci + di, wj), ()):
+                    c = self.cities[i]
+                    best.append((haversine_km(lat, lon, c.lat, c.lon), i))
+            best.sort()
+            best = best[:limit]
+            # חסם תחתון למרחק של כל עיר מחוץ לטבעות שנסרקו: ring מעלות ברוחב,
+            # או ring מעלות באורך – מוכפל ב-cos של הרוחב הקיצוני ברצועה
+            edge_lat = min(90.0, abs(lat) + (ring + 1) * CELL_DEG)
+            reach_km = ring * CELL_DEG * deg_km * min(1.0, math.cos(math.radians(edge_lat)))
+            if len(best) >= limit and best[-1][0] <= reach_km:
+                break
+            if max_km is not None and reach_km > max_km:
+                break
+        else:
+            best = self._nearest_scan(lat, lon, limit)   # ליד הקטבים / באמצע האוקיינוס
+        out = [(self.cities[i], round(d, 3)) for d, i in best]
+        if max_km is not None:
+            out = [(c, d) for c, d in out if d <= max_km]
+        return out
+
+    def _nearest_scan(self, lat, lon, limit):
+        """כל הערים בבת אחת (NumPy); המועמדות מחושבות מחדש ב-haversine_km כדי שהמרחקים יהיו זהים."""
+        if not self.cities:
+            return []
+        p1, l1 = math.radians(lat), math.radians(lon)
+        a = (np.sin((self._lat_rad - p1) / 2) ** 2
+             + math.cos(p1) * np.cos(self._lat_rad) * np.sin((self._lon_rad - l1) / 2) ** 2)
+        k = min(len(self.cities), limit + 8)
+        cand = np.argpartition(a, k - 1)[:k]
+        best = sorted((haversine_km(lat, lon, self.cities[i].lat, self.cities[i].lon), int(i)) for i in cand)
+        return best[:limit]
+
+
+def to_dict(city, distance_km=None):
+    d = city._asdict()
+    if distance_km is not None:
+        d["distance_km"] = distance_km
+    return d
+
+
+_INDEX = None
+_INDEX_LOADED = False
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index():
+    """האינדקס של התהליך (או None אם אין קובץ ערים). נבנה פעם אחת."""
+    global _INDEX, _INDEX_LOADED
+    if not _INDEX_LOADED:
+        with _INDEX_LOCK:
+            if not _INDEX_LOADED:
+                path = Path(os.environ.get("CITIES_CSV") or DEFAULT_CSV)
+                if path.exists():
+                    _INDEX = CityIndex.from_csv(path)
+                _INDEX_LOADED = True
+    return _INDEX
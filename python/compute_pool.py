@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+compute_pool.py
+שכבת ביצוע לחישובים הכבדים (CPU) של השרת:
+- מאגר קבוע של תהליכי worker, כל אחד טוען flatlib/swisseph ומחשב מפה אחת לחימום
+- תור קבלה חסום: כשהוא מלא – ComputeBusy (השרת מחזיר 503 + Retry-After)
+- deadline לכל משימה: משימה שחיכתה בתור מעבר לזמן שלה לא תרוץ בכלל,
+  והקורא מקבל DeadlineExceeded (השרת מחזיר 504)
+
+הגדרות (env):
+  COMPUTE_WORKERS   מספר תהליכים (ברירת מחדל: מספר הליבות; 0 = הרצה ישירה בתהליך הנוכחי)
+  COMPUTE_QUEUE     כמה משימות מותר להחזיק בהמתנה מעבר ל-workers (ברירת מחדל: 2×workers)
+  COMPUTE_MP_START  spawn / forkserver / fork (ברירת מחדל: spawn – בטוח גם תחת gunicorn threads)
+
+חלוקת ימים (map_ordered) – לטווחים ארוכים שרצים מחוץ למאגר (CLI / קריאה ישירה למנוע):
+  PARALLEL_WORKERS   כמה תהליכים (ברירת מחדל: מספר הליבות; 1 = תמיד סדרתי)
+  PARALLEL_MIN_DAYS  מאיזה מספר ימים מפצלים כברירת מחדל (מתחת – עלות העלאת התהליכים גדולה מהרווח)
+"""
+
+import os
+import math
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+
+class ComputeBusy(Exception):
+    """התור מלא – כדאי לנסות שוב בעוד retry_after שניות."""
+    def __init__(self, retry_after):
+        super().__init__(f"Compute queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """המשימה לא הסתיימה (או לא התחילה) לפני ה-deadline שלה."""
+
+
+# ========= צד ה-worker =========
+
+def _warm_worker():
+    """initializer: טעינת הספריות + מפת חימום אחת, כך שהבקשה הראשונה לא משלמת על זה."""
+    import astrology_forecast  # noqa: F401
+    import astro_calc_api
+    from ephemeris_table import get_table
+    import timezones
+    import sky_index
+    import stations
+    get_table()  # mmap של טבלת האפמריס (אם נבנתה)
+    sky_index.get_index()  # האינדקס הלילי (אם נבנה)
+    stations.get_calendar()  # לוח תחנות הנסיגה (אם נבנה)
+    timezones.finder()  # פוליגוני אזורי הזמן
+    astro_calc_api.build_chart("2000/01/01", "12:00", "+00:00", "0", "0")
+
+
+def _run_task(deadline_ts, submitted_at, fn, args, kwargs):
+    """מחזיר (תוצאה, מדידות השלבים של המשימה – metrics.Timings.as_dict())."""
+    # אם המשימה חיכתה בתור יותר מדי – אין טעם לחשב, הלקוח כבר קיבל 504
+    if deadline_ts is not None and time.time() > deadline_ts:
+        raise DeadlineExceeded("Task expired while queued")
+    with metrics.collect() as t:
+        t.add("queue", max(0.0, time.time() - submitted_at) * 1000.0)
+        with metrics.stage("engine"):
+            result = fn(*args, **kwargs)
+    return result, t.as_dict()
+
+
+def _noop():
+    return os.getpid()
+
+
+# ========= חלוקת ימים בין ליבות =========
+# בשרת כל בקשה כבר רצה ב-worker אחד (וזרם ה-PRO מתחלק בין ה-workers בחבילות ימים).
+# כאן – מאגר מקומי (בעצלות, נשאר חי לקריאות הבאות) למי שמחשב טווח ארוך ישירות.
+
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_DAYS = int(os.environ.get("PARALLEL_MIN_DAYS", "120"))
+
+_day_pool = None
+_day_pool_lock = threading.Lock()
+
+
+def _day_executor():
+    global _day_pool
+    with _day_pool_lock:
+        if _day_pool is None:
+            ctx = multiprocessing.get_context(os.environ.get("COMPUTE_MP_START", "spawn"))
+            _day_pool = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS, mp_context=ctx)
+    return _day_pool
+
+
+def use_parallel(days, parallel=None):
+    """
+    האם לפצל days ימים בין תהליכים. parallel=True / False מכריע; None = לפי PARALLEL_MIN_DAYS.
+    בתוך worker של מאגר (תהליך daemon) או עם ליבה אחת – תמיד סדרתי.
+    """
+    if PARALLEL_WORKERS <= 1 or multiprocessing.current_process().daemon:
+        return False
+    return days >= PARALLEL_MIN_DAYS if parallel is None else bool(parallel)
+
+
+def map_ordered(fn, items, parallel=False, chunksize=None):
+    """
+    fn(item) לכל פריט, התוצאות לפי סדר items (איטרטור – כל תוצאה יוצאת כשהיא וכל הקודמות מוכנות).
+    parallel=False: map רגיל בתהליך הנוכחי. fn ו-items עוברים ב-pickle (פונקציה ברמת מודול / partial).
+    chunksize: כמה פריטים בכל משימה (ברירת מחדל: ~4 משימות לכל תהליך).
+    """
+    if not parallel:
+        return map(fn, items)
+    items = list(items)
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(items) / (4 * PARALLEL_WORKERS)))
+    return _day_executor().map(fn, items, chunksize=chunksize)
+
+
+# ========= צד השרת =========
+
+class ComputePool:
+    def __init__(self, workers=None, queue_size=None, mp_start=None):
+        if workers is None:
+            workers = int(os.environ.get("COMPUTE_WORKERS", os.cpu_count() or 1))
+        if queue_size is None:
+            queue_size = int(os.environ.get("COMPUTE_QUEUE", 2 * max(workers, 1)))
+        self.workers = max(0, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.mp_start = mp_start or os.environ.get("COMPUTE_MP_START", "spawn")
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, self.workers) + self.queue_size)
+        self._in_flight = 0
+        self._avg_task_sec = 1.0   # EWMA של זמן משימה, להערכת Retry-After
+
+    # ---- מחזור חיים ----
+    def start(self):
+        """יוצר את ה-workers ומחמם אותם (נקרא מ-post_fork של gunicorn, או בעצלות בבקשה הראשונה)."""
+        if self.workers == 0:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            ctx = multiprocessing.get_context(self.mp_start)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=ctx, initializer=_warm_worker
+            )
+            # מריצים משימה ריקה לכל worker כדי שכולם יעלו ויתחממו עכשיו ולא תחת עומס
+            warm = [self._executor.submit(_noop) for _ in range(self.workers)]
+        for f in warm:
+            f.result()
+
+    def shutdown(self):
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+    # ---- מצב ----
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def retry_after(self):
+        waves = math.ceil((self._in_flight + 1) / max(1, self.workers))
+        return max(1, int(math.ceil(waves * self._avg_task_sec)))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self._in_flight,
+            "avg_task_sec": round(self._avg_task_sec, 3),
+            "started": self._executor is not None,
+            "mp_start": self.mp_start,
+        }
+
+    # ---- הרצה ----
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            raise ComputeBusy(self.retry_after())
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self, started_at):
+        elapsed = time.monotonic() - started_at
+        with self._lock:
+            self._in_flight -= 1
+            self._avg_task_sec = 0.8 * self._avg_task_sec + 0.2 * elapsed
+        self._slots.release()
+
+    def submit(self, fn, *args, deadline=None, **kwargs):
+        """
+        מגיש משימה ומחזיר Future. זורק ComputeBusy מיד אם התור מלא.
+        deadline: שניות מרגע ההגשה (None = ללא הגבלה).
+        המקום בתור מתפנה רק כשהמשימה באמת מסתיימת, גם אם הקורא כבר ויתר עליה.
+        ל-Future יש גם .timings – מדידות השלבים של המשימה (metrics.py) אחרי שהסתיימה.
+        """
+        self._acquire()
+        started_at = time.monotonic()
+        deadline_ts = (time.time() + deadline) if deadline else None
+        try:
+            if self.workers == 0:
+                task = Future()
+                try:
+                    task.set_result(_run_task(deadline_ts, time.time(), fn, args, kwargs))
+                except BaseException as e:
+                    task.set_exception(e)
+            else:
+                if self._executor is None:
+                    self.start()
+                task = self._executor.submit(_run_task, deadline_ts, time.time(), fn, args, kwargs)
+        except BrokenProcessPool:
+            self._release(started_at)
+            self.shutdown()
+            raise ComputeBusy(self.retry_after())
+        except BaseException:
+            self._release(started_at)
+            raise
+
+        fut = Future()
+        fut.timings = None
+
+        def done(task):
+            self._release(started_at)
+            try:
+                if task.cancelled():
+                    fut.cancel()
+                elif task.exception() is not None:
+                    fut.set_exception(task.exception())
+                else:
+                    result, fut.timings = task.result()
+                    metrics.observe_task(fut.timings)
+                    fut.set_result(result)
+            except InvalidStateError:
+                pass   # הקורא כבר ביטל
+
+        # ביטול מצד הקורא מבטל גם את המשימה (אם עוד לא התחילה)
+        fut.add_done_callback(lambda f: f.cancelled() and task.cancel())
+        task.add_done_callback(done)
+        return fut
+
+    def run(self, fn, *args, deadline=None, **kwargs):
+        """הגשה + המתנה לתוצאה עד ה-deadline."""
+        fut = self.submit(fn, *args, deadline=deadline, **kwargs)
+        try:
+            result = fut.result(timeout=deadline)
+            metrics.merge(fut.timings)   # לכותרת Server-Timing של הבקשה הנוכחית
+            return result
+        except FutureTimeout:
+            fut.cancel()
+            raise DeadlineExceeded(f"Computation exceeded its {deadline}s deadline")
+        except BrokenProcessPool:
+            self.shutdown()
+            raise ComputeBusy(self.retry_after())
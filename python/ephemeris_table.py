@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+ephemeris_table.py
+טבלת אפמריס מחושבת מראש + שכבת אינטרפולציה.
+
+שלב בנייה (אופליין / ב-buildCommand של Render):
+    python ephemeris_table.py build [--out data/ephemeris.bin] [--years 5] [--step-min 60]
+
+כותב לכל 10 הכוכבים (PLANETS) longitude + מהירות (°/יום) על רשת זמן קבועה
+(ברירת מחדל: כל 60 דק', ±5 שנים סביב היום) לקובץ בינארי קומפקטי (float64).
+השרת ממפה את הקובץ לזיכרון (mmap) – כל workers של gunicorn / מאגר החישוב
+חולקים את אותם דפים מה-page cache.
+
+אינטרפולציה: Hermite קובית לפי מיקום+מהירות בשני קצוות התא, כך שגם
+ה-longitude וגם המהירות (=> דגל נסיגה) רציפים. בזמן הבנייה נבדקת השגיאה
+מול swisseph בנקודות אמצע-תא אקראיות, והחסם נשמר בכותרת הקובץ
+(max_err_deg). ברשת של 60 דק' השגיאה בפועל קטנה מ-1e-6° (הירח הוא המקרה הגרוע).
+
+מחוץ לטווח הטבלה (או כשאין קובץ) – None, והקורא חוזר ל-swisseph.
+"""
+
+import os
+import sys
+import struct
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import swisseph
+
+from flatlib import const
+from flatlib.ephem import swe as flat_swe
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_PATH = HERE / "data" / "ephemeris.bin"
+
+PLANETS = [
+    const.SUN, const.MOON, const.MERCURY, const.VENUS, const.MARS,
+    const.JUPITER, const.SATURN, const.URANUS, const.NEPTUNE, const.PLUTO
+]
+
+MAGIC = b"LLEPHEM1"
+# magic, version, n_planets, n_rows, start_jd, step_days, max_err_deg
+HEADER_FMT = "<8sIIQddd"
+HEADER_SIZE = 64
+
+
+def _calc(jd, pid):
+    res, _ = swisseph.calc_ut(jd, flat_swe.SWE_OBJECTS[pid], swisseph.FLG_SPEED)
+    return res[0], res[3]
+
+
+def _unwrap_delta(d):
+    return (d + 180.0) % 360.0 - 180.0
+
+
+# ========= בנייה =========
+
+def build(out_path=DEFAULT_PATH, years=5.0, step_min=60, center_jd=None, check_samples=2000):
+    step_days = step_min / 1440.0
+    if center_jd is None:
+        now = datetime.now(timezone.utc)
+        center_jd = swisseph.julday(now.year, now.month, now.day, 0.0)
+    start_jd = float(np.floor(center_jd - years * 365.25))
+    n_rows = int(np.ceil(2 * years * 365.25 / step_days)) + 1
+
+    data = np.empty((n_rows, len(PLANETS), 2), dtype=np.float64)
+    for i in range(n_rows):
+        jd = start_jd + i * step_days
+        for j, p in enumerate(PLANETS):
+            data[i, j] = _calc(jd, p)
+
+    table = EphemerisTable.from_array(data, start_jd, step_days)
+
+    # בדיקת דיוק: נקודות אקראיות בתוך תאים מול swisseph
+    rng = np.random.default_rng(12345)
+    max_err = 0.0
+    for jd in start_jd + rng.uniform(0, (n_rows - 1) * step_days, size=check_samples):
+        lons, _ = table.positions_at(jd)
+        for j, p in enumerate(PLANETS):
+            ref, _ = _calc(jd, p)
+            max_err = max(max_err, abs(_unwrap_delta(lons[j] - ref)))
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        header = struct.pack(HEADER_FMT, MAGIC, 1, len(PLANETS), n_rows, start_jd, step_days, max_err)
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(data.tobytes())
+    os.replace(tmp, out_path)
+    return {"path": str(out_path), "rows": n_rows, "start_jd": start_jd,
+            "step_min": step_min, "max_err_deg": float(max_err),
+            "bytes": HEADER_SIZE + data.nbytes}
+
+
+# ========= קריאה + אינטרפולציה =========
+
+class EphemerisTable:
+    def __init__(self, data, start_jd, step_days, max_err_deg=None):
+        self.data = data                  # (rows, planets, 2) -> lon, speed
+        self.start_jd = start_jd
+        self.step_days = step_days
+        self.max_err_deg = max_err_deg
+        self.n_rows = data.shape[0]
+        self.end_jd = start_jd + (self.n_rows - 1) * step_days
+
+    @classmethod
+    def from_array(cls, data, start_jd, step_days):
+        return cls(data, start_jd, step_days)
+
+    @classmethod
+    def open(cls, path=DEFAULT_PATH):
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        magic, version, n_planets, n_rows, start_jd, step_days, max_err = \
+            struct.unpack(HEADER_FMT, header[:struct.calcsize(HEADER_FMT)])
+        if magic != MAGIC or version != 1 or n_planets != len(PLANETS):
+            raise ValueError(f"Unsupported ephemeris table: {path}")
+        data = np.memmap(path, dtype=np.float64, mode="r", offset=HEADER_SIZE,
+                         shape=(n_rows, n_planets, 2))
+        return cls(data, start_jd, step_days, max_err)
+
+    def covers(self, jd):
+        return self.start_jd <= jd <= self.end_jd
+
+    def positions_at(self, jd):
+        """(lons[P], speeds[P]) לרגע jd, או None מחוץ לטווח."""
+        lons, speeds = self.positions_many(np.asarray([jd], dtype=np.float64))
+        if lons is None:
+            return None
+        return lons[0], speeds[0]
+
+    def positions_many(self, jds):
+        """
+        וקטורי: jds[T] -> (lons[T,P], speeds[T,P]).
+        None אם אחד הרגעים מחוץ לטווח.
+        """
+        jds = np.asarray(jds, dtype=np.float64)
+        if jds.size and (jds.min() < self.start_jd or jds.max() > self.end_jd):
+            return None, None
+        x = (jds - self.start_jd) / self.step_days
+        i0 = np.clip(np.floor(x).astype(np.int64), 0, self.n_rows - 2)
+        s = (x - i0)[:, None]
+        a = self.data[i0]
+        b = self.data[i0 + 1]
+        h = self.step_days
+
+        p0 = a[..., 0]
+        p1 = p0 + _unwrap_delta(b[..., 0] - p0)
+        m0 = a[..., 1] * h
+        m1 = b[..., 1] * h
+
+        s2 = s * s
+        s3 = s2 * s
+        lon = (2*s3 - 3*s2 + 1) * p0 + (s3 - 2*s2 + s) * m0 + (-2*s3 + 3*s2) * p1 + (s3 - s2) * m1
+        dlon = ((6*s2 - 6*s) * p0 + (3*s2 - 4*s + 1) * m0 + (-6*s2 + 6*s) * p1 + (3*s2 - 2*s) * m1) / h
+        return np.mod(lon, 360.0), dlon
+
+
+_TABLE = None
+_TABLE_LOADED = False
+
+
+def get_table():
+    """הטבלה הממופה של התהליך (או None אם אין קובץ). נטען פעם אחת."""
+    global _TABLE, _TABLE_LOADED
+    if not _TABLE_LOADED:
+        _TABLE_LOADED = True
+        path = Path(os.environ.get("EPHEMERIS_TABLE") or DEFAULT_PATH)
+        if path.exists():
+            try:
+                _TABLE = EphemerisTable.open(path)
+            except Exception as e:
+                print(f"ephemeris table ignored: {e}", file=sys.stderr)
+                _TABLE = None
+    return _TABLE
+
+
+# ========= CLI =========
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build / inspect the precomputed ephemeris table")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Compute the table and write it to disk")
+    b.add_argument("--out", default=str(DEFAULT_PATH))
+    b.add_argument("--years", type=float, default=5.0, help="Years before and after today")
+    b.add_argument("--step-min", type=int, default=60, help="Grid step in minutes")
+    i = sub.add_parser("info", help="Print the header of an existing table")
+    i.add_argument("--path", default=str(DEFAULT_PATH))
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        info = build(args.out, years=args.years, step_min=args.step_min)
+    else:
+        t = EphemerisTable.open(args.path)
+        info = {"path": args.path, "rows": t.n_rows, "start_jd": t.start_jd, "end_jd": t.end_jd,
+                "step_min": round(t.step_days * 1440.0, 3), "max_err_deg": t.max_err_deg}
+    print(info)
+
+
+if __name__ == "__main__":
+    main()
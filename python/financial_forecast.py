@@ -3,11 +3,18 @@ import sys
 import json
 import argparse
 from datetime import datetime, timedelta
-from flatlib.chart import Chart
+from functools import partial
 from flatlib.datetime import Datetime
 from flatlib.geopos import GeoPos
 from flatlib import const, angle
 
+from transit_cache import transit_chart
+from positions import lean_chart
+import stations
+import scoring
+import metrics
+import compute_pool
+
 # ========================
 # Helpers
 # ========================
@@ -40,7 +47,7 @@ PLANETS = [
     const.JUPITER, const.SATURN, const.URANUS, const.NEPTUNE, const.PLUTO
 ]
 
-MONEY_OBJECTS = [const.VENUS, const.JUPITER, const.MOON, const.PLUTO, 'FORTUNE']
+MONEY_OBJECTS = scoring.MONEY_OBJECTS
 HARMONIC_ANGLES = [0, 60, 120, 180]
 ORB_DEG = 3  # אורב לאספקט
 
@@ -68,7 +75,13 @@ DEFAULT_INTERVAL = 3
 
 def create_chart(date_str, time_str, tz_offset, geopos):
     dt = Datetime(date_str, time_str, tz_offset)
-    return Chart(dt, geopos, IDs=PLANETS)
+    metrics.count("charts")
+    return lean_chart(dt, geopos, PLANETS)   # כוכבים + ASC (לפורטונה), בלי קוספים
+
+def create_transit_chart(date_str, time_str, tz_offset, geopos, angles=True):
+    """מפת טרנזיט: כוכבים ממטמון הטרנזיטים המשותף, ASC/MC למיקום (אם angles)."""
+    dt = Datetime(date_str, time_str, tz_offset)
+    return transit_chart(dt, geopos, PLANETS, angles=angles)
 
 def calc_angle(pos1, pos2):
     diff = abs(pos1 - pos2) % 360
@@ -102,33 +115,38 @@ def find_lucky_blocks_for_day(
     interval_hours=DEFAULT_INTERVAL
 ):
     date_str = date_obj.strftime('%Y/%m/%d')
-    blocks = []
-
-    for hour in range(start_hour, end_hour + 1, interval_hours):
-        time_str = f"{hour:02d}:00"
-        transit_chart = create_chart(date_str, time_str, tz_offset, geopos)
-        fortune_now = calculate_part_of_fortune(transit_chart)
-
-        found_aspects = []
-        # בדיקת זוויות הרמוניות בין MONEY_OBJECTS של לידה ↔ טרנזיט
-        for p1 in MONEY_OBJECTS:
-            pos1 = birth_chart.get(p1).lon if p1 != 'FORTUNE' else fortune_birth
-            for p2 in MONEY_OBJECTS:
-                pos2 = transit_chart.get(p2).lon if p2 != 'FORTUNE' else fortune_now
-                ang_val = calc_angle(pos1, pos2)
-                for h_angle in HARMONIC_ANGLES:
-                    if abs(ang_val - h_angle) <= ORB_DEG:
-                        icon1 = PLANET_ICONS.get(p1, p1)
-                        icon2 = PLANET_ICONS.get(p2, p2)
-                        meaning = ANGLE_MEANINGS.get(h_angle, "")
-                        found_aspects.append(f"{icon1} {p1} ↔ {icon2} {p2} — {h_angle}° {meaning}")
+    hours = list(range(start_hour, end_hour + 1, interval_hours))
+
+    def money_lons(chart, fortune):
+        return [chart.get(p).lon if p != 'FORTUNE' else fortune for p in MONEY_OBJECTS]
+
+    # כל השעות בבת אחת: [T, P] טרנזיט מול MONEY_OBJECTS של הלידה
+    transit_lons = []
+    for hour in hours:
+        tr_chart = create_transit_chart(date_str, f"{hour:02d}:00", tz_offset, geopos)
+        transit_lons.append(money_lons(tr_chart, calculate_part_of_fortune(tr_chart)))
+    natal_lons = money_lons(birth_chart, fortune_birth)
+    rules = scoring.compile_rules("count", MONEY_OBJECTS, MONEY_OBJECTS, HARMONIC_ANGLES, ORB_DEG)
+    hits, raw = rules.evaluate(natal_lons, transit_lons, order="nt")
+    score_est = rules.percent(raw)
+
+    found_by_t = {}
+    for t, ni, ti, ai in zip(hits.t, hits.na, hits.tr, hits.angle_idx):
+        p1, p2, h_angle = MONEY_OBJECTS[ni], MONEY_OBJECTS[ti], HARMONIC_ANGLES[ai]
+        icon1 = PLANET_ICONS.get(p1, p1)
+        icon2 = PLANET_ICONS.get(p2, p2)
+        meaning = ANGLE_MEANINGS.get(h_angle, "")
+        found_by_t.setdefault(int(t), []).append(f"{icon1} {p1} ↔ {icon2} {p2} — {h_angle}° {meaning}")
 
+    blocks = []
+    for i, hour in enumerate(hours):
+        found_aspects = found_by_t.get(i)
         if found_aspects:
             blocks.append({
-                "time": time_str,
+                "time": f"{hour:02d}:00",
                 "aspects": found_aspects,
                 "score_text": estimate_potential_text(len(found_aspects)),
-                "score_est": clamp(50 + len(found_aspects) * 6, 0, 100)  # ניקוד גס 0..100
+                "score_est": int(score_est[i])  # ניקוד גס 0..100 (כלל "count")
             })
 
     return blocks
@@ -136,7 +154,10 @@ def find_lucky_blocks_for_day(
 def list_retrograde_planets(date_obj, tz_offset, geopos):
     """בדיקת כוכבים בנסיגה בצהרי היום."""
     date_str = date_obj.strftime('%Y/%m/%d')
-    chart = create_chart(date_str, '12:00', tz_offset, geopos)
+    retro = stations.retro_at(Datetime(date_str, '12:00', tz_offset).jd)   # לוח התחנות, אם נבנה
+    if retro is not None:
+        return [{"name": p, "icon": PLANET_ICONS.get(p, "")} for p in retro]
+    chart = create_transit_chart(date_str, '12:00', tz_offset, geopos, angles=False)
     retros = []
     for p in PLANETS:
         if chart.get(p).isRetrograde():
@@ -147,10 +168,33 @@ def list_retrograde_planets(date_obj, tz_offset, geopos):
 # Public API
 # ========================
 
+def _forecast_day(day, tz_offset, geopos, birth_chart, fortune_birth, start_hour, end_hour, interval_hours):
+    """יום אחד של build_forecast_json (ברמת מודול – כדי שיעבור ל-map_ordered)."""
+    date_str = day.strftime('%Y/%m/%d')
+
+    retro = list_retrograde_planets(day, tz_offset, geopos)
+    blocks = find_lucky_blocks_for_day(
+        day, tz_offset, geopos, birth_chart, fortune_birth,
+        start_hour=start_hour, end_hour=end_hour, interval_hours=interval_hours
+    )
+
+    best_time = None
+    if blocks:
+        best_time = max(blocks, key=lambda b: b.get("score_est", 0))["time"]
+
+    return {
+        "date": date_str,
+        "retro": retro,                # [{name, icon}]
+        "windows": blocks,             # [{time, aspects[], score_text, score_est}]
+        "recommendation": (
+            f"🟢 מומלץ למלא סביב {best_time}" if best_time else "אין המלצה ליום זה"
+        )
+    }
+
 def build_forecast_json(
     birth_date, birth_time, tz_offset, lat_dec, lon_dec,
     days=3, start_hour=DEFAULT_START_HOUR, end_hour=DEFAULT_END_HOUR, interval_hours=DEFAULT_INTERVAL,
-    start_date=None
+    start_date=None, parallel=None
 ):
     """
     מחזיר dict שניתן להדפיס כ-JSON.
@@ -160,6 +204,7 @@ def build_forecast_json(
     - lat_dec/lon_dec: float (Decimal Degrees)
     - days: number of forecast days (default 3)
     - start_date: 'YYYY/MM/DD' (אם None – היום במערכת)
+    - parallel: חלוקת הימים בין ליבות (None = רק מ-compute_pool.PARALLEL_MIN_DAYS ימים, False = סדרתי)
     """
     geopos = build_geopos(lat_dec, lon_dec)
 
@@ -174,29 +219,12 @@ def build_forecast_json(
         # "היום" לפי שעון מערכת – Flatlib ישתמש ב-tz_offset עצמו
         base = datetime.utcnow()
 
-    days_out = []
-    for i in range(days):
-        day = base + timedelta(days=i)
-        date_str = day.strftime('%Y/%m/%d')
-
-        retro = list_retrograde_planets(day, tz_offset, geopos)
-        blocks = find_lucky_blocks_for_day(
-            day, tz_offset, geopos, birth_chart, fortune_birth,
-            start_hour=start_hour, end_hour=end_hour, interval_hours=interval_hours
-        )
-
-        best_time = None
-        if blocks:
-            best_time = max(blocks, key=lambda b: b.get("score_est", 0))["time"]
-
-        days_out.append({
-            "date": date_str,
-            "retro": retro,                # [{name, icon}]
-            "windows": blocks,             # [{time, aspects[], score_text, score_est}]
-            "recommendation": (
-                f"🟢 מומלץ למלא סביב {best_time}" if best_time else "אין המלצה ליום זה"
-            )
-        })
+    one_day = partial(_forecast_day, tz_offset=tz_offset, geopos=geopos, birth_chart=birth_chart,
+                      fortune_birth=fortune_birth, start_hour=start_hour, end_hour=end_hour,
+                      interval_hours=interval_hours)
+    days_out = list(compute_pool.map_ordered(
+        one_day, [base + timedelta(days=i) for i in range(days)],
+        parallel=compute_pool.use_parallel(days, parallel)))
 
     return {
         "meta": {
@@ -232,6 +260,11 @@ def main():
     parser.add_argument("--start-hour", type=int, default=DEFAULT_START_HOUR)
     parser.add_argument("--end-hour", type=int, default=DEFAULT_END_HOUR)
     parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL)
+    par = parser.add_mutually_exclusive_group()
+    par.add_argument("--parallel", dest="parallel", action="store_const", const=True, default=None,
+                     help="Split the days across CPU cores (default: only for long ranges)")
+    par.add_argument("--serial", dest="parallel", action="store_const", const=False,
+                     help="Compute the days one after another in this process")
 
     args = parser.parse_args()
 
@@ -245,7 +278,8 @@ def main():
         start_hour=args.start_hour,
         end_hour=args.end_hour,
         interval_hours=args.interval,
-        start_date=args.start_date
+        start_date=args.start_date,
+        parallel=args.parallel
     )
     print(json.dumps(data, ensure_ascii=False))
 
@@ -0,0 +1,28 @@
+# gunicorn.conf.py – נטען אוטומטית ע"י gunicorn מתוך תיקיית python/
+# כל worker של gunicorn מקים ומחמם את מאגר תהליכי החישוב שלו מיד אחרי ה-fork,
+# כך שהבקשה הראשונה לא משלמת על טעינת flatlib/swisseph.
+
+import os
+
+# keep-alive: חיבורים נשארים פתוחים בין בקשות (worker מסוג gthread בגלל --threads).
+# ארוך מה-idle timeout של הפרוקסי כדי שהפרוקסי יהיה זה שסוגר ולא אנחנו באמצע בקשה.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "75"))
+
+
+def post_fork(server, worker):
+    from astro_server import COMPUTE
+    COMPUTE.start()
+    server.log.info("compute pool ready: %s", COMPUTE.stats())
+
+
+def when_ready(server):
+    # בנייה לילית של sky_index – פעם אחת, בתהליך ה-master (ולא בכל worker);
+    # ה-workers טוענים את הקובץ החדש לבד לפי mtime
+    import sky_index
+    if sky_index.start_scheduler():
+        server.log.info("sky index scheduler started in master")
+
+
+def worker_exit(server, worker):
+    from astro_server import COMPUTE
+    COMPUTE.shutdown()
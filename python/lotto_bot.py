@@ -0,0 +1,768 @@
+# -*- coding: utf-8 -*-
+"""
+lotto_bot.py
+בוט התראות הבוקר: לכל מנוי – שעות המזל של היום (אותו ניקוד כמו lucky_blocks של astrology_forecast),
+נשלחות דרך ערוץ מתחלף (Telegram / webhook / stdout).
+
+    python lotto_bot.py subscribers import subscribers.jsonl     # שורה: destination, birth_date, birth_time, lat, lon, [tz, lang, id]
+    python lotto_bot.py subscribers add --destination 12345 --birth-date 1990-05-17 --birth-time 08:30 --lat 32.08 --lon 34.78
+    python lotto_bot.py run --transport telegram                 # היום (UTC); הרצה חוזרת ממשיכה מאיפה שנעצרה
+    python lotto_bot.py run --date 2026-10-18 --transport webhook --webhook-url http://127.0.0.1:8099/push
+    python lotto_bot.py status --date 2026-10-18
+
+חישוב: מפת הלידה של כל מנוי נשמרת כבר ב-import (10 אורכים), ולכל יום נבנית רשת טרנזיט אחת משותפת
+(DayGrid: כל 15 דקות UTC, מכסה את כל אזורי הזמן) – כל מנוי הוא רק בחירת שורות + scoring וקטורי.
+שליחה: asyncio – צרכנים מתור חסום, מגביל קצב גלובלי + מרווח מינימלי לכל יעד, ניסיונות חוזרים עם
+backoff (ו-retry_after של 429). ההתקדמות נרשמת ב-SQLite לכל הרצה (run_id), כך שהרצה שנקטעה
+ממשיכה בלי לשלוח שוב למי שכבר קיבל; המנויים נקראים בדפים, כך שהזיכרון לא תלוי במספרם.
+
+הגדרות (env):
+  BOT_DB               קובץ SQLite של המנויים וההתקדמות (ברירת מחדל python/data/bot.sqlite3)
+  BOT_RATE             הודעות לשנייה בסה"כ (ברירת מחדל 25; 0 = בלי הגבלה)
+  BOT_DEST_INTERVAL    שניות בין שתי הודעות לאותו יעד (ברירת מחדל 1.0)
+  BOT_CONCURRENCY      שליחות במקביל (ברירת מחדל 32)
+  BOT_MAX_ATTEMPTS     ניסיונות לכל הודעה (ברירת מחדל 5)
+  BOT_PAGE             מנויים בכל דף חישוב (ברירת מחדל 1000)
+  BOT_TOP_WINDOWS      כמה שעות להציג בהודעה (ברירת מחדל 3)
+  TELEGRAM_BOT_TOKEN   / TELEGRAM_API_BASE (ברירת מחדל https://api.telegram.org)
+  BOT_WEBHOOK_URL      יעד ה-POST של --transport webhook
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import sqlite3
+import asyncio
+import argparse
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from flatlib.datetime import Datetime
+
+import astrology_forecast
+import profiles
+import scoring
+import timezones
+from positions import ChartSnapshot, lean_chart
+from transit_cache import CACHE, minute_key, prefetch, MINUTES_PER_DAY
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_DB = HERE / "data" / "bot.sqlite3"
+
+BOT_RATE = float(os.environ.get("BOT_RATE", "25"))
+BOT_DEST_INTERVAL = float(os.environ.get("BOT_DEST_INTERVAL", "1.0"))
+BOT_CONCURRENCY = int(os.environ.get("BOT_CONCURRENCY", "32"))
+BOT_MAX_ATTEMPTS = int(os.environ.get("BOT_MAX_ATTEMPTS", "5"))
+BOT_PAGE = int(os.environ.get("BOT_PAGE", "1000"))
+BOT_TOP_WINDOWS = int(os.environ.get("BOT_TOP_WINDOWS", "3"))
+HTTP_TIMEOUT_SEC = float(os.environ.get("BOT_HTTP_TIMEOUT", "10"))
+
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_MAX_SEC = 60.0
+COMMIT_EVERY = 200        # כמה תוצאות נצברות לפני כתיבה ל-DB
+PROGRESS_EVERY_SEC = 5.0
+
+PLANETS = astrology_forecast.PLANETS
+
+Message = namedtuple("Message", ["subscriber_id", "destination", "text", "error"])
+
+
+# ========= מנויים והתקדמות =========
+
+class SubscriberStore:
+    """
+    subscribers: id, destination, lang, tzid, natal (JSON – אורכי PLANETS בלידה)
+    deliveries:  מצב כל מנוי בכל הרצה – sent / failed (ננסה שוב בהמשך ההרצה) / dead (שגיאה קבועה)
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.environ.get("BOT_DB") or DEFAULT_DB)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS subscribers ("
+            " id TEXT PRIMARY KEY, destination TEXT NOT NULL, lang TEXT NOT NULL,"
+            " tzid TEXT NOT NULL, natal TEXT NOT NULL, created_at TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            " run_id TEXT NOT NULL, subscriber_id TEXT NOT NULL, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL, error TEXT, updated_at TEXT NOT NULL,"
+            " PRIMARY KEY (run_id, subscriber_id))"
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def upsert_many(self, rows):
+        """rows: [(id, destination, lang, tzid, natal_lons)]"""
+        now = datetime.now(timezone.utc).isoformat()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO subscribers (id, destination, lang, tzid, natal, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [(sid, str(dest), lang, tzid, json.dumps([float(v) for v in natal]), now)
+             for sid, dest, lang, tzid, natal in rows]
+        )
+        self._conn.commit()
+
+    def remove(self, sid):
+        cur = self._conn.execute("DELETE FROM subscribers WHERE id = ?", (sid,))
+        self._conn.commit()
+        return cur.rowcount
+
+    def count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM subscribers").fetchone()[0]
+
+    def pending_page(self, run_id, after_id, limit):
+        """הדף הבא (לפי id) של מנויים שעוד לא קיבלו את ההודעה של run_id."""
+        return self._conn.execute(
+            "SELECT s.id, s.destination, s.lang, s.tzid, s.natal FROM subscribers s"
+            " LEFT JOIN deliveries d ON d.run_id = ? AND d.subscriber_id = s.id"
+            " WHERE s.id > ? AND (d.status IS NULL OR d.status = 'failed')"
+            " ORDER BY s.id LIMIT ?",
+            (run_id, after_id, limit)
+        ).fetchall()
+
+    def record(self, run_id, results):
+        """results: [(subscriber_id, status, attempts, error)]"""
+        if not results:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO deliveries (run_id, subscriber_id, status, attempts, error, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [(run_id, sid, status, attempts, error, now) for sid, status, attempts, error in results]
+        )
+        self._conn.commit()
+
+    def reset_run(self, run_id):
+        self._conn.execute("DELETE FROM deliveries WHERE run_id = ?", (run_id,))
+        self._conn.commit()
+
+    def run_status(self, run_id):
+        counts = dict(self._conn.execute(
+            "SELECT status, COUNT(*) FROM deliveries WHERE run_id = ? GROUP BY status", (run_id,)
+        ).fetchall())
+        total = self.count()
+        done = counts.get("sent", 0) + counts.get("dead", 0)
+        return {"run_id": run_id, "subscribers": total, **counts, "remaining": max(0, total - done)}
+
+
+_PROFILES = None
+
+
+def _profile_store():
+    global _PROFILES
+    if _PROFILES is None:
+        _PROFILES = profiles.ProfileStore()
+    return _PROFILES
+
+
+def natal_for(data):
+    """
+    (tzid, אורכי הלידה) לשורת מנוי: profile_id קיים (profiles.py), או birth_date/birth_time/lat/lon[/tz].
+    tzid – אזור הזמן שלפיו נקבע "היום" של המנוי (tz אם הוא TZID, אחרת ניחוש לפי lat/lon).
+    """
+    if data.get("profile_id"):
+        profile = _profile_store().get(data["profile_id"])
+        natal = ChartSnapshot.from_dict(profile["natal"])
+        tzid = profile.get("tzid") or astrology_forecast.guess_tzid(profile["lat"], profile["lon"])
+        return tzid or "Etc/UTC", [natal.get(p).lon for p in PLANETS]
+
+    birth_date = profiles._norm_date(data.get("birth_date") or data.get("date"))
+    birth_time = (data.get("birth_time") or data.get("time") or "").strip()
+    lat, lon = float(data["lat"]), float(data["lon"])
+    birth_local = datetime.strptime(f"{birth_date} {birth_time}", "%Y-%m-%d %H:%M")
+    tzid, offset = profiles.resolve_tz(data.get("tz"), lat, lon, birth_local)
+    chart = lean_chart(Datetime(birth_local.strftime('%Y/%m/%d'), birth_time, offset),
+                       astrology_forecast.build_location(lat, lon), PLANETS, angles=False)
+    tzid = tzid or astrology_forecast.guess_tzid(lat, lon) or "Etc/UTC"
+    return tzid, [chart.get(p).lon for p in PLANETS]
+
+
+def import_subscribers(store, lines, batch=1000):
+    """JSONL של מנויים -> store, בחבילות (זיכרון קבוע). מחזיר (נוספו, שגיאות)."""
+    added, errors, rows = 0, [], []
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            dest = str(data["destination"]).strip()
+            if not dest:
+                raise ValueError("empty destination")
+            tzid, natal = natal_for(data)
+            rows.append((str(data.get("id") or dest), dest, data.get("lang") or "he", tzid, natal))
+        except (ValueError, KeyError, TypeError, profiles.ProfileNotFound) as e:
+            errors.append(f"line {n}: {e}")
+            continue
+        if len(rows) >= batch:
+            store.upsert_many(rows)
+            added += len(rows)
+            rows = []
+    if rows:
+        store.upsert_many(rows)
+        added += len(rows)
+    return added, errors
+
+
+# ========= חישוב: רשת טרנזיט אחת לכל המנויים =========
+
+class DayGrid:
+    """
+    מיקומי הטרנזיט כל GRID_STEP_MIN דקות UTC, מ-START_HOUR של היום ב-UTC+14 ועד END_HOUR ב-UTC-12 –
+    כל שעה מקומית של כל מנוי היא שורה ברשת (כל ה-offsets הנוכחיים הם כפולות של 15 דקות).
+    השורות נלקחות ממטמון הטרנזיטים (אותם מפתחות דקה כמו chart_at_local), כך שהתוצאה זהה ל-lucky_blocks.
+    """
+    GRID_STEP_MIN = 15
+
+    def __init__(self, day):
+        self.day = day
+        start = datetime(day.year, day.month, day.day, astrology_forecast.START_HOUR) - timedelta(hours=14)
+        end = datetime(day.year, day.month, day.day, astrology_forecast.END_HOUR) + timedelta(hours=12)
+        start_jd = Datetime(start.strftime('%Y/%m/%d'), start.strftime('%H:%M'), "+00:00").jd
+        self.key0 = minute_key(start_jd)
+        n = int((end - start).total_seconds() // (self.GRID_STEP_MIN * 60)) + 1
+        keys = self.key0 + self.GRID_STEP_MIN * np.arange(n)
+        prefetch(keys / MINUTES_PER_DAY)
+        self.lons = np.array([[b[p].lon for p in PLANETS]
+                              for b in (CACHE.bodies_at_jd(k / MINUTES_PER_DAY) for k in keys)])
+        self.rules = scoring.compile_rules("blocks", PLANETS, PLANETS,
+                                           astrology_forecast.ASPECT_ANGLES, astrology_forecast.ASPECT_ORBS)
+        self._rows = {}   # tzid -> (["05:00", ...], אינדקסים לרשת)
+
+    def rows_for(self, tzid):
+        hit = self._rows.get(tzid)
+        if hit is None:
+            times, idx = [], []
+            d = self.day
+            for minute in range(astrology_forecast.START_HOUR * 60, astrology_forecast.END_HOUR * 60 + 1,
+                                astrology_forecast.STEP_MIN):
+                local = datetime(d.year, d.month, d.day) + timedelta(minutes=minute)
+                off = timezones.offset_str(local, tzid)
+                jd = Datetime(local.strftime('%Y/%m/%d'), local.strftime('%H:%M'), off).jd
+                times.append(local.strftime("%H:%M"))
+                idx.append(round((minute_key(jd) - self.key0) / self.GRID_STEP_MIN))
+            hit = self._rows[tzid] = (times, np.clip(idx, 0, len(self.lons) - 1))
+        return hit
+
+    def windows(self, tzid, natal_lons):
+        """[(HH:MM, אחוז)] – השעות שיש בהן היבט "כסף" (כמו lucky_blocks_for_day), לפי הסדר."""
+        times, idx = self.rows_for(tzid)
+        raw = self.rules.scores(natal_lons, self.lons[idx])
+        pct = self.rules.percent(raw)
+        return [(t, int(p)) for t, r, p in zip(times, raw, pct) if r > 0]
+
+
+def compose_text(windows, day, lang="he", top=BOT_TOP_WINDOWS):
+    day_str = day.strftime("%d/%m")
+    if not windows:
+        if lang == "en":
+            return f"🍀 {day_str}: no standout lucky hours today – try again tomorrow"
+        return f"🍀 {day_str}: היום אין שעות מזל בולטות – נסו שוב מחר"
+    best = max(windows, key=lambda w: w[1])[0]
+    shown = sorted(sorted(windows, key=lambda w: -w[1])[:top])
+    if lang == "en":
+        lines = [f"🍀 Your lucky hours for {day_str}:"]
+        lines += [f"🕘 {t} – potential {p}%" for t, p in shown]
+        lines.append(f"🟢 Best time to play: around {best}")
+    else:
+        lines = [f"🍀 שעות המזל שלך ל-{day_str}:"]
+        lines += [f"🕘 {t} – פוטנציאל {p}%" for t, p in shown]
+        lines.append(f"🟢 מומלץ למלא סביב {best}")
+    return "\n".join(lines)
+
+
+def compose_page(grid, rows, top=BOT_TOP_WINDOWS):
+    """דף מנויים -> [Message]. מנוי עם נתונים פגומים מקבל error במקום text (ונרשם dead)."""
+    out = []
+    for sid, dest, lang, tzid, natal in rows:
+        try:
+            text = compose_text(grid.windows(tzid, json.loads(natal)), grid.day, lang, top)
+            out.append(Message(sid, dest, text, None))
+        except Exception as e:
+            out.append(Message(sid, dest, None, f"compose failed: {e}"))
+    return out
+
+
+# ========= ערוצי שליחה =========
+
+class TransientError(Exception):
+    """כדאי לנסות שוב. retry_after: כמה לחכות (אם היעד אמר); global_: ההמתנה חלה על כל השליחות."""
+    def __init__(self, message, retry_after=None, global_=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.global_ = global_
+
+
+class PermanentError(Exception):
+    """אין טעם לנסות שוב (למשל המשתמש חסם את הבוט)."""
+
+
+class HttpClient:
+    """לקוח HTTP/1.1 מינימלי ל-asyncio: POST של JSON עם חיבורי keep-alive לכל שרת (בלי תלות חיצונית)."""
+
+    def __init__(self, timeout=HTTP_TIMEOUT_SEC, max_idle=64):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = {}   # (host, port, tls) -> [(reader, writer)]
+
+    async def post_json(self, url, payload, headers=None):
+        """(status, headers, body bytes). זורק OSError / asyncio.TimeoutError בבעיות רשת."""
+        u = urlsplit(url)
+        tls = u.scheme == "https"
+        key = (u.hostname, u.port or (443 if tls else 80), tls)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [f"POST {u.path or '/'}{'?' + u.query if u.query else ''} HTTP/1.1", f"Host: {u.netloc}",
+                "Content-Type: application/json; charset=utf-8", f"Content-Length: {len(body)}",
+                "Connection: keep-alive"]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        request = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+        return await asyncio.wait_for(self._exchange(key, request), self.timeout)
+
+    async def _exchange(self, key, request):
+        pool = self._idle.setdefault(key, [])
+        while True:
+            reused = bool(pool)
+            reader, writer = pool.pop() if reused else await asyncio.open_connection(
+                key[0], key[1], ssl=True if key[2] else None)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers, body = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue   # השרת סגר חיבור keep-alive ישן – ננסה בחיבור חדש
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if headers.get("connection", "").lower() == "close" or len(pool) >= self.max_idle:
+                writer.close()
+            else:
+                pool.append((reader, writer))
+            return status, headers, body
+
+    @staticmethod
+    async def _read_response(reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed")
+        status = int(line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass   # trailers
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            headers["connection"] = "close"
+        return status, headers, body
+
+    async def close(self):
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+
+def _retry_after(headers, data=None):
+    try:
+        return float((data or {}).get("parameters", {}).get("retry_after") or headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Transport:
+    """ערוץ שליחה: send() מחזיר בהצלחה, או זורק TransientError / PermanentError."""
+
+    async def send(self, destination, text, key):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class TelegramTransport(Transport):
+    """sendMessage של Bot API. api_base ניתן להחלפה (למשל benchmarks/push_standin.py מקומי)."""
+
+    def __init__(self, token, api_base=None, client=None):
+        if not token:
+            raise ValueError("TELEGRAM_BOT_TOKEN is not set")
+        base = (api_base or os.environ.get("TELEGRAM_API_BASE") or "https://api.telegram.org").rstrip("/")
+        self.url = f"{base}/bot{token}/sendMessage"
+        self.client = client or HttpClient()
+
+    async def send(self, destination, text, key):
+        status, headers, body = await self.client.post_json(
+            self.url, {"chat_id": destination, "text": text}, headers={"Idempotency-Key": key})
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            data = {}
+        if status == 200 and data.get("ok", True):
+            return
+        desc = data.get("description") or f"HTTP {status}"
+        if status == 429:
+            # flood control של הבוט כולו – כל השליחות ממתינות
+            raise TransientError(desc, retry_after=_retry_after(headers, data), global_=True)
+        if status >= 500:
+            raise TransientError(desc)
+        raise PermanentError(desc)   # 400 chat not found, 403 blocked ...
+
+    async def close(self):
+        await self.client.close()
+
+
+class WebhookTransport(Transport):
+    """POST {"destination", "text"} ל-url (שירות שליחה חיצוני / שרת בדיקה)."""
+
+    def __init__(self, url, client=None):
+        if not url:
+            raise ValueError("BOT_WEBHOOK_URL is not set")
+        self.url = url
+        self.client = client or HttpClient()
+
+    async def send(self, destination, text, key):
+        status, headers, _ = await self.client.post_json(
+            self.url, {"destination": destination, "text": text}, headers={"Idempotency-Key": key})
+        if 200 <= status < 300:
+            return
+        if status == 429:
+            raise TransientError("HTTP 429", retry_after=_retry_after(headers), global_=True)
+        if status >= 500 or status == 408:
+            raise TransientError(f"HTTP {status}", retry_after=_retry_after(headers))
+        raise PermanentError(f"HTTP {status}")
+
+    async def close(self):
+        await self.client.close()
+
+
+class StdoutTransport(Transport):
+    """הדפסה בלבד (ריצה יבשה)."""
+
+    async def send(self, destination, text, key):
+        print(json.dumps({"destination": destination, "key": key, "text": text}, ensure_ascii=False), flush=True)
+
+
+def make_transport(name, api_base=None, webhook_url=None):
+    if name == "telegram":
+        return TelegramTransport(os.environ.get("TELEGRAM_BOT_TOKEN"), api_base)
+    if name == "webhook":
+        return WebhookTransport(webhook_url or os.environ.get("BOT_WEBHOOK_URL"))
+    if name == "stdout":
+        return StdoutTransport()
+    raise ValueError(f"Unknown transport: {name}")
+
+
+# ========= הגבלת קצב =========
+
+class RateLimiter:
+    """
+    דלי אסימונים גלובלי (rate הודעות לשנייה, 0 = בלי) + מרווח מינימלי בין הודעות לאותו יעד,
+    + השהיה גלובלית / ליעד אחרי retry_after מהשרת.
+    """
+    MAX_TRACKED = 10000
+
+    def __init__(self, rate, per_destination):
+        self.rate = float(rate)
+        self.per_destination = float(per_destination)
+        self._burst = max(1.0, self.rate)
+        self._tokens = self._burst
+        self._stamp = time.monotonic()
+        self._next = {}   # destination -> מתי מותר לשלוח אליו שוב (monotonic)
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, destination):
+        now = time.monotonic()
+        slot = max(now, self._next.get(destination, 0.0))
+        self._next[destination] = slot + self.per_destination
+        if len(self._next) > self.MAX_TRACKED:
+            self._next = {d: t for d, t in self._next.items() if t > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def delay(self, destination, seconds):
+        self._next[destination] = max(self._next.get(destination, 0.0), time.monotonic() + seconds)
+
+
+# ========= הצינור =========
+
+class PushRun:
+    """
+    הרצה אחת: יצרן (דפים של מנויים -> חישוב ב-thread -> תור חסום) ו-concurrency צרכנים
+    (הגבלת קצב -> send -> ניסיונות חוזרים). התוצאות נכתבות ל-deliveries בחבילות של COMMIT_EVERY.
+    stop(): עצירה מסודרת – שליחות שכבר באוויר מסתיימות ונרשמות, מה שבתור נשאר להרצה הבאה.
+    """
+
+    def __init__(self, store, transport, day, run_id, rate=BOT_RATE, per_destination=BOT_DEST_INTERVAL,
+                 concurrency=BOT_CONCURRENCY, max_attempts=BOT_MAX_ATTEMPTS, page=BOT_PAGE, limit=None,
+                 top=BOT_TOP_WINDOWS, log=sys.stderr):
+        self.store = store
+        self.transport = transport
+        self.day = day
+        self.run_id = run_id
+        self.limiter = RateLimiter(rate, per_destination)
+        self.concurrency = max(1, int(concurrency))
+        self.max_attempts = max(1, int(max_attempts))
+        self.page = max(1, int(page))
+        self.limit = limit
+        self.top = top
+        self.log = log
+        self.counts = {"sent": 0, "failed": 0, "dead": 0, "retries": 0}
+        self._results = []
+        self._stop = asyncio.Event()
+
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+
+    def stop(self):
+        self._stop.set()
+
+    def _record(self, sid, status, attempts, error=None):
+        self.counts[status] += 1
+        self._results.append((sid, status, attempts, error))
+        if len(self._results) >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        results, self._results = self._results, []
+        self.store.record(self.run_id, results)
+
+    async def _produce(self, queue):
+        loop = asyncio.get_running_loop()
+        grid = await loop.run_in_executor(None, DayGrid, self.day)
+        after, queued = "", 0
+        while (self.limit is None or queued < self.limit) and not self.stopping:
+            size = self.page if self.limit is None else min(self.page, self.limit - queued)
+            rows = self.store.pending_page(self.run_id, after, size)
+            if not rows:
+                break
+            after = rows[-1][0]
+            for msg in await loop.run_in_executor(None, compose_page, grid, rows, self.top):
+                if self.stopping:
+                    break
+                if msg.error:
+                    self._record(msg.subscriber_id, "dead", 0, msg.error)
+                else:
+                    await queue.put(msg)
+                queued += 1
+
+    async def _deliver(self, msg):
+        key = f"{self.run_id}:{msg.subscriber_id}"
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            await self.limiter.acquire(msg.destination)
+            try:
+                await self.transport.send(msg.destination, msg.text, key)
+                return "sent", attempt, None
+            except PermanentError as e:
+                return "dead", attempt, str(e)
+            except TransientError as e:
+                error = e
+            except (OSError, asyncio.TimeoutError) as e:
+                error = TransientError(f"{type(e).__name__}: {e}")
+            if attempt == self.max_attempts or self.stopping:
+                break
+            self.counts["retries"] += 1
+            if error.retry_after is not None:
+                # ההמתנה עוברת דרך המגביל, כך שגם הודעות אחרות (לאותו יעד / לכולם) מחכות
+                if error.global_:
+                    self.limiter.pause(error.retry_after)
+                else:
+                    self.limiter.delay(msg.destination, error.retry_after)
+            else:
+                backoff = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2 ** (attempt - 1))
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                if self.stopping:
+                    break
+        return "failed", attempt, str(error)
+
+    async def _consume(self, queue):
+        while True:
+            msg = await queue.get()
+            if msg is None:
+                return
+            if self.stopping:
+                continue   # לא נשלח – נשאר לא מסומן וייצא בהרצה הבאה
+            status, attempts, error = await self._deliver(msg)
+            self._record(msg.subscriber_id, status, attempts, error)
+
+    async def _progress(self, started):
+        while True:
+            await asyncio.sleep(PROGRESS_EVERY_SEC)
+            done = self.counts["sent"] + self.counts["failed"] + self.counts["dead"]
+            elapsed = time.monotonic() - started
+            print(f"[{self.run_id}] {done} done ({self.counts}) {done / elapsed:.1f}/s",
+                  file=self.log, flush=True)
+
+    async def run(self):
+        started = time.monotonic()
+        queue = asyncio.Queue(maxsize=4 * self.concurrency)
+        consumers = [asyncio.create_task(self._consume(queue)) for _ in range(self.concurrency)]
+        progress = asyncio.create_task(self._progress(started)) if self.log else None
+        try:
+            await self._produce(queue)
+            for _ in consumers:
+                await queue.put(None)
+            await asyncio.gather(*consumers)
+        finally:
+            for t in consumers + ([progress] if progress else []):
+                t.cancel()
+            self.flush()   # גם בעצירה באמצע – מה שכבר נשלח לא יישלח שוב בהמשך
+            await self.transport.close()
+        elapsed = time.monotonic() - started
+        done = self.counts["sent"] + self.counts["failed"] + self.counts["dead"]
+        return {"run_id": self.run_id, "date": self.day.isoformat(), **self.counts, "stopped": self.stopping,
+                "seconds": round(elapsed, 2), "per_sec": round(done / elapsed, 1) if elapsed else None}
+
+
+async def _run_until_signal(push):
+    """SIGINT / SIGTERM ראשון – עצירה מסודרת; שני – ביטול מיידי (ההתקדמות עדיין נרשמת)."""
+    task = asyncio.create_task(push.run())
+    loop = asyncio.get_running_loop()
+
+    def on_signal():
+        if push.stopping:
+            task.cancel()
+        else:
+            push.stop()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+        except (NotImplementedError, RuntimeError):
+            pass   # Windows: Ctrl+C מבטל ישירות
+    return await task
+
+
+# ========= CLI =========
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Daily lucky-hours push bot")
+    parser.add_argument("--db", default=None, help="Subscribers / progress SQLite file (default: BOT_DB)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("subscribers", help="Manage subscribers")
+    ssub = s.add_subparsers(dest="action", required=True)
+    imp = ssub.add_parser("import", help="Import JSONL (destination, birth_date, birth_time, lat, lon, [tz, lang, id])")
+    imp.add_argument("file", help="JSONL file, or - for stdin")
+    add = ssub.add_parser("add", help="Add or update one subscriber")
+    add.add_argument("--destination", required=True, help="Chat id / address for the transport")
+    add.add_argument("--id", default=None, help="Subscriber id (default: destination)")
+    add.add_argument("--birth-date", required=True, help="YYYY-MM-DD")
+    add.add_argument("--birth-time", required=True, help="HH:MM")
+    add.add_argument("--lat", required=True, type=float)
+    add.add_argument("--lon", required=True, type=float)
+    add.add_argument("--tz", default=None, help="TZID (Asia/Jerusalem) or offset; default: guessed from lat/lon")
+    add.add_argument("--lang", default="he", choices=["he", "en"])
+    rm = ssub.add_parser("remove", help="Remove a subscriber")
+    rm.add_argument("id")
+    ssub.add_parser("count", help="Number of subscribers")
+
+    r = sub.add_parser("run", help="Compute and send today's messages (resumes an interrupted run)")
+    r.add_argument("--date", default=None, help="YYYY-MM-DD (default: today UTC)")
+    r.add_argument("--run-id", default=None, help="Progress key (default: daily-<date>)")
+    r.add_argument("--transport", choices=["telegram", "webhook", "stdout"], default="telegram")
+    r.add_argument("--api-base", default=None, help="Telegram API base URL (e.g. a local stand-in)")
+    r.add_argument("--webhook-url", default=None)
+    r.add_argument("--rate", type=float, default=BOT_RATE, help="Messages per second overall (0 = unlimited)")
+    r.add_argument("--per-destination", type=float, default=BOT_DEST_INTERVAL,
+                   help="Seconds between two messages to the same destination")
+    r.add_argument("--concurrency", type=int, default=BOT_CONCURRENCY)
+    r.add_argument("--max-attempts", type=int, default=BOT_MAX_ATTEMPTS)
+    r.add_argument("--limit", type=int, default=None, help="Send to at most N pending subscribers")
+    r.add_argument("--restart", action="store_true", help="Forget the progress of this run and send to everyone")
+
+    st = sub.add_parser("status", help="Progress of a run")
+    st.add_argument("--date", default=None)
+    st.add_argument("--run-id", default=None)
+    args = parser.parse_args(argv)
+
+    store = SubscriberStore(args.db)
+    if args.cmd == "subscribers":
+        if args.action == "import":
+            f = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+            with f:
+                added, errors = import_subscribers(store, f)
+            print(json.dumps({"added": added, "errors": errors[:20], "error_count": len(errors)},
+                             ensure_ascii=False))
+        elif args.action == "add":
+            tzid, natal = natal_for({"birth_date": args.birth_date, "birth_time": args.birth_time,
+                                     "lat": args.lat, "lon": args.lon, "tz": args.tz})
+            store.upsert_many([(args.id or args.destination, args.destination, args.lang, tzid, natal)])
+            print(json.dumps({"id": args.id or args.destination, "tzid": tzid}))
+        elif args.action == "remove":
+            print(json.dumps({"removed": store.remove(args.id)}))
+        else:
+            print(json.dumps({"subscribers": store.count()}))
+        return
+
+    day = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else datetime.now(timezone.utc).date()
+    run_id = args.run_id or f"daily-{day.isoformat()}"
+    if args.cmd == "status":
+        print(json.dumps(store.run_status(run_id)))
+        return
+
+    if args.restart:
+        store.reset_run(run_id)
+    push = PushRun(store, make_transport(args.transport, args.api_base, args.webhook_url), day, run_id,
+                   rate=args.rate, per_destination=args.per_destination, concurrency=args.concurrency,
+                   max_attempts=args.max_attempts, limit=args.limit)
+    try:
+        summary = asyncio.run(_run_until_signal(push))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print(json.dumps({"interrupted": True, **store.run_status(run_id)}), flush=True)
+        sys.exit(130)
+    print(json.dumps({**summary, "remaining": store.run_status(run_id)["remaining"]}), flush=True)
+    if summary["stopped"]:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
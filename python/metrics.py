@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py
+מדידות זמן לכל בקשה + היסטוגרמות בפורמט Prometheus (בלי ספרייה חיצונית).
+
+שני חלקים:
+- איסוף שלבים (בכל תהליך, גם ב-workers של compute_pool): stage("tz") / count("charts")
+  מוסיפים לאוסף הנוכחי (contextvar). בלי אוסף פעיל – לא עושים כלום, כך שה-CLI לא משלם.
+  compute_pool אוסף לכל משימה ומחזיר את המדידות יחד עם התוצאה.
+- רישום מצטבר (בתהליך השרת): Histogram / Counter, ו-render() לטקסט של /metrics.
+
+שלבים: queue (המתנה בתור), engine (זמן המשימה כולו), tz (חיפושי אזור זמן / offset),
+aspects (סריקת היבטים ופתרון חלונות), serialize (קידוד התשובה); ספירות: charts,
+transit_cache_hits / transit_cache_misses.
+"""
+
+import math
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("astro_timings", default=None)
+
+
+# ========= איסוף שלבים =========
+
+class Timings:
+    def __init__(self):
+        self.ms = {}
+        self.counts = {}
+
+    def add(self, stage, ms):
+        self.ms[stage] = self.ms.get(stage, 0.0) + ms
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, data):
+        """data: as_dict() של אוסף אחר (למשל ממשימה שרצה ב-worker)."""
+        if not data:
+            return
+        for k, v in data.get("ms", {}).items():
+            self.add(k, v)
+        for k, v in data.get("counts", {}).items():
+            self.count(k, v)
+
+    def as_dict(self):
+        return {"ms": dict(self.ms), "counts": dict(self.counts)}
+
+
+def begin():
+    """אוסף חדש להקשר הנוכחי. מחזיר token ל-end()."""
+    return _current.set(Timings())
+
+
+def end(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def collect():
+    token = begin()
+    try:
+        yield _current.get()
+    finally:
+        end(token)
+
+
+@contextmanager
+def stage(name):
+    t = _current.get()
+    if t is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.add(name, (time.perf_counter() - t0) * 1000.0)
+
+
+def timed(name):
+    """דקורטור: כל קריאה לפונקציה נספרת בשלב name."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name, n=1):
+    t = _current.get()
+    if t is not None:
+        t.count(name, n)
+
+
+def merge(data):
+    t = _current.get()
+    if t is not None:
+        t.merge(data)
+
+
+def server_timing(t, total_ms=None):
+    """ערך לכותרת Server-Timing: 'engine;dur=12.3, tz;dur=0.4, charts;desc="14", total;dur=20.1'."""
+    parts = [f"{k};dur={v:.1f}" for k, v in t.ms.items()]
+    parts += [f'{k};desc="{v}"' for k, v in t.counts.items()]
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+# ========= רישום מצטבר (Prometheus) =========
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _fmt(v):
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name, help_, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, v in sorted(self._values.items()):
+                out.append(f"{self.name}{_labels(self.labelnames, labels)} {_fmt(v)}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name, help_, labelnames=(), buckets=SECONDS_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_, tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}   # labels -> [counts לפי bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, s in sorted(self._series.items()):
+                cum = 0
+                for i, b in enumerate(self.buckets):
+                    cum += s[i]
+                    out.append(f"{self.name}_bucket{_labels(names, labels + (_fmt(b),))} {cum}")
+                out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(s[-2])}")
+                out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {s[-1]}")
+        return out
+
+
+REQUEST_SECONDS = Histogram("astro_request_duration_seconds", "HTTP request latency",
+                            ("route", "method", "status"))
+REQUEST_STAGE_SECONDS = Histogram("astro_request_stage_seconds",
+                                  "Time per stage within one request (Server-Timing)", ("stage",))
+TASK_STAGE_SECONDS = Histogram("astro_task_stage_seconds", "Time per stage within one compute task", ("stage",))
+TASK_CHARTS = Histogram("astro_task_charts", "Charts built per compute task", buckets=COUNT_BUCKETS)
+TASK_COUNTS = Counter("astro_task_events_total", "Events counted inside compute tasks", ("event",))
+BUSY_SECONDS = Counter("astro_compute_busy_seconds_total", "Engine time summed over all compute tasks")
+
+
+def observe_task(data):
+    """מדידות של משימה אחת (as_dict) – מצטבר להיסטוגרמות של המשימות."""
+    if not data:
+        return
+    for k, v in data.get("ms", {}).items():
+        TASK_STAGE_SECONDS.observe(v / 1000.0, k)
+    counts = data.get("counts", {})
+    TASK_CHARTS.observe(counts.get("charts", 0))
+    for k, v in counts.items():
+        TASK_COUNTS.inc(v, k)
+    BUSY_SECONDS.inc(data.get("ms", {}).get("engine", 0.0) / 1000.0)
+
+
+def observe_request(route, method, status, total_ms, t):
+    REQUEST_SECONDS.observe(total_ms / 1000.0, route, method, str(status))
+    if t is not None:
+        for k, v in t.ms.items():
+            REQUEST_STAGE_SECONDS.observe(v / 1000.0, k)
+
+
+def sample(name, help_, value, kind="gauge"):
+    """ערך בודד בלי labels שמחושב ברגע ה-scrape (תור, מטמון, workers)."""
+    return [f"# HELP {name} {help_}", f"# TYPE {name} {kind}", f"{name} {_fmt(value)}"]
+
+
+def render(extra=()):
+    lines = []
+    for m in (REQUEST_SECONDS, REQUEST_STAGE_SECONDS, TASK_STAGE_SECONDS, TASK_CHARTS, TASK_COUNTS, BUSY_SECONDS):
+        lines += m.render()
+    for block in extra:
+        lines += block
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+payload_codec.py
+קידודי תשובה לשרת: JSON (ברירת מחדל), MessagePack או CBOR, ודחיסת gzip / brotli.
+
+התחזית חוזרת על אותן תוויות (כוכבים עם אימוג'י, שמות היבטים, מזלות) עשרות פעמים,
+לכן בקידודים הבינאריים מחרוזות שמופיעות יותר מפעם אחת נשמרות פעם אחת בטבלה:
+- MessagePack: [strings, data] – כל מחרוזת מהטבלה מוחלפת ב-data ב-ExtType(1, אינדקס)
+  (אינדקס = מספר שלם big-endian באורך מינימלי). decode() כאן מחזיר את המבנה המקורי.
+- CBOR: stringref הסטנדרטי (tags 256/25) – כל מפענח CBOR תקני מחזיר את המבנה המקורי.
+
+msgpack / cbor2 / brotli הם אופציונליים: בלי הספרייה הפורמט פשוט לא מוצע.
+"""
+
+import gzip
+import json
+from collections import Counter
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - אופציונלי
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover - אופציונלי
+    cbor2 = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - אופציונלי
+    brotli = None
+
+JSON_MIME = "application/json; charset=utf-8"
+MIMETYPES = {
+    "json": JSON_MIME,
+    "msgpack": "application/msgpack",
+    "cbor": "application/cbor",
+}
+# שמות נוספים שלקוחות שולחים ב-Accept
+_ACCEPT_ALIASES = {
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/cbor": "cbor",
+}
+
+INTERN_EXT = 1
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5   # איזון בין גודל לזמן (11 איטי מדי לתשובה חיה)
+
+
+def available_formats():
+    return ["json"] + (["msgpack"] if msgpack else []) + (["cbor"] if cbor2 else [])
+
+
+def available_codings():
+    return (["br"] if brotli else []) + ["gzip"]
+
+
+# ========= משא ומתן =========
+
+def negotiate_format(accept_mimetypes):
+    """
+    accept_mimetypes: werkzeug MIMEAccept (request.accept_mimetypes).
+    JSON אלא אם הלקוח ביקש במפורש פורמט בינארי זמין (*/* לא נחשב).
+    """
+    best, best_q = "json", 0.0
+    for mime, q in accept_mimetypes:
+        fmt = _ACCEPT_ALIASES.get(mime.lower())
+        if fmt and q > best_q and fmt in available_formats():
+            best, best_q = fmt, q
+    return best
+
+
+def negotiate_coding(accept_encodings):
+    """br אם זמין ומבוקש, אחרת gzip אם מבוקש, אחרת None."""
+    for coding in available_codings():
+        if accept_encodings[coding] > 0:
+            return coding
+    return None
+
+
+# ========= טבלת מחרוזות =========
+
+def _count_strings(obj, counts):
+    if isinstance(obj, str):
+        counts[obj] += 1
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            _count_strings(k, counts)
+            _count_strings(v, counts)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            _count_strings(v, counts)
+
+
+def intern_table(obj, min_count=2, min_len=2):
+    """מחרוזות שחוזרות (לפחות min_count פעמים), לפי מספר ההופעות – השכיחות מקבלות אינדקס קצר."""
+    counts = Counter()
+    _count_strings(obj, counts)
+    return [s for s, n in counts.most_common() if n >= min_count and len(s) >= min_len]
+
+
+def _index_bytes(i):
+    return i.to_bytes(max(1, (i.bit_length() + 7) // 8), "big")
+
+
+def _replace(obj, refs):
+    if isinstance(obj, str):
+        return refs.get(obj, obj)
+    if isinstance(obj, dict):
+        return {_replace(k, refs): _replace(v, refs) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_replace(v, refs) for v in obj]
+    return obj
+
+
+# ========= קידוד / פענוח =========
+
+def encode(obj, fmt="json"):
+    if fmt == "json":
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    if fmt == "msgpack":
+        table = intern_table(obj)
+        refs = {s: msgpack.ExtType(INTERN_EXT, _index_bytes(i)) for i, s in enumerate(table)}
+        return msgpack.packb([table, _replace(obj, refs)], use_bin_type=True)
+    if fmt == "cbor":
+        return cbor2.dumps(obj, string_referencing=True)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def decode(body, fmt="json"):
+    if fmt == "json":
+        return json.loads(body)
+    if fmt == "msgpack":
+        table = []
+
+        def ext_hook(code, data):
+            if code == INTERN_EXT:
+                return table[int.from_bytes(data, "big")]
+            return msgpack.ExtType(code, data)
+
+        unpacker = msgpack.Unpacker(raw=False, ext_hook=ext_hook, strict_map_key=False)
+        unpacker.feed(body)
+        unpacker.read_array_header()
+        table.extend(unpacker.unpack())   # הטבלה לפני data – ext_hook כבר רואה אותה
+        return unpacker.unpack()
+    if fmt == "cbor":
+        return cbor2.loads(body)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def compress(body, coding):
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def decompress(body, coding):
+    if coding == "br":
+        return brotli.decompress(body)
+    if coding == "gzip":
+        return gzip.decompress(body)
+    return body
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+positions.py
+"צילום מצב" קל של מפה: מיקום/מהירות/נסיגה לכל כוכב + ASC/MC + קוספים.
+
+ChartSnapshot מתנהג כמו flatlib Chart בכל מה שהמנועים שלנו צריכים
+(chart.get(ID).lon / .sign / .lonspeed / .isRetrograde()), כך שאפשר
+להעביר אותו לפונקציות הקיימות במקום מפה שנבנית מחדש – וגם לשמור אותו כ-JSON.
+
+ספק מיקומים רזה (lean_chart / body_positions / angles_at): קורא ל-swisseph ישירות –
+רק האובייקטים שביקשו (lon + מהירות), ASC/MC רק כשצריך וקוספים רק כשמבקשים,
+בלי אובייקטי flatlib, רשימות בתים ו-DESC/IC. אותן קריאות swisseph כמו flatlib,
+כך שהמספרים זהים. body_positions / positions_many ממלאים מערכים שהקורא יכול למחזר.
+"""
+
+import numpy as np
+import swisseph
+
+from flatlib import const
+from flatlib.ephem import swe as flat_swe
+
+# אותו סף כמו Object.movement() של flatlib
+STATIONARY_SPEED = 0.0003
+
+
+class BodyPos:
+    __slots__ = ("id", "lon", "lonspeed")
+
+    def __init__(self, id, lon, lonspeed=0.0):
+        self.id = id
+        self.lon = float(lon) % 360.0
+        self.lonspeed = float(lonspeed)
+
+    @property
+    def sign(self):
+        return const.LIST_SIGNS[int(self.lon / 30.0) % 12]
+
+    @property
+    def signlon(self):
+        return self.lon % 30.0
+
+    def isRetrograde(self):
+        return abs(self.lonspeed) >= STATIONARY_SPEED and self.lonspeed < 0
+
+    def isStationary(self):
+        return abs(self.lonspeed) < STATIONARY_SPEED
+
+
+class _CuspList:
+    """chart.houses.get(i) – כמו ב-flatlib, אבל על מילון {"1": lon, ...}."""
+    def __init__(self, cusps):
+        self._cusps = cusps or {}
+
+    def get(self, i):
+        return BodyPos(f"House{i}", self._cusps[str(i)])
+
+
+class ChartSnapshot:
+    def __init__(self, bodies, angles=None, houses=None, fortune=None):
+        self.bodies = bodies                    # {ID: BodyPos}
+        self.angles = angles or {}              # {const.ASC: lon, const.MC: lon}
+        self.houses_raw = houses or {}          # {"1": lon, ... "12": lon}
+        self.houses = _CuspList(self.houses_raw)
+        self.fortune = fortune                  # Part of Fortune מחושב מראש (אם יש)
+
+    def get(self, ID):
+        if ID in self.bodies:
+            return self.bodies[ID]
+        if ID in self.angles:
+            return BodyPos(ID, self.angles[ID])
+        raise KeyError(ID)
+
+    # ---- המרות ----
+    @classmethod
+    def from_chart(cls, chart, ids, houses=None, fortune=None):
+        bodies = {}
+        for p in ids:
+            obj = chart.get(p)
+            bodies[p] = BodyPos(p, obj.lon, getattr(obj, "lonspeed", 0.0))
+        angles = {}
+        for a in (const.ASC, const.MC):
+            try:
+                angles[a] = float(chart.get(a).lon)
+            except Exception:
+                pass
+        return cls(bodies, angles, houses, fortune)
+
+    def to_dict(self):
+        return {
+            "bodies": {p: [b.lon, b.lonspeed] for p, b in self.bodies.items()},
+            "angles": self.angles,
+            "houses": self.houses_raw,
+            "fortune": self.fortune,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        bodies = {p: BodyPos(p, v[0], v[1]) for p, v in (d.get("bodies") or {}).items()}
+        return cls(bodies, d.get("angles"), d.get("houses"), d.get("fortune"))
+
+
+# ========= ספק מיקומים רזה =========
+
+def body_positions(jd, ids, out=None):
+    """[len(ids), 2] של (lon, lonspeed) ברגע jd. out: מערך קיים למילוי (בלי הקצאה)."""
+    if out is None:
+        out = np.empty((len(ids), 2))
+    for i, p in enumerate(ids):
+        res, _ = swisseph.calc_ut(jd, flat_swe.SWE_OBJECTS[p])
+        out[i, 0] = res[0]
+        out[i, 1] = res[3]
+    return out
+
+
+def positions_many(jds, ids, out=None):
+    """[len(jds), len(ids), 2] – body_positions לכל רגע, לתוך out אם ניתן."""
+    if out is None:
+        out = np.empty((len(jds), len(ids), 2))
+    for r, jd in enumerate(jds):
+        body_positions(float(jd), ids, out[r])
+    return out
+
+
+def angles_at(jd, lat, lon, hsys=const.HOUSES_DEFAULT, houses=False):
+    """({ASC: lon, MC: lon}, {"1": lon, ...} או None). houses=False – בלי לבנות את הקוספים."""
+    cusps, ascmc = swisseph.houses(jd, lat, lon, flat_swe.SWE_HOUSESYS[hsys])
+    cusp_map = {str(i + 1): cusps[i] for i in range(12)} if houses else None
+    return {const.ASC: ascmc[0], const.MC: ascmc[1]}, cusp_map
+
+
+def lean_chart(date, pos, ids, angles=True, houses=False, hsys=const.HOUSES_DEFAULT):
+    """
+    תחליף רזה ל-Chart(date, pos, IDs=ids): ChartSnapshot עם ids בלבד,
+    ASC/MC רק אם angles, קוספים רק אם houses. date: flatlib Datetime, pos: GeoPos.
+    """
+    jd = date.jd
+    arr = body_positions(jd, ids)
+    bodies = {p: BodyPos(p, arr[i, 0], arr[i, 1]) for i, p in enumerate(ids)}
+    angle_lons, cusps = None, None
+    if angles or houses:
+        angle_lons, cusps = angles_at(jd, pos.lat, pos.lon, hsys, houses=houses)
+    return ChartSnapshot(bodies, angle_lons, cusps)
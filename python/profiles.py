@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+profiles.py
+רישום פרופילי לידה: נתוני הלידה של משתמש לא משתנים, אז מחשבים את מפת הלידה
+(מיקומים, נסיגות, ASC/MC, קוספים, Part of Fortune) פעם אחת ושומרים.
+
+- אחסון: SQLite מקומי (PROFILE_DB, ברירת מחדל python/data/profiles.sqlite3)
+- פרופילים "חמים" מוגשים מ-LRU בזיכרון (PROFILE_LRU, ברירת מחדל 1024 פרופילים)
+- profile_id דטרמיניסטי (hash של הקלט המנורמל) – אותו קלט מחזיר אותו id
+"""
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from flatlib.chart import Chart
+from flatlib.datetime import Datetime
+
+import astrology_forecast
+import astro_calc_api
+from positions import ChartSnapshot
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_DB = HERE / "data" / "profiles.sqlite3"
+
+_OFFSET_RE = re.compile(r"^[+-]\d{2}:\d{2}$")
+
+
+class ProfileNotFound(KeyError):
+    pass
+
+
+# ========= חישוב נתוני הלידה =========
+
+def _norm_date(s):
+    s = (s or "").strip().replace("/", "-")
+    datetime.strptime(s, "%Y-%m-%d")  # ValueError אם לא תקין
+    return s
+
+
+def resolve_tz(tz, lat, lon, birth_local):
+    """
+    tz יכול להיות TZID (Asia/Jerusalem), offset (+02:00) או ריק (ניחוש לפי lat/lon).
+    מחזיר (tzid, offset_at_birth).
+    """
+    tz = (tz or "").strip()
+    if _OFFSET_RE.match(tz):
+        return None, tz
+    tzid = tz if "/" in tz else (astrology_forecast.guess_tzid(lat, lon) or "Etc/UTC")
+    return tzid, astrology_forecast.tz_offset_str(birth_local, tzid)
+
+
+def build_natal_profile(birth_date, birth_time, lat, lon, tz=None, city=""):
+    """מחשב את כל מה שנגזר מהלידה. מחזיר dict שניתן לשמור כ-JSON."""
+    birth_date = _norm_date(birth_date)
+    birth_time = (birth_time or "").strip()
+    lat = float(lat)
+    lon = float(lon)
+    birth_local = datetime.strptime(f"{birth_date} {birth_time}", "%Y-%m-%d %H:%M")
+
+    tzid, offset = resolve_tz(tz, lat, lon, birth_local)
+    location = astrology_forecast.build_location(lat, lon)
+    chart = Chart(
+        Datetime(birth_local.strftime('%Y/%m/%d'), birth_local.strftime('%H:%M'), offset),
+        location, IDs=astrology_forecast.OBJECTS
+    )
+    natal = ChartSnapshot.from_chart(
+        chart, astrology_forecast.OBJECTS,
+        houses=astrology_forecast.houses_raw(chart),
+        fortune=astro_calc_api.calc_part_of_fortune(chart),
+    )
+    return {
+        "birth_date": birth_date,
+        "birth_time": birth_time,
+        "lat": lat,
+        "lon": lon,
+        "city": city or "",
+        "tzid": tzid,
+        "tz_offset": offset,
+        "natal": natal.to_dict(),
+    }
+
+
+def profile_id_for(birth_date, birth_time, lat, lon, tz, city=""):
+    key = json.dumps([
+        _norm_date(birth_date), (birth_time or "").strip(),
+        round(float(lat), 6), round(float(lon), 6), (tz or "").strip(), city or ""
+    ], ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+# ========= אחסון =========
+
+class ProfileStore:
+    def __init__(self, path=None, lru_size=None):
+        self.path = Path(path or os.environ.get("PROFILE_DB") or DEFAULT_DB)
+        self.lru_size = int(lru_size or os.environ.get("PROFILE_LRU", "1024"))
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        # חיבור נפתח בעצלות: תחת gunicorn --preload אסור לשתף חיבור SQLite בין fork-ים
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                " id TEXT PRIMARY KEY, data TEXT NOT NULL, created_at TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, pid, profile):
+        self._lru[pid] = profile
+        self._lru.move_to_end(pid)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def create(self, birth_date, birth_time, lat, lon, tz=None, city=""):
+        """מחשב ושומר (אם עוד לא קיים). מחזיר את הפרופיל כולל "id"."""
+        pid = profile_id_for(birth_date, birth_time, lat, lon, tz, city)
+        try:
+            return self.get(pid)
+        except ProfileNotFound:
+            pass
+
+        profile = build_natal_profile(birth_date, birth_time, lat, lon, tz=tz, city=city)
+        profile["id"] = pid
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO profiles (id, data, created_at) VALUES (?, ?, ?)",
+                (pid, json.dumps(profile, ensure_ascii=False), datetime.now(timezone.utc).isoformat())
+            )
+            db.commit()
+            self._remember(pid, profile)
+        return profile
+
+    def get(self, pid):
+        with self._lock:
+            hit = self._lru.get(pid)
+            if hit is not None:
+                self._lru.move_to_end(pid)
+                return hit
+            row = self._db().execute("SELECT data FROM profiles WHERE id = ?", (pid,)).fetchone()
+            if row is None:
+                raise ProfileNotFound(pid)
+            profile = json.loads(row[0])
+            self._remember(pid, profile)
+            return profile
+
+    def natal(self, pid):
+        """ChartSnapshot של הלידה – מוכן להעברה ישירה למנועים."""
+        return ChartSnapshot.from_dict(self.get(pid)["natal"])
+
+    def stats(self):
+        with self._lock:
+            return {"path": str(self.path), "lru_entries": len(self._lru), "lru_size": self.lru_size}
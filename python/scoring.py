@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+scoring.py
+מנוע ניקוד אחד לכל מודולי התחזית (במקום משקלים ומסננים נפרדים בכל מודול).
+
+כלל (Rule) מגדיר אילו זוגות (לידה, טרנזיט) נספרים, משקל לכל (לידה, טרנזיט, זווית),
+אילו זוגות מוגבלים בתקרה לכל רגע (אוראנוס) וההמרה לאחוזים.
+compile_rules() מקמפל כלל מול רשימות אובייקטים, זוויות ואורבים קונקרטיים לטבלאות NumPy
+(weights[P, N, A], counted[P, N], capped[P, N]) – פעם אחת לכל צירוף (lru_cache).
+ההערכה עצמה וקטורית ב-aspect_engine: טבלת חיפוש לזוויות + gather למשקלים, במנות של
+CHUNK_ROWS רגעים, כך שגם מיליוני תאי (זמן, זוג) רצים בזיכרון קבוע.
+
+כללים:
+  pro    – astro_calc_api: משקל לפי benefics; אוראנוס רק 120°, ועד MAX_URANUS_PER_BLOCK לרגע
+  blocks – astrology_forecast: רק כוכב לידה מ-MONEY_NATAL; 2 להרמוני, 1 לריבוע; אחוז = 10×, עד 100
+  count  – financial_forecast: כל היבט = 1; score_est = 50 + 6×, בתחום 0..100
+
+הקבוצות מוגדרות לפי מזהי flatlib – אף מודול לא מסנן לפי תוויות מתורגמות.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from flatlib import const
+
+import aspect_engine
+
+# ========= קבוצות אובייקטים =========
+MONEY_GROUP = [const.VENUS, const.JUPITER, const.MOON, const.PLUTO, 'FORTUNE', const.URANUS]   # PRO
+MONEY_OBJECTS = [const.VENUS, const.JUPITER, const.MOON, const.PLUTO, 'FORTUNE']             # financial
+MONEY_NATAL = (const.VENUS, const.JUPITER, const.MOON)    # בלוקי מזל: כוכבי הלידה שנחשבים "כסף"
+BENEFICS = {const.VENUS, const.JUPITER, 'FORTUNE'}
+MAX_URANUS_PER_BLOCK = 3  # תקרת תרומת אוראנוס לכל חלון
+
+CHUNK_ROWS = 65536   # כמה רגעים מוערכים בכל מנה
+
+# pairs(natal, transit) -> bool; weight(natal, transit, angle) -> float; capped(natal, transit) -> bool
+Rule = namedtuple("Rule", ["pairs", "weight", "capped", "cap", "base", "scale", "lo", "hi"])
+
+
+# ========= כללים =========
+def _all_pairs(natal, transit):
+    return True
+
+
+def _involves_uranus(natal, transit):
+    return natal == const.URANUS or transit == const.URANUS
+
+
+def _pro_weight(natal, transit, h_angle):
+    benefic_involved = (natal in BENEFICS or transit in BENEFICS)
+    # אוראנוס: רק 120°
+    if _involves_uranus(natal, transit):
+        return 2.0 if h_angle == 120 else 0.0
+    if h_angle == 120:
+        return 2.0 if benefic_involved else 1.5
+    if h_angle == 60:
+        return 1.0 if benefic_involved else 0.5
+    if h_angle in (0, 180):
+        return 0.5 if benefic_involved else 0.0
+    return 0.0
+
+
+def _money_natal(natal, transit):
+    return natal in MONEY_NATAL
+
+
+def _blocks_weight(natal, transit, h_angle):
+    if h_angle in (0, 60, 120, 180):
+        return 2.0
+    return 1.0 if h_angle == 90 else 0.0
+
+
+def _count_weight(natal, transit, h_angle):
+    return 1.0
+
+
+RULES = {
+    "pro":    Rule(_all_pairs, _pro_weight, _involves_uranus, MAX_URANUS_PER_BLOCK, 0.0, 1.0, None, None),
+    "blocks": Rule(_money_natal, _blocks_weight, None, None, 0.0, 10.0, None, 100.0),
+    "count":  Rule(_all_pairs, _count_weight, None, None, 50.0, 6.0, 0.0, 100.0),
+}
+
+
+# ========= קומפילציה והערכה =========
+class CompiledRules:
+    def __init__(self, rule, natal_objects, transit_objects, angles, orbs):
+        self.rule = rule
+        self.angles = tuple(float(a) for a in angles)
+        self.orbs = orbs
+        # [P, N] / [P, N, A] – טרנזיט חיצוני, לידה פנימי (כמו aspect_engine)
+        self.counted = np.array([[bool(rule.pairs(n, t)) for n in natal_objects] for t in transit_objects])
+        self.weights = np.array([
+            [[rule.weight(n, t, a) if self.counted[ti, ni] else 0.0 for a in angles]
+             for ni, n in enumerate(natal_objects)]
+            for ti, t in enumerate(transit_objects)
+        ], dtype=np.float64)
+        self.capped = None
+        if rule.capped is not None:
+            self.capped = np.array([[bool(rule.capped(n, t)) for n in natal_objects] for t in transit_objects])
+
+    def scores(self, natal_lons, transit_lons):
+        """ניקוד גולמי לכל רגע ב-transit_lons[T, P] – מערך [T]."""
+        transit_lons = np.atleast_2d(np.asarray(transit_lons, dtype=np.float64))
+        if transit_lons.shape[0] <= CHUNK_ROWS:
+            return aspect_engine.weighted_scores(natal_lons, transit_lons, self.angles, self.orbs, self.weights,
+                                                 capped=self.capped, cap=self.rule.cap)
+        return np.concatenate([
+            aspect_engine.weighted_scores(natal_lons, transit_lons[i:i + CHUNK_ROWS], self.angles, self.orbs,
+                                          self.weights, capped=self.capped, cap=self.rule.cap)
+            for i in range(0, transit_lons.shape[0], CHUNK_ROWS)
+        ])
+
+    def evaluate(self, natal_lons, transit_lons, order="tn"):
+        """(AspectHits של כל ההיבטים, ניקוד גולמי [T]) מסריקה אחת."""
+        return aspect_engine.evaluate(natal_lons, transit_lons, self.angles, self.orbs, self.weights,
+                                      capped=self.capped, cap=self.rule.cap, order=order)
+
+    def only_counted(self, hits):
+        """רק ההיבטים שהכלל סופר (למשל רק כוכבי לידה של כסף), באותו סדר."""
+        keep = self.counted[hits.tr, hits.na]
+        return aspect_engine.AspectHits(*(f[keep] for f in hits))
+
+    def percent(self, raw):
+        """base + scale × raw, בתחום [lo, hi] של הכלל."""
+        r = self.rule
+        v = r.base + r.scale * np.asarray(raw, dtype=np.float64)
+        if r.lo is not None or r.hi is not None:
+            v = np.clip(v, r.lo, r.hi)
+        return v
+
+
+@lru_cache(maxsize=64)
+def _compile(name, natal_objects, transit_objects, angles, orbs):
+    return CompiledRules(RULES[name], natal_objects, transit_objects, angles, orbs)
+
+
+def compile_rules(name, natal_objects, transit_objects, angles, orbs):
+    """
+    כלל name מקומפל מול אובייקטי הלידה / הטרנזיט (לפי הסדר של מערכי ה-longitudes),
+    זוויות ואורבים (מספר אחד או אחד לכל זווית). נשמר במטמון לכל צירוף.
+    """
+    if not np.isscalar(orbs):
+        orbs = tuple(float(o) for o in orbs)
+    else:
+        orbs = float(orbs)
+    return _compile(name, tuple(natal_objects), tuple(transit_objects), tuple(angles), orbs)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+singleflight.py
+איחוד בקשות זהות שרצות במקביל (single-flight).
+
+כשיוצאת התראת push הרבה אפליקציות מבקשות את אותו פרופיל/יום באותו רגע.
+הקורא הראשון עם מפתח מסוים ("leader") מריץ את החישוב; כל מי שמגיע עם אותו
+מפתח בזמן שהחישוב עדיין רץ מחכה לאותה תוצאה (או לאותה שגיאה) במקום לחשב שוב.
+אחרי שהחישוב מסתיים המפתח נמחק – זה לא מטמון, רק איחוד של מה שבדרך.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}   # key -> Future
+        self.calls = 0        # כל הקריאות
+        self.executions = 0   # חישובים שבאמת רצו
+        self.shared = 0       # קריאות שקיבלו תוצאה של חישוב אחר
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        מריץ fn(*args, **kwargs) פעם אחת לכל key שבדרך.
+        מחזיר (result, shared) – shared=True אם התוצאה הגיעה מחישוב של קורא אחר.
+        חריגה של החישוב נזרקת לכל הממתינים.
+        """
+        with self._lock:
+            self.calls += 1
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return fut.result(), True
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "shared": self.shared,
+                "in_flight_keys": len(self._inflight),
+                "dedup_ratio": round(self.shared / self.calls, 4) if self.calls else 0.0,
+            }
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+sky_index.py
+"אינדקס שמיים" לילי: מיקומי הטרנזיט לכל שעה עגולה ב-UTC ל-N הימים הקרובים, מחושבים מראש.
+
+מיקומי הכוכבים לא תלויים במשתמש, ורשתות השעות של המנועים (START_HOUR..END_HOUR בזמן
+מקומי) נופלות ברוב אזורי הזמן על שעות UTC עגולות. לכן פעם בלילה כותבים קובץ SQLite:
+
+- sky_hours: שורה לכל שעת UTC (utc_hour = JD×24) – longitude + מהירות לכל 10 הכוכבים,
+  דגלי נסיגה (retro_mask) ורשימת הכוכבים בנסיגה (retro, JSON).
+- tz_grid: לאזורי הזמן הנפוצים – (tzid, תאריך מקומי, שעה מקומית) -> utc_hour,
+  והתצוגה tz_sky שמחברת אותם ל-sky_hours (SELECT * FROM tz_sky WHERE tzid=? AND local_date=?).
+
+בזמן בקשה הקובץ נטען פעם אחת לזיכרון (get_index) ו-transit_cache לוקח ממנו שורות
+במקום לחשב – המנוע רק משווה את נתוני הלידה לשורות מוכנות. הערכים מחושבים בדיוק כמו
+בחישוב הרגיל (אותה קריאת swisseph באותו JD), כך שהתשובות זהות עם או בלי אינדקס.
+אחרי בנייה מחדש (קובץ חדש ב-os.replace) כל תהליך טוען אותו מחדש לפי mtime.
+
+    python sky_index.py build [--days 45] [--tzids Asia/Jerusalem,Europe/London]
+    python sky_index.py info
+
+SKY_INDEX_DB – נתיב הקובץ (ברירת מחדל python/data/sky_index.sqlite3)
+SKY_INDEX_DAYS – כמה ימים קדימה (ברירת מחדל 45)
+SKY_INDEX_TZIDS – אזורי זמן קבועים ל-tz_grid; בנוסף הנפוצים ביותר ב-PROFILE_DB (SKY_INDEX_TOP_TZ)
+SKY_INDEX_REBUILD_UTC – שעת הבנייה הלילית בתוך השרת (ברירת מחדל 2; ריק = בלי)
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from flatlib import const
+
+import timezones
+from positions import BodyPos, body_positions
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_DB = HERE / "data" / "sky_index.sqlite3"
+
+PLANETS = [
+    const.SUN, const.MOON, const.MERCURY, const.VENUS, const.MARS,
+    const.JUPITER, const.SATURN, const.URANUS, const.NEPTUNE, const.PLUTO
+]
+DEFAULT_TZIDS = ["Asia/Jerusalem", "Europe/London", "Europe/Paris", "Europe/Moscow",
+                 "America/New_York", "America/Chicago", "America/Los_Angeles", "UTC"]
+
+SKY_INDEX_DAYS = int(os.environ.get("SKY_INDEX_DAYS", "45"))
+SKY_INDEX_TOP_TZ = int(os.environ.get("SKY_INDEX_TOP_TZ", "20"))
+CHECK_EVERY_SEC = 300   # כל כמה זמן בודקים אם הקובץ הוחלף
+
+MINUTES_PER_DAY = 1440.0   # כמו transit_cache: jd = מפתח-דקה / 1440
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_JD_HOURS = 58574100  # JD של 1970-01-01 00:00 UTC (2440587.5) × 24
+
+
+def _col(p):
+    return p.lower()
+
+
+def hour_jd(utc_hour):
+    """JD של שעת UTC – אותו float בדיוק כמו transit_cache למפתח הדקה utc_hour×60."""
+    return (utc_hour * 60) / MINUTES_PER_DAY
+
+
+def utc_hour_of(dt_utc):
+    """utc_hour (JD×24) של datetime aware שנופל על שעה עגולה."""
+    return int((dt_utc - _EPOCH) // timedelta(hours=1)) + _EPOCH_JD_HOURS
+
+
+def hour_utc(utc_hour):
+    return _EPOCH + timedelta(hours=utc_hour - _EPOCH_JD_HOURS)
+
+
+# ========= בנייה =========
+
+def common_tzids(limit=SKY_INDEX_TOP_TZ):
+    """SKY_INDEX_TZIDS (או רשימת ברירת מחדל) + אזורי הזמן הנפוצים בפרופילים השמורים."""
+    env = [t.strip() for t in (os.environ.get("SKY_INDEX_TZIDS") or "").split(",") if t.strip()]
+    out = env or list(DEFAULT_TZIDS)
+    db = Path(os.environ.get("PROFILE_DB") or HERE / "data" / "profiles.sqlite3")
+    if db.exists() and limit > 0:
+        try:
+            conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+            try:
+                rows = conn.execute(
+                    "SELECT json_extract(data, '$.tzid') AS tzid, COUNT(*) AS n FROM profiles"
+                    " WHERE tzid IS NOT NULL GROUP BY tzid ORDER BY n DESC LIMIT ?", (limit,)
+                ).fetchall()
+            finally:
+                conn.close()
+            out += [t for t, _ in rows if t not in out]
+        except sqlite3.Error as e:
+            print(f"sky index: profiles ignored: {e}", file=sys.stderr)
+    return out
+
+
+def _tz_rows(tzid, first_date, days):
+    """(tzid, local_date, local_hour, utc_hour) לכל שעה מקומית עגולה שנופלת על שעת UTC עגולה."""
+    rows = []
+    for d in range(days):
+        day = first_date + timedelta(days=d)
+        for hour in range(24):
+            local = datetime(day.year, day.month, day.day, hour)
+            try:
+                off_min = timezones.offset_minutes(local, tzid)
+            except Exception:
+                continue   # זמן כפול / לא קיים (מעבר שעון) – החישוב הרגיל יטפל
+            if off_min % 60:
+                continue   # אזורים של חצי שעה – לא על שעת UTC עגולה
+            utc = (local - timedelta(minutes=off_min)).replace(tzinfo=timezone.utc)
+            rows.append((tzid, day.isoformat(), hour, utc_hour_of(utc)))
+    return rows
+
+
+def build(out_path=None, days=SKY_INDEX_DAYS, start=None, tzids=None):
+    """
+    מחשב את שעות ה-UTC מחצות של אתמול (כדי לכסות גם אזורים מערביים) ועוד days ימים,
+    וכותב לקובץ חדש שמחליף את הישן באופן אטומי.
+    """
+    out_path = Path(out_path or os.environ.get("SKY_INDEX_DB") or DEFAULT_DB)
+    start = (start or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    first_day = start.date() - timedelta(days=1)
+    first_hour = utc_hour_of(datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc))
+    n_hours = (days + 2) * 24
+    tzids = tzids or common_tzids()
+
+    cols = ", ".join(f"lon_{_col(p)} REAL, speed_{_col(p)} REAL" for p in PLANETS)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # שם זמני ייחודי באותה תיקייה – שתי בניות במקביל (cron + שרת) לא דורסות זו את הקובץ של זו
+    fd, tmp = tempfile.mkstemp(dir=out_path.parent, prefix=out_path.name + ".", suffix=".tmp")
+    os.close(fd)
+    os.chmod(tmp, 0o644)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(f"CREATE TABLE sky_hours (utc_hour INTEGER PRIMARY KEY, utc TEXT NOT NULL, {cols},"
+                     " retro_mask INTEGER NOT NULL, retro TEXT NOT NULL)")
+        conn.execute("CREATE TABLE tz_grid (tzid TEXT NOT NULL, local_date TEXT NOT NULL,"
+                     " local_hour INTEGER NOT NULL, utc_hour INTEGER NOT NULL,"
+                     " PRIMARY KEY (tzid, local_date, local_hour)) WITHOUT ROWID")
+        conn.execute("CREATE VIEW tz_sky AS SELECT g.tzid, g.local_date, g.local_hour, s.*"
+                     " FROM tz_grid g JOIN sky_hours s ON s.utc_hour = g.utc_hour")
+
+        rows = []
+        buf = np.empty((len(PLANETS), 2))
+        for h in range(first_hour, first_hour + n_hours):
+            body_positions(hour_jd(h), PLANETS, out=buf)
+            values, mask, retro = [], 0, []
+            for i, p in enumerate(PLANETS):
+                values += [float(buf[i, 0]), float(buf[i, 1])]
+                if BodyPos(p, buf[i, 0], buf[i, 1]).isRetrograde():
+                    mask |= 1 << i
+                    retro.append(p)
+            rows.append((h, hour_utc(h).isoformat(), *values, mask, json.dumps(retro)))
+        marks = ", ".join("?" * (len(PLANETS) * 2 + 4))
+        conn.executemany(f"INSERT INTO sky_hours VALUES ({marks})", rows)
+
+        grid = []
+        for tzid in tzids:
+            try:
+                grid += _tz_rows(tzid, first_day, days + 1)
+            except Exception as e:
+                print(f"sky index: tzid {tzid} skipped: {e}", file=sys.stderr)
+        conn.executemany("INSERT OR IGNORE INTO tz_grid VALUES (?, ?, ?, ?)", grid)
+
+        meta = {"built_at": datetime.now(timezone.utc).isoformat(), "first_hour": first_hour,
+                "n_hours": n_hours, "planets": PLANETS, "tzids": tzids}
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()])
+        conn.commit()
+        conn.close()
+        os.replace(tmp, out_path)
+    except BaseException:
+        conn.close()
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return {"path": str(out_path), "hours": n_hours, "tz_rows": len(grid), "tzids": len(tzids),
+            "from": rows[0][1], "to": rows[-1][1]}
+
+
+# ========= קריאה =========
+
+class SkyIndex:
+    """כל הקובץ בזיכרון: {utc_hour: {ID: BodyPos}}, נסיגות, ו-(tzid, תאריך, שעה) -> utc_hour."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.mtime = self.path.stat().st_mtime
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            self.meta = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM meta")}
+            if self.meta.get("planets") != PLANETS:
+                raise ValueError(f"Unsupported sky index: {path}")
+            cols = ", ".join(f"lon_{_col(p)}, speed_{_col(p)}" for p in PLANETS)
+            self.hours, self.retro = {}, {}
+            for row in conn.execute(f"SELECT utc_hour, {cols}, retro FROM sky_hours"):
+                h = row[0]
+                self.hours[h] = {p: BodyPos(p, row[1 + 2 * i], row[2 + 2 * i]) for i, p in enumerate(PLANETS)}
+                self.retro[h] = json.loads(row[-1])
+            self.tz = {(t, d, hr): h for t, d, hr, h in
+                       conn.execute("SELECT tzid, local_date, local_hour, utc_hour FROM tz_grid")}
+        finally:
+            conn.close()
+
+    def __len__(self):
+        return len(self.hours)
+
+    def bodies_at_minute(self, key):
+        """{ID: BodyPos} למפתח דקה של transit_cache, אם הוא שעה עגולה שבאינדקס (אחרת None)."""
+        if key % 60:
+            return None
+        return self.hours.get(key // 60)
+
+    def utc_hour(self, tzid, local_date, local_hour):
+        """utc_hour לשעה מקומית עגולה באזור נפוץ (local_date: YYYY-MM-DD), או None."""
+        return self.tz.get((tzid, local_date, local_hour))
+
+    def retro_ids(self, utc_hour):
+        return self.retro.get(utc_hour)
+
+    def stats(self):
+        return {"path": str(self.path), "hours": len(self.hours), "tz_rows": len(self.tz),
+                "built_at": self.meta.get("built_at")}
+
+
+_INDEX = None
+_INDEX_CHECKED = 0.0
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index():
+    """האינדקס של התהליך (או None אם אין קובץ). נטען מחדש אם הקובץ הוחלף."""
+    global _INDEX, _INDEX_CHECKED
+    now = time.monotonic()
+    if _INDEX_CHECKED and now - _INDEX_CHECKED < CHECK_EVERY_SEC:
+        return _INDEX
+    with _INDEX_LOCK:
+        if _INDEX_CHECKED and now - _INDEX_CHECKED < CHECK_EVERY_SEC:
+            return _INDEX
+        path = Path(os.environ.get("SKY_INDEX_DB") or DEFAULT_DB)
+        try:
+            if not path.exists():
+                _INDEX = None
+            elif _INDEX is None or _INDEX.path != path or _INDEX.mtime != path.stat().st_mtime:
+                _INDEX = SkyIndex(path)
+        except Exception as e:
+            print(f"sky index ignored: {e}", file=sys.stderr)
+            _INDEX = None
+        _INDEX_CHECKED = now
+    return _INDEX
+
+
+# ========= בנייה לילית בתוך השרת =========
+
+_scheduler = None
+
+
+def start_scheduler():
+    """
+    thread רקע שבונה את האינדקס מחדש כל לילה בשעה SKY_INDEX_REBUILD_UTC (UTC).
+    נקרא מ-when_ready של gunicorn (פעם אחת, בתהליך ה-master); לפריסה בלי gunicorn –
+    cron עם `python sky_index.py build`.
+    """
+    global _scheduler
+    hour = (os.environ.get("SKY_INDEX_REBUILD_UTC", "2") or "").strip()
+    if not hour or _scheduler is not None:
+        return None
+
+    def loop():
+        while True:
+            now = datetime.now(timezone.utc)
+            nxt = now.replace(hour=int(hour), minute=0, second=0, microsecond=0)
+            if nxt <= now:
+                nxt += timedelta(days=1)
+            time.sleep((nxt - now).total_seconds())
+            try:
+                print(f"sky index rebuilt: {build()}", file=sys.stderr)
+            except Exception as e:
+                print(f"sky index rebuild failed: {e}", file=sys.stderr)
+
+    _scheduler = threading.Thread(target=loop, name="sky-index", daemon=True)
+    _scheduler.start()
+    return _scheduler
+
+
+# ========= CLI =========
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build / inspect the precomputed sky index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Compute the next N days and replace the index file")
+    b.add_argument("--out", default=None)
+    b.add_argument("--days", type=int, default=SKY_INDEX_DAYS)
+    b.add_argument("--tzids", default=None, help="Comma-separated TZIDs for the per-timezone grid")
+    i = sub.add_parser("info", help="Print what an existing index covers")
+    i.add_argument("--path", default=None)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        tzids = [t.strip() for t in args.tzids.split(",") if t.strip()] if args.tzids else None
+        info = build(args.out, days=args.days, tzids=tzids)
+    else:
+        info = SkyIndex(args.path or os.environ.get("SKY_INDEX_DB") or DEFAULT_DB).stats()
+    print(info)
+
+
+if __name__ == "__main__":
+    main()
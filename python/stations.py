@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+stations.py
+לוח תחנות נסיגה מחושב מראש: לכל כוכב ממרקורי עד פלוטו – רגעי תחנת נסיגה (R) ותחנה ישירה (D),
+ותקופות הנסיגה עצמן, על טווח של עשרות שנים.
+
+שלב בנייה (אופליין / ב-buildCommand של Render):
+    python stations.py build [--out data/stations.json] [--from-year 1900] [--to-year 2100]
+    python stations.py info
+    python stations.py at 2026-10-18T12:00      # מי בנסיגה + התחנה הבאה של כל כוכב
+
+הבנייה דוגמת את המהירות (swisseph, FLG_SPEED) פעם ביום ומוצאת כל חציה ב-bisection
+עד שנייה אחת:
+  - תחנה = חציית מהירות 0 (R: מ-+ ל-−, D: מ-− ל-+)
+  - תקופת נסיגה = הזמן שבו המהירות < -STATIONARY_SPEED, בדיוק כמו isRetrograde() של
+    flatlib / BodyPos (סביב התחנה יש כמה שעות-ימים של "נייח" שאינו נסיגה).
+תקופת נסיגה של מרקורי (הקצרה ביותר) היא ~3 שבועות, כך שצעד של יום לא מפספס חציות.
+
+בזמן בקשה: חיפוש בינארי (searchsorted) במערכים הממוינים – "מי בנסיגה ב-T" ו"התחנה הבאה אחרי T"
+ב-O(log n), בלי לבנות מפה. מחוץ לטווח (או כשאין קובץ) – None, והקורא חוזר למפה.
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import swisseph
+
+from flatlib import const
+
+from positions import body_positions, STATIONARY_SPEED
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_PATH = HERE / "data" / "stations.json"
+
+# הסדר של PLANETS בשאר המודולים (השמש והירח לא נסוגים)
+PLANETS = [
+    const.SUN, const.MOON, const.MERCURY, const.VENUS, const.MARS,
+    const.JUPITER, const.SATURN, const.URANUS, const.NEPTUNE, const.PLUTO
+]
+STATION_PLANETS = PLANETS[2:]
+
+STEP_DAYS = 1.0
+TOL_DAYS = 1.0 / 86400.0   # שנייה אחת
+
+_J2000 = datetime(2000, 1, 1, 12, 0, tzinfo=timezone.utc)   # JD 2451545.0
+
+
+def jd_from_datetime(dt_aware):
+    return 2451545.0 + (dt_aware - _J2000).total_seconds() / 86400.0
+
+
+def datetime_from_jd(jd):
+    return datetime.fromtimestamp(_J2000.timestamp() + (jd - 2451545.0) * 86400.0, tz=timezone.utc)
+
+
+# ========= בנייה =========
+
+def _speed(pid, jd):
+    return body_positions(jd, [pid])[0, 1]
+
+
+def _crossing(pid, level, lo, hi, f_lo):
+    """bisection: הרגע ב-[lo, hi] שבו מהירות הכוכב חוצה את level (f_lo = הסימן בקצה השמאלי)."""
+    while hi - lo > TOL_DAYS:
+        mid = 0.5 * (lo + hi)
+        if (_speed(pid, mid) - level > 0) == f_lo:
+            lo = mid
+        else:
+            hi = mid
+    return 0.5 * (lo + hi)
+
+
+def build(out_path=DEFAULT_PATH, from_year=1900, to_year=2100):
+    start_jd = swisseph.julday(from_year, 1, 1, 0.0)
+    end_jd = swisseph.julday(to_year + 1, 1, 1, 0.0)
+    jds = np.arange(start_jd, end_jd + STEP_DAYS, STEP_DAYS)
+
+    # מהירויות לכל הימים, לכל הכוכבים – לתוך מערך אחד
+    speeds = np.empty((len(jds), len(STATION_PLANETS)))
+    buf = np.empty((len(STATION_PLANETS), 2))
+    for r, jd in enumerate(jds):
+        body_positions(float(jd), STATION_PLANETS, out=buf)
+        speeds[r] = buf[:, 1]
+
+    planets = {}
+    for j, pid in enumerate(STATION_PLANETS):
+        sp = speeds[:, j]
+        stations = []       # [jd, "R"/"D"]
+        for i in np.flatnonzero(np.sign(sp[:-1]) != np.sign(sp[1:])):
+            kind = "R" if sp[i] > 0 else "D"
+            stations.append([_crossing(pid, 0.0, jds[i], jds[i + 1], sp[i] > 0), kind])
+
+        retro = sp < -STATIONARY_SPEED
+        starts, ends = [], []
+        if retro[0]:
+            starts.append(float(jds[0]))
+        for i in np.flatnonzero(retro[:-1] != retro[1:]):
+            at = _crossing(pid, -STATIONARY_SPEED, jds[i], jds[i + 1], sp[i] + STATIONARY_SPEED > 0)
+            (starts if retro[i + 1] else ends).append(at)
+        if retro[-1]:
+            ends.append(float(jds[-1]))
+        planets[pid] = {"stations": stations, "retro_start": starts, "retro_end": ends}
+
+    data = {"version": 1, "start_jd": float(jds[0]), "end_jd": float(jds[-1]),
+            "stationary_speed": STATIONARY_SPEED, "planets": planets}
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, out_path)
+    return {"path": str(out_path), "from": datetime_from_jd(jds[0]).isoformat(),
+            "to": datetime_from_jd(jds[-1]).isoformat(),
+            "stations": sum(len(p["stations"]) for p in planets.values())}
+
+
+# ========= קריאה =========
+
+class StationCalendar:
+    def __init__(self, data):
+        self.start_jd = data["start_jd"]
+        self.end_jd = data["end_jd"]
+        self._station_jd, self._station_kind = {}, {}
+        self._retro_start, self._retro_end = {}, {}
+        for pid, p in data["planets"].items():
+            self._station_jd[pid] = np.array([s[0] for s in p["stations"]], dtype=np.float64)
+            self._station_kind[pid] = [s[1] for s in p["stations"]]
+            self._retro_start[pid] = np.array(p["retro_start"], dtype=np.float64)
+            self._retro_end[pid] = np.array(p["retro_end"], dtype=np.float64)
+
+    @classmethod
+    def open(cls, path=DEFAULT_PATH):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("version") != 1 or data.get("stationary_speed") != STATIONARY_SPEED:
+            raise ValueError(f"Unsupported station calendar: {path}")
+        return cls(data)
+
+    def covers(self, jd):
+        return self.start_jd <= jd <= self.end_jd
+
+    def is_retrograde(self, pid, jd):
+        starts = self._retro_start.get(pid)
+        if starts is None:
+            return False
+        i = int(np.searchsorted(starts, jd, side="right")) - 1
+        return i >= 0 and jd < self._retro_end[pid][i]
+
+    def retro_at(self, jd):
+        """הכוכבים בנסיגה ברגע jd, לפי סדר PLANETS."""
+        return [p for p in STATION_PLANETS if self.is_retrograde(p, jd)]
+
+    def next_station(self, pid, jd):
+        """(jd, "R"/"D") של התחנה הראשונה אחרי jd, או None."""
+        arr = self._station_jd[pid]
+        i = int(np.searchsorted(arr, jd, side="right"))
+        return (float(arr[i]), self._station_kind[pid][i]) if i < len(arr) else None
+
+    def stations_between(self, jd0, jd1):
+        """[(jd, pid, kind)] בטווח [jd0, jd1), ממוין לפי זמן."""
+        out = []
+        for pid in STATION_PLANETS:
+            arr = self._station_jd[pid]
+            i0, i1 = np.searchsorted(arr, [jd0, jd1], side="left")
+            out += [(float(arr[i]), pid, self._station_kind[pid][i]) for i in range(i0, i1)]
+        return sorted(out)
+
+    def periods_between(self, jd0, jd1):
+        """[(start_jd, end_jd, pid)] – תקופות נסיגה שחופפות ל-[jd0, jd1), ממוין לפי התחלה."""
+        out = []
+        for pid in STATION_PLANETS:
+            starts, ends = self._retro_start[pid], self._retro_end[pid]
+            i0 = int(np.searchsorted(ends, jd0, side="right"))
+            i1 = int(np.searchsorted(starts, jd1, side="left"))
+            out += [(float(starts[i]), float(ends[i]), pid) for i in range(i0, i1)]
+        return sorted(out)
+
+    def stats(self):
+        return {"from": datetime_from_jd(self.start_jd).isoformat(),
+                "to": datetime_from_jd(self.end_jd).isoformat(),
+                "stations": sum(len(a) for a in self._station_jd.values())}
+
+
+_CALENDAR = None
+_CALENDAR_LOADED = False
+
+
+def get_calendar():
+    """הלוח של התהליך (או None אם אין קובץ). נטען פעם אחת."""
+    global _CALENDAR, _CALENDAR_LOADED
+    if not _CALENDAR_LOADED:
+        _CALENDAR_LOADED = True
+        path = Path(os.environ.get("STATIONS_FILE") or DEFAULT_PATH)
+        if path.exists():
+            try:
+                _CALENDAR = StationCalendar.open(path)
+            except Exception as e:
+                print(f"station calendar ignored: {e}", file=sys.stderr)
+                _CALENDAR = None
+    return _CALENDAR
+
+
+def retro_at(jd):
+    """הכוכבים בנסיגה ברגע jd מהלוח, או None אם אין לוח / מחוץ לטווח."""
+    cal = get_calendar()
+    if cal is None or not cal.covers(jd):
+        return None
+    return cal.retro_at(jd)
+
+
+# ========= CLI =========
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build / query the retrograde station calendar")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Find all stations in the range and write the calendar")
+    b.add_argument("--out", default=str(DEFAULT_PATH))
+    b.add_argument("--from-year", type=int, default=1900)
+    b.add_argument("--to-year", type=int, default=2100)
+    i = sub.add_parser("info", help="Print the range of an existing calendar")
+    i.add_argument("--path", default=str(DEFAULT_PATH))
+    a = sub.add_parser("at", help="Retrograde planets and the next stations at a UTC time")
+    a.add_argument("when", help="YYYY-MM-DD or YYYY-MM-DDTHH:MM (UTC)")
+    a.add_argument("--path", default=str(DEFAULT_PATH))
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        print(build(args.out, from_year=args.from_year, to_year=args.to_year))
+        return
+    cal = StationCalendar.open(args.path)
+    if args.cmd == "info":
+        print({"path": args.path, **cal.stats()})
+        return
+    when = datetime.fromisoformat(args.when).replace(tzinfo=timezone.utc)
+    jd = jd_from_datetime(when)
+    nxt = {p: cal.next_station(p, jd) for p in STATION_PLANETS}
+    print(json.dumps({
+        "utc": when.isoformat(),
+        "retrograde": cal.retro_at(jd),
+        "next_station": {p: {"utc": datetime_from_jd(s[0]).isoformat(timespec="seconds"), "type": s[1]}
+                         for p, s in nxt.items() if s is not None},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+timezones.py
+שירות אזורי זמן לכל המנועים:
+
+- TimezoneFinder נטען פעם אחת לתהליך (הבנאי טוען את קבצי הפוליגונים – יקר),
+  וחיפושי tzid נשמרים במטמון לפי lat/lon מכומתים (TZ_QUANT_DEG, ברירת מחדל 1e-4° ≈ 11 מ').
+- לכל אזור זמן בונים פעם אחת טבלת מעברים (UTC-offset לאורך ציר הזמן המקומי),
+  כך שהמרת זמן מקומי ל-offset היא חיפוש בינארי (bisect) במקום pytz.localize לכל מפה.
+  הטבלה נבנית מנתוני המעברים של pytz עצמו, בטווח השנים TZ_RANGE_YEARS
+  (ברירת מחדל 1800–2200; מחוץ לטווח – ה-offset של הקצה, כמו pytz אחרי 2037),
+  וההתנהגות זהה ל-localize: is_dst=None זורק AmbiguousTimeError / NonExistentTimeError,
+  ו-True/False בוחרים צד כמו pytz.
+"""
+
+import os
+import sys
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import pytz
+from pytz.exceptions import AmbiguousTimeError, NonExistentTimeError
+
+import metrics
+
+TZ_QUANT_DEG = float(os.environ.get("TZ_QUANT_DEG", "0.0001"))
+TZ_CACHE_SIZE = int(os.environ.get("TZ_CACHE_SIZE", "65536"))
+TZ_RANGE_YEARS = tuple(int(y) for y in os.environ.get("TZ_RANGE_YEARS", "1800-2200").split("-"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _secs(dt_naive):
+    return (dt_naive - _EPOCH) / timedelta(seconds=1)
+
+
+# ========= tzid לפי מיקום =========
+
+_finder = None
+_finder_missing = False
+_finder_lock = threading.Lock()
+
+
+def finder():
+    """
+    TimezoneFinder אחד לתהליך (נטען בעצלות), או None אם timezonefinder לא מותקן –
+    נרשם ללוג פעם אחת ולא מנסים שוב (אחרת כל עיר / בקשה הייתה מנסה לייבא מחדש).
+    """
+    global _finder, _finder_missing
+    if _finder is None and not _finder_missing:
+        with _finder_lock:
+            if _finder is None and not _finder_missing:
+                try:
+                    from timezonefinder import TimezoneFinder
+                except ImportError as e:
+                    _finder_missing = True
+                    print(f"timezonefinder unavailable, tzid lookups disabled: {e}", file=sys.stderr)
+                    return None
+                _finder = TimezoneFinder()
+    return _finder
+
+
+@lru_cache(maxsize=TZ_CACHE_SIZE)
+def _tzid_at_quantized(qlat, qlon):
+    return finder().timezone_at(lat=qlat * TZ_QUANT_DEG, lng=qlon * TZ_QUANT_DEG)
+
+
+@metrics.timed("tz")
+def tzid_at(lat, lon):
+    """TZID לנקודה (או None אם אין אזור / אין timezonefinder / קואורדינטות לא חוקיות)."""
+    if finder() is None:
+        return None
+    try:
+        return _tzid_at_quantized(round(float(lat) / TZ_QUANT_DEG), round(float(lon) / TZ_QUANT_DEG))
+    except (TypeError, ValueError):
+        return None
+
+
+# ========= offset לפי זמן מקומי =========
+
+class ZoneTransitions:
+    """
+    מקטעי זמן של אזור אחד: מקטע i מתחיל ב-UTC starts_utc[i] עם offsets[i] (שניות) ודגל dst.
+    בציר המקומי מקטע i מכסה [starts_utc[i] + off_i, starts_utc[i+1] + off_i).
+    כשהשעון מוזז אחורה שני מקטעים סמוכים חופפים (זמן כפול); קדימה – יש חור (זמן שלא קיים).
+    """
+
+    def __init__(self, tzid):
+        tz = pytz.timezone(tzid)
+        self.tzid = tzid
+        utc_times = getattr(tz, "_utc_transition_times", None)
+        infos = getattr(tz, "_transition_info", None)
+        if not utc_times:
+            off = tz.utcoffset(datetime(2000, 1, 1)) or timedelta()
+            self.starts_utc = [float("-inf")]
+            self.offsets = [int(off.total_seconds())]
+            self.dst = [False]
+        else:
+            lo = _secs(datetime(TZ_RANGE_YEARS[0], 1, 1))
+            hi = _secs(datetime(TZ_RANGE_YEARS[1], 1, 1))
+            starts, offsets, dst = [], [], []
+            for i, (t, (off, d, _name)) in enumerate(zip(utc_times, infos)):
+                s = float("-inf") if i == 0 else _secs(t)
+                if s > hi:
+                    break
+                if starts and s < lo:
+                    starts.pop(), offsets.pop(), dst.pop()   # רק המקטע האחרון לפני הטווח נשאר
+                    s = float("-inf")
+                starts.append(s)
+                offsets.append(int(off.total_seconds()))
+                dst.append(bool(d))
+            self.starts_utc, self.offsets, self.dst = starts, offsets, dst
+        self.starts_local = [s + o for s, o in zip(self.starts_utc, self.offsets)]
+
+    def _contains(self, i, local):
+        if local < self.starts_local[i]:
+            return False
+        return i + 1 >= len(self.starts_utc) or local < self.starts_utc[i + 1] + self.offsets[i]
+
+    def offset_seconds(self, dt_naive, is_dst=None):
+        local = _secs(dt_naive)
+        k = max(0, bisect_right(self.starts_local, local) - 1)
+        cands = [i for i in (k - 1, k) if i >= 0 and self._contains(i, local)]
+        if len(cands) == 1:
+            return self.offsets[cands[0]]
+        if is_dst is None:
+            raise (AmbiguousTimeError if cands else NonExistentTimeError)(dt_naive)
+        if not cands:
+            # חור (השעון קפץ קדימה): כמו pytz – ה-offset של 6 שעות אחרי / לפני
+            shift = timedelta(hours=6 if is_dst else -6)
+            return self.offset_seconds(dt_naive + shift, is_dst)
+        # זמן כפול: עדיפות למקטע עם אותו דגל dst; אם אין/שניהם – is_dst=True בוחר
+        # את המוקדם יותר ב-UTC (offset גדול), False את המאוחר (offset קטן)
+        offs = [self.offsets[i] for i in cands if self.dst[i] == is_dst]
+        if len(offs) == 1:
+            return offs[0]
+        offs = offs or [self.offsets[i] for i in cands]
+        return max(offs) if is_dst else min(offs)
+
+
+@lru_cache(maxsize=None)
+def transitions(tzid):
+    return ZoneTransitions(tzid)
+
+
+@metrics.timed("tz")
+def offset_minutes(dt_naive, tzid, is_dst=None):
+    return transitions(tzid).offset_seconds(dt_naive, is_dst) // 60
+
+
+def offset_str(dt_naive, tzid, is_dst=None):
+    """'+02:00' לזמן מקומי נאיבי באזור tzid (כמו tz.localize(dt, is_dst).utcoffset())."""
+    total_min = offset_minutes(dt_naive, tzid, is_dst)
+    sgn = "+" if total_min >= 0 else "-"
+    hh, mm = divmod(abs(total_min), 60)
+    return f"{sgn}{hh:02d}:{mm:02d}"
+
+
+def localize(dt_naive, tzid, is_dst=False):
+    """datetime aware עם offset קבוע (מספיק לחישובי JD/השוואות)."""
+    off = timedelta(minutes=offset_minutes(dt_naive, tzid, is_dst))
+    return dt_naive.replace(tzinfo=timezone(off))
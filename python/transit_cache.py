@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+transit_cache.py
+מטמון טרנזיטים משותף לכל המשתמשים והבקשות בתהליך.
+
+מיקומי הכוכבים תלויים רק ברגע (UTC) ולא במשתמש, לכן שומרים אותם לפי
+מפתח דקת-UTC (JD×1440). רק מה שתלוי במיקום – ASC/MC (ומהם Part of Fortune) –
+מחושב לכל בקשה, וזה חישוב בתים זול של swisseph (ורק כשהקורא צריך אותו – angles=True).
+
+בהחטאה: קודם האינדקס הלילי (sky_index.py, שורות מוכנות לשעות UTC עגולות),
+אחר כך טבלת האפמריס הממופה (ephemeris_table.py, אינטרפולציה), ורק מחוץ לטווח שלהן – swisseph.
+
+TRANSIT_CACHE_SIZE – כמה רגעים לשמור (ברירת מחדל 4,500 ≈ חודש ברשת של 10 דק',
+כ-1.4KB לרגע ≈ 6MB לתהליך; כל worker של COMPUTE_WORKERS מחזיק עותק משלו).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from flatlib import const
+from flatlib.datetime import Datetime
+from positions import BodyPos, ChartSnapshot, body_positions, positions_many, angles_at
+from ephemeris_table import get_table
+import sky_index
+import metrics
+
+PLANETS = [
+    const.SUN, const.MOON, const.MERCURY, const.VENUS, const.MARS,
+    const.JUPITER, const.SATURN, const.URANUS, const.NEPTUNE, const.PLUTO
+]
+
+MINUTES_PER_DAY = 1440.0
+
+
+def minute_key(jd):
+    """מפתח המטמון: מספר הדקות השלמות מאז JD 0 (UTC)."""
+    return int(round(jd * MINUTES_PER_DAY))
+
+
+class TransitCache:
+    def __init__(self, max_entries=None):
+        self.max_entries = int(max_entries or os.environ.get("TRANSIT_CACHE_SIZE", "4500"))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.table_reads = 0
+        self.sky_reads = 0
+
+    def _compute(self, key):
+        sky = sky_index.get_index()
+        bodies = sky.bodies_at_minute(key) if sky is not None else None
+        if bodies is not None:
+            self.sky_reads += 1
+            return bodies
+        jd = key / MINUTES_PER_DAY
+        table = get_table()
+        if table is not None and table.covers(jd):
+            lons, speeds = table.positions_at(jd)
+            self.table_reads += 1
+            return {p: BodyPos(p, lons[i], speeds[i]) for i, p in enumerate(PLANETS)}
+        arr = body_positions(jd, PLANETS)
+        return {p: BodyPos(p, arr[i, 0], arr[i, 1]) for i, p in enumerate(PLANETS)}
+
+    def _evict(self):
+        # תחת self._lock
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def bodies_at_jd(self, jd):
+        """{ID: BodyPos} לכל 10 הכוכבים ברגע jd (UTC)."""
+        key = minute_key(jd)
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                metrics.count("transit_cache_hits")
+                return hit
+        bodies = self._compute(key)
+        metrics.count("transit_cache_misses")
+        with self._lock:
+            self.misses += 1
+            self._data[key] = bodies
+            self._evict()
+        return bodies
+
+    def prefetch(self, jds):
+        """
+        ממלא מראש את המטמון לכמה רגעים בבת אחת (למשל כל שעות הרשת של שבוע):
+        אם הטבלה מכסה את כולם – קריאה וקטורית אחת ל-positions_many במקום קריאה לכל רגע.
+        מחזיר כמה רגעים חושבו.
+        """
+        keys = sorted({minute_key(jd) for jd in jds})
+        with self._lock:
+            cached = {k for k in keys if k in self._data}
+        missing = [k for k in keys if k not in cached]
+        if not missing:
+            return 0
+        sky = sky_index.get_index()
+        if sky is not None:
+            # שעות עגולות מהאינדקס הלילי – כמו ב-_compute
+            found = {k: sky.bodies_at_minute(k) for k in missing}
+            found = {k: b for k, b in found.items() if b is not None}
+            self.sky_reads += len(found)
+            with self._lock:
+                self.misses += len(found)
+                self._data.update(found)
+                self._evict()
+            missing = [k for k in missing if k not in found]
+            if not missing:
+                return len(keys) - len(cached)
+        kjds = np.asarray(missing, dtype=np.float64) / MINUTES_PER_DAY
+        table = get_table()
+        if table is not None and table.covers(kjds[0]) and table.covers(kjds[-1]):
+            lons, speeds = table.positions_many(kjds)
+            self.table_reads += len(missing)
+            rows = [{p: BodyPos(p, lons[r, i], speeds[r, i]) for i, p in enumerate(PLANETS)}
+                    for r in range(len(missing))]
+        elif table is None:
+            # בלי טבלה (ומה שהאינדקס לא כיסה): swisseph ישירות, כל הרגעים למערך אחד
+            arr = positions_many(kjds, PLANETS)
+            rows = [{p: BodyPos(p, arr[r, i, 0], arr[r, i, 1]) for i, p in enumerate(PLANETS)}
+                    for r in range(len(missing))]
+        else:
+            rows = [self._compute(k) for k in missing]
+        with self._lock:
+            self.misses += len(missing)
+            for k, bodies in zip(missing, rows):
+                self._data[k] = bodies
+            self._evict()
+        return len(keys) - len(cached)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "table_reads": self.table_reads,
+            "sky_reads": self.sky_reads,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+CACHE = TransitCache()
+
+
+def transit_chart(date, pos, ids=PLANETS, hsys=const.HOUSES_DEFAULT, angles=True):
+    """
+    תחליף ל-Chart(date, pos, IDs=ids) עבור מפות טרנזיט:
+    כוכבים מהמטמון המשותף + ASC/MC מחושבים למיקום הספציפי.
+    date: flatlib Datetime, pos: flatlib GeoPos
+    angles=False – סריקות שצריכות רק כוכבים (בלי חישוב בתים בכלל).
+    """
+    metrics.count("charts")
+    bodies = CACHE.bodies_at_jd(date.jd)
+    angle_lons = angles_at(date.jd, pos.lat, pos.lon, hsys)[0] if angles else None
+    return ChartSnapshot({p: bodies[p] for p in ids}, angle_lons)
+
+
+def prefetch(jds):
+    """ראו TransitCache.prefetch."""
+    return CACHE.prefetch(jds)
+
+
+def transit_chart_at(date_str, time_str, offset, pos, ids=PLANETS, angles=True):
+    """כמו transit_chart, עם מחרוזות 'YYYY/MM/DD', 'HH:MM', '+02:00'."""
+    return transit_chart(Datetime(date_str, time_str, offset), pos, ids, angles=angles)